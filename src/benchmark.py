@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cuisine_taxonomy import TAXONOMY_PATH, load_taxonomy
+from raw_store import DETAILS, SEARCH, STORE_NAME, open_store
+
+SRC_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = Path("data/benchmarks")
+
+PAGE_SIZE = 50
+WRITE_BATCH = 2000
+STDERR_TAIL_BYTES = 64 * 1024   # how much of a failed stage's stderr is read back
+
+# (south, west, north, east) around Orlando
+BBOX = (28.3470, -81.6590, 28.7860, -80.8620)
+
+NAME_WORDS = [
+    "Golden", "Spice", "Garden", "House", "Kitchen", "Grill", "Bistro", "Cafe", "Palace", "Corner",
+    "Taj", "Little", "Royal", "Express", "Street", "Blue", "Lotus", "Harbor", "Smoke", "Noodle",
+]
+STREETS = ["University Blvd", "Alafaya Trl", "E Colonial Dr", "N Orange Ave", "International Dr", "Semoran Blvd"]
+CITIES = [("Orlando", "32817"), ("Orlando", "32826"), ("Oviedo", "32765"), ("Winter Park", "32792")]
+
+# (start, end) of a regular day; ends before starts run past midnight
+SHIFTS = [("1100", "2200"), ("1100", "2300"), ("0700", "1500"), ("1700", "0200"), ("1100", "0000"), ("0000", "0000")]
+
+# (script, args) in pipeline order; every stage runs in its own process
+STAGES = [
+    ("build_staging_restaurants", ["--full"]),
+    ("build_staging_categories", ["--full"]),
+    ("build_staging_hours", ["--full"]),
+    ("build_canonical_cuisine", []),
+    ("build_indian_restaurants", []),
+    ("build_late_night_restaurants", []),
+    ("build_late_night_indian", []),
+    ("build_cuisine_restaurants", []),
+    ("open_hours_index", ["build"]),
+    ("load_to_sqlite", []),
+]
+POSTGRES_STAGE = ("load_to_postgres", [])
+
+
+def business_id(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits + "-_", k=22))
+
+
+def search_business(rng: random.Random, bid: str, aliases: list[tuple[str, str]]) -> dict:
+    """One business as the search endpoint returns it."""
+    lat = rng.uniform(BBOX[0], BBOX[2])
+    lon = rng.uniform(BBOX[1], BBOX[3])
+    name = " ".join(rng.sample(NAME_WORDS, 2))
+    city, zip_code = rng.choice(CITIES)
+    address1 = f"{rng.randint(100, 19999)} {rng.choice(STREETS)}"
+    phone = f"+1407{rng.randint(1000000, 9999999)}"
+    return {
+        "id": bid,
+        "alias": name.lower().replace(" ", "-") + "-" + city.lower().replace(" ", "-"),
+        "name": name,
+        "image_url": f"https://s3-media0.fl.yelpcdn.com/bphoto/{bid}/o.jpg",
+        "is_closed": False,
+        "url": f"https://www.yelp.com/biz/{bid}",
+        "review_count": int(rng.paretovariate(1.2) * 10),
+        "categories": [{"alias": a, "title": t} for a, t in rng.sample(aliases, rng.randint(1, 3))],
+        "rating": rng.choice([2.5, 3.0, 3.5, 4.0, 4.0, 4.5, 4.5, 5.0]),
+        # About 1 in 40 listings has no coordinates
+        "coordinates": {"latitude": lat, "longitude": lon} if rng.random() > 0.025 else {"latitude": None, "longitude": None},
+        "transactions": rng.sample(["delivery", "pickup", "restaurant_reservation"], rng.randint(0, 2)),
+        "price": rng.choice(["$", "$$", "$$", "$$$", None]),
+        "location": {
+            "address1": address1,
+            "address2": "",
+            "address3": None,
+            "city": city,
+            "zip_code": zip_code,
+            "country": "US",
+            "state": "FL",
+            "display_address": [address1, f"{city}, FL {zip_code}"],
+        },
+        "phone": phone,
+        "display_phone": f"({phone[2:5]}) {phone[5:8]}-{phone[8:]}",
+        "distance": rng.uniform(50, 40000),
+    }
+
+
+def details(rng: random.Random, business: dict) -> dict:
+    """The details response for a search business: the same fields plus opening hours."""
+    out = {k: v for k, v in business.items() if k != "distance"}
+    out["photos"] = [business["image_url"]]
+
+    # About 1 in 12 businesses lists no hours
+    if rng.random() < 1 / 12:
+        return out
+
+    start, end = rng.choice(SHIFTS)
+    closed_day = rng.choice([None, None, 0, 6])
+    periods = []
+    for day in range(7):
+        if day == closed_day:
+            continue
+        if rng.random() < 0.15:
+            # Split shift: lunch and dinner
+            periods.append({"is_overnight": False, "start": "1100", "end": "1430", "day": day})
+            periods.append({"is_overnight": False, "start": "1700", "end": "2200", "day": day})
+        else:
+            periods.append({"is_overnight": end <= start, "start": start, "end": end, "day": day})
+    out["hours"] = [{"open": periods, "hours_type": "REGULAR", "is_open_now": rng.random() < 0.5}]
+    if rng.random() < 0.05:
+        out["hours"].append({
+            "open": [{"is_overnight": False, "start": "1000", "end": "1600", "day": rng.randrange(7)}],
+            "hours_type": "HAPPY_HOUR",
+            "is_open_now": False,
+        })
+    return out
+
+
+def generate(root: Path, businesses: int, seed: int = 42, store: bool = False) -> dict:
+    """Write a synthetic raw corpus of `businesses` restaurants under root/data.
+
+    Search pages hold 50 businesses each, and about 5% of listings repeat
+    a business from an earlier page, as overlapping queries do. Each
+    business gets a details response. Output goes to root/data/raw as JSON
+    files, or into the raw store with `store`. The taxonomy is copied to
+    root/data/reference.
+    """
+    rng = random.Random(seed)
+    raw_dir = root / "data" / "raw"
+    details_dir = raw_dir / "details"
+    if raw_dir.exists():
+        shutil.rmtree(raw_dir)
+    details_dir.mkdir(parents=True)
+    (root / TAXONOMY_PATH).parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(TAXONOMY_PATH, root / TAXONOMY_PATH)
+
+    taxonomy = load_taxonomy()
+    aliases = list(taxonomy[["alias", "title"]].itertuples(index=False, name=None))
+    raw_store = open_store(raw_dir / STORE_NAME) if store else None
+    pending: list[tuple[str, str, bytes, None, float]] = []
+
+    def emit(kind: str, key: str, path: Path, data: dict) -> None:
+        if raw_store is None:
+            path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            return
+        pending.append((kind, key, json.dumps(data).encode(), None, time.time()))
+        if len(pending) >= WRITE_BATCH:
+            raw_store.put_many(pending)
+            pending.clear()
+
+    seen: list[dict] = []
+    page: list[dict] = []
+    pages = 0
+    listings = 0
+    while len(seen) < businesses or page:
+        if len(seen) < businesses:
+            if seen and rng.random() < 0.05:
+                page.append(rng.choice(seen))
+            else:
+                b = search_business(rng, business_id(rng), aliases)
+                seen.append(b)
+                page.append(b)
+                emit(DETAILS, b["id"], details_dir / f"{b['id']}.json", details(rng, b))
+        if len(page) == PAGE_SIZE or (len(seen) >= businesses and page):
+            key = f"yelp_search_offset_s{pages:06d}_000"
+            emit(SEARCH, key, raw_dir / f"{key}.json", {"businesses": page, "total": businesses})
+            listings += len(page)
+            pages += 1
+            page = []
+
+    if raw_store is not None and pending:
+        raw_store.put_many(pending)
+
+    return {"businesses": businesses, "search_pages": pages, "listings": listings, "seed": seed, "store": store}
+
+
+def run_stage(root: Path, script: str, args: list[str]) -> dict:
+    """Run one stage script in root and measure it; peak RSS is the stage process's own."""
+    cmd = [sys.executable, str(SRC_DIR / f"{script}.py"), *args]
+    # stderr goes to a file, not a pipe: nothing reads a pipe during wait4, so
+    # a stage writing more than the pipe buffer would block forever
+    with tempfile.TemporaryFile() as err:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=root, stdout=subprocess.DEVNULL, stderr=err)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        err.seek(max(err.seek(0, os.SEEK_END) - STDERR_TAIL_BYTES, 0))
+        stderr = err.read().decode(errors="replace")
+
+    result = {
+        "stage": script,
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),   # ru_maxrss is KiB on Linux
+        "returncode": proc.returncode,
+    }
+    if proc.returncode:
+        result["error"] = stderr.strip().splitlines()[-1] if stderr.strip() else ""
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(root: Path, repeat: int = 1, postgres: bool = False) -> dict:
+    """Time every stage `repeat` times against the corpus in root; keeps each stage's fastest run."""
+    stages = STAGES + ([POSTGRES_STAGE] if postgres else [])
+    best: dict[str, dict] = {}
+    for _ in range(repeat):
+        for script, args in stages:
+            result = run_stage(root, script, args)
+            print(f"{script:<32}{result['seconds']:>9.2f}s{result['peak_rss_mb']:>10.1f} MB")
+            if result["returncode"]:
+                raise RuntimeError(f"{script} failed: {result.get('error')}")
+            if script not in best or result["seconds"] < best[script]["seconds"]:
+                best[script] = result
+
+    raw_dir = root / "data" / "raw"
+    raw_bytes = sum(fp.stat().st_size for fp in raw_dir.rglob("*") if fp.is_file())
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "staging_format": os.getenv("STAGING_FORMAT", "csv"),
+        "raw_layout": "store" if (raw_dir / STORE_NAME).exists() else "files",
+        "raw_bytes": raw_bytes,
+        "repeat": repeat,
+        "stages": [best[script] for script, _ in stages],
+        "total_seconds": round(sum(best[script]["seconds"] for script, _ in stages), 3),
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    base = {s["stage"]: s for s in baseline["stages"]}
+    print(f"{'stage':<32}{'base s':>9}{'now s':>9}{'change':>9}{'base MB':>10}{'now MB':>10}")
+    for s in current["stages"]:
+        b = base.get(s["stage"])
+        if b is None:
+            print(f"{s['stage']:<32}{'':>9}{s['seconds']:>9.2f}{'new':>9}{'':>10}{s['peak_rss_mb']:>10.1f}")
+            continue
+        change = (s["seconds"] - b["seconds"]) / b["seconds"] * 100 if b["seconds"] else 0.0
+        print(
+            f"{s['stage']:<32}{b['seconds']:>9.2f}{s['seconds']:>9.2f}{change:>+8.1f}%"
+            f"{b['peak_rss_mb']:>10.1f}{s['peak_rss_mb']:>10.1f}"
+        )
+    print(f"{'total':<32}{baseline['total_seconds']:>9.2f}{current['total_seconds']:>9.2f}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic Yelp corpus.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    g = sub.add_parser("generate", help="write a synthetic raw corpus")
+    g.add_argument("--root", type=Path, required=True, help="directory to build the corpus in (its data/ is replaced)")
+    g.add_argument("--businesses", type=int, default=1000, help="e.g. 1000, 100000, 1000000")
+    g.add_argument("--seed", type=int, default=42)
+    g.add_argument("--store", action="store_true", help=f"write into data/raw/{STORE_NAME} instead of JSON files")
+
+    r = sub.add_parser("run", help="time every stage against a generated corpus")
+    r.add_argument("--root", type=Path, required=True)
+    r.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is kept")
+    r.add_argument("--postgres", action="store_true", help="also time load_to_postgres (needs POSTGRES_URL)")
+    r.add_argument("--out", type=Path, help=f"results file (default: {RESULTS_DIR}/<commit>_<businesses>.json)")
+
+    c = sub.add_parser("compare", help="per-stage change between two results files")
+    c.add_argument("baseline", type=Path)
+    c.add_argument("current", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        start = time.perf_counter()
+        corpus = generate(args.root.resolve(), args.businesses, args.seed, args.store)
+        (args.root / "corpus.json").write_text(json.dumps(corpus, indent=2), encoding="utf-8")
+        print(f"Generated {corpus['businesses']} businesses on {corpus['search_pages']} search pages "
+              f"in {args.root} ({time.perf_counter() - start:.1f}s)")
+        return
+
+    if args.command == "compare":
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        current = json.loads(args.current.read_text(encoding="utf-8"))
+        compare(baseline, current)
+        return
+
+    root = args.root.resolve()
+    corpus_path = root / "corpus.json"
+    if not corpus_path.exists():
+        raise FileNotFoundError(f"No corpus in {root}; run `benchmark.py generate --root {args.root}` first")
+    result = {"corpus": json.loads(corpus_path.read_text(encoding="utf-8")), **run(root, args.repeat, args.postgres)}
+
+    out = args.out or RESULTS_DIR / f"{result['commit'] or 'unknown'}_{result['corpus']['businesses']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nTotal: {result['total_seconds']:.2f}s")
+    print(f"Saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,37 @@
-from pathlib import Path
 import pandas as pd
 
-STAGING_DIR = Path("data/staging")
-CATEGORIES_PATH = STAGING_DIR / "staging_categories.csv"
-OUT_PATH = STAGING_DIR / "staging_cuisine_map.csv"
+from cuisine_taxonomy import TAXONOMY_PATH, cuisine_lookup
+from metrics import traced
+from staging_io import read_table, write_table
 
-# Canonical cuisine mapping rules
-CANONICAL_MAP = {
-    'indpak': "Indian",
-    'pakistani': "Indian",
-    'himalayan': "Indian",
-    'indianfusion': "Indian"
-}
+CATEGORIES = "staging_categories"
+OUT = "staging_cuisine_map"
 
-def main() -> None:
-    df = pd.read_csv(CATEGORIES_PATH)
 
-    # Only keep categories that matter
-    df = df[df["category_alias"].isin(CANONICAL_MAP.keys())].copy()
+@traced("build_canonical_cuisine")
+def build(categories: pd.DataFrame, lookup: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Map every category alias to its canonical cuisine in one join against the taxonomy."""
+    if lookup is None:
+        lookup = cuisine_lookup()
 
-    # Map to canonical cuisine
-    df["canonical_cuisine"] = df["category_alias"].map(CANONICAL_MAP)
+    # Only keep categories that resolve to a cuisine
+    df = categories.merge(lookup, on="category_alias", how="inner")
 
-    # Deduplicate: one cuisine per restaurant
-    df = df.drop_duplicates(subset=["source_id", "canonical_cuisine"])
+    # Deduplicate: one row per restaurant and cuisine
+    df = df.drop_duplicates(subset=["restaurant_key", "canonical_cuisine"])
+    return df
 
-    df.to_csv(OUT_PATH, index=False)
+def main() -> None:
+    categories = read_table(CATEGORIES)
+    df = build(categories)
+    out_path = write_table(df, OUT)
 
-    print(f"Saved: {OUT_PATH}")
-    print(f"Indian restaurants identified: {df['source_id'].nunique()}")
-    print("\nSample rows:")
-    print(df.head(10).to_string(index=False))
+    unresolved = categories.loc[~categories["category_alias"].isin(cuisine_lookup()["category_alias"]), "category_alias"]
+    print(f"Saved: {out_path}")
+    print(f"Restaurants with a cuisine: {df['restaurant_key'].nunique()}")
+    print(f"Aliases without a cuisine in {TAXONOMY_PATH}: {unresolved.nunique()}")
+    print("\nRestaurants per cuisine:")
+    print(df.groupby("canonical_cuisine")["restaurant_key"].nunique().sort_values(ascending=False).to_string())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
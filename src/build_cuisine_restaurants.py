@@ -0,0 +1,61 @@
+import pandas as pd
+
+from metrics import traced
+from staging_io import read_table, write_table
+
+RESTAURANTS = "staging_restaurants"
+CUISINE = "staging_cuisine_map"
+HOURS = "staging_hours"
+OUT = "cuisine_restaurants"
+
+COLUMNS = [
+    "restaurant_key",
+    "source_id",
+    "name",
+    "rating",
+    "review_count",
+    "price",
+    "distance_to_ucf_miles",
+    "full_address",
+    "city",
+    "state",
+    "zip_code",
+    "url"
+]
+
+@traced("build_cuisine_restaurants")
+def build(restaurants: pd.DataFrame, cuisine: pd.DataFrame, hours: pd.DataFrame) -> pd.DataFrame:
+    """One row per (cuisine, restaurant) with its late-night flag, ranked within each cuisine."""
+    late = hours.groupby("restaurant_key")["is_late_night_11pm"].max()
+
+    df = cuisine[["canonical_cuisine", "restaurant_key"]].merge(restaurants[COLUMNS], on="restaurant_key", how="inner")
+    df["is_late_night_11pm"] = df["restaurant_key"].map(late).fillna(0).astype(int)
+
+    # Best rated first, then closer, within each cuisine
+    df = df.sort_values(
+        by=["canonical_cuisine", "rating", "review_count", "distance_to_ucf_miles"],
+        ascending=[True, False, False, True],
+        na_position="last"
+    )
+    return df.reset_index(drop=True)
+
+def main() -> None:
+    df = build(
+        read_table(RESTAURANTS, columns=COLUMNS),
+        read_table(CUISINE, columns=["restaurant_key", "canonical_cuisine"]),
+        read_table(HOURS, columns=["restaurant_key", "is_late_night_11pm"]),
+    )
+    out_path = write_table(df, OUT, partition_by="canonical_cuisine")
+
+    print(f"Saved: {out_path}")
+    print(f"Cuisine rows: {len(df)}")
+    print("\nRestaurants per cuisine (all | late-night):")
+    print(
+        df.groupby("canonical_cuisine")["is_late_night_11pm"]
+        .agg(["count", "sum"])
+        .sort_values("count", ascending=False)
+        .to_string(header=False)
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,34 @@
-from pathlib import Path
 import pandas as pd
 
-STAGING_DIR = Path("data/staging")
-
-RESTAURANTS_PATH = STAGING_DIR / "staging_restaurants.csv"
-CUISINE_PATH = STAGING_DIR / "staging_cuisine_map.csv"
-OUT_PATH = STAGING_DIR / "indian_restaurants.csv"
-
-def main() -> None:
-    restaurants = pd.read_csv(RESTAURANTS_PATH)
-    cuisine = pd.read_csv(CUISINE_PATH)
-
+from metrics import traced
+from staging_io import read_table, write_table
+
+RESTAURANTS = "staging_restaurants"
+CUISINE = "staging_cuisine_map"
+OUT = "indian_restaurants"
+
+# Keep only useful columns for now
+COLUMNS = [
+    "restaurant_key",
+    "source_id",
+    "name",
+    "rating",
+    "review_count",
+    "price",
+    "distance_to_ucf_miles",
+    "full_address",
+    "city",
+    "state",
+    "zip_code",
+    "url"
+]
+
+@traced("build_indian_restaurants")
+def build(restaurants: pd.DataFrame, cuisine: pd.DataFrame) -> pd.DataFrame:
     # Filter to Indian
-    indian_ids = cuisine.loc[cuisine["canonical_cuisine"] == "Indian", "source_id"].unique()
-    indian = restaurants[restaurants["source_id"].isin(indian_ids)].copy()
-
-    # Keep only useful columns for now
-    cols = [
-        "source_id",
-        "name",
-        "rating",
-        "review_count",
-        "price",
-        "distance_to_ucf_miles",
-        "full_address",
-        "city",
-        "state",
-        "zip_code",
-        "url"
-    ]
-    indian = indian[cols]
+    indian_keys = cuisine.loc[cuisine["canonical_cuisine"] == "Indian", "restaurant_key"].unique()
+    indian = restaurants[restaurants["restaurant_key"].isin(indian_keys)].copy()
+    indian = indian[COLUMNS]
 
     # Sort: best rated first, then closer
     indian = indian.sort_values(
@@ -37,10 +36,16 @@ def main() -> None:
         ascending=[False, False, True],
         na_position="last"
     )
+    return indian
 
-    indian.to_csv(OUT_PATH, index=False)
+def main() -> None:
+    indian = build(
+        read_table(RESTAURANTS, columns=COLUMNS),
+        read_table(CUISINE, columns=["restaurant_key", "canonical_cuisine"]),
+    )
+    out_path = write_table(indian, OUT)
 
-    print(f"Saved: {OUT_PATH}")
+    print(f"Saved: {out_path}")
     print(f"Indian restaurants: {len(indian)}")
     print("\nTop 8 Indian near UCF (name | rating | reviews | miles):")
     print(
@@ -1,17 +1,21 @@
-from pathlib import Path
 import pandas as pd
 
-STAGING_DIR = Path("data/staging")
-LATE = STAGING_DIR / "late_night_restaurants.csv"
-INDIAN = STAGING_DIR / "indian_restaurants.csv"
-OUT = STAGING_DIR / "late_night_indian_restaurants.csv"
+from metrics import traced
+from staging_io import read_table, write_table
+
+LATE = "late_night_restaurants"
+INDIAN = "indian_restaurants"
+OUT = "late_night_indian_restaurants"
+
+
+@traced("build_late_night_indian")
+def build(late: pd.DataFrame, indian: pd.DataFrame) -> pd.DataFrame:
+    return late.merge(indian[['restaurant_key']], on='restaurant_key', how='inner')
 
 
 def main() -> None:
-    late = pd.read_csv(LATE)
-    indian = pd.read_csv(INDIAN)
-    out = late.merge(indian[['source_id']], on='source_id', how='inner')
-    out.to_csv(OUT, index=False)
+    out = build(read_table(LATE), read_table(INDIAN, columns=['restaurant_key']))
+    write_table(out, OUT)
 
     if not out.empty:
         print("\nLate_night Indian near UCF:")
@@ -1,44 +1,50 @@
-from pathlib import Path
 import pandas as pd
 
-STAGING_DIR = Path("data/staging")
-RESTAURANTS = STAGING_DIR / "staging_restaurants.csv"
-HOURS = STAGING_DIR / "staging_hours.csv"
-OUT = STAGING_DIR / "late_night_restaurants.csv"
-
-def main() -> None:
-    r = pd.read_csv(RESTAURANTS)
-    h = pd.read_csv(HOURS)
-
-    late_ids = (
-        h.groupby('source_id')['is_late_night_11pm']
+from metrics import traced
+from staging_io import read_table, write_table
+
+RESTAURANTS = "staging_restaurants"
+HOURS = "staging_hours"
+OUT = "late_night_restaurants"
+
+COLUMNS = [
+    "restaurant_key",
+    "source_id",
+    'name',
+    'rating',
+    'review_count',
+    'price',
+    'distance_to_ucf_miles',
+    'full_address',
+    'url'
+]
+
+@traced("build_late_night_restaurants")
+def build(r: pd.DataFrame, h: pd.DataFrame) -> pd.DataFrame:
+    late_keys = (
+        h.groupby('restaurant_key')['is_late_night_11pm']
         .max()
         .reset_index()
-        .query('is_late_night_11pm == 1')['source_id']
+        .query('is_late_night_11pm == 1')['restaurant_key']
     )
 
-    late = r[r['source_id'].isin(late_ids)].copy()
-
-    cols = [
-        "source_id",
-        'name',
-        'rating',
-        'review_count',
-        'price',
-        'distance_to_ucf_miles',
-        'full_address',
-        'url'
-    ]
-    late = late[cols]
+    late = r[r['restaurant_key'].isin(late_keys)].copy()
+    late = late[COLUMNS]
 
     late = late.sort_values(
         by=['rating', 'review_count', 'distance_to_ucf_miles'],
         ascending=[False, False, True],
         na_position='last'
     )
+    return late
 
-    late.to_csv(OUT, index=False)
-    print(f"Saved: {OUT}")
+def main() -> None:
+    late = build(
+        read_table(RESTAURANTS, columns=COLUMNS),
+        read_table(HOURS, columns=['restaurant_key', 'is_late_night_11pm']),
+    )
+    out_path = write_table(late, OUT)
+    print(f"Saved: {out_path}")
     print(f"Late-night restaurants: {len(late)}")
     print("\nTop late-night near UCF:")
     print(
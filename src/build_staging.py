@@ -0,0 +1,67 @@
+import argparse
+
+import build_staging_categories as categories
+import build_staging_hours as hours
+import build_staging_restaurants as restaurants
+from manifest import Manifest
+from metrics import span
+from raw_reader import detail_files, iter_pages, search_files
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Build restaurants, categories and hours with each raw file decoded once.
+
+    Search pages feed both the restaurant and the category row builders in
+    the same pass; detail files feed the hours builder. Raw pages are
+    streamed, so only one decoded page is alive at a time, and only files
+    that are new or changed since the last run (per the manifests) are read.
+    """
+    parser = argparse.ArgumentParser(description="Build all normalized staging tables in one pass.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifests and re-parse every raw file")
+    parser.add_argument("--workers", type=int, default=1, help="processes parsing detail files (1 = serial)")
+    parser.add_argument("--ref", nargs=3, action="append", metavar=("NAME", "LAT", "LON"),
+                        help="extra reference point; adds a distance_to_NAME_miles column")
+    args = parser.parse_args(argv)
+    reference_points = restaurants.parse_reference_points(args.ref)
+
+    restaurant_manifest = Manifest("staging_restaurants", version=restaurants.ROWS_VERSION)
+    category_manifest = Manifest("staging_categories", version=categories.ROWS_VERSION)
+    hours_manifest = Manifest("staging_hours", version=hours.ROWS_VERSION)
+    if args.full:
+        for m in (restaurant_manifest, category_manifest, hours_manifest):
+            m.clear()
+
+    with span("parse_search_pages") as s:
+        files = search_files()
+        need_restaurants = set(restaurant_manifest.plan(files))
+        need_categories = set(category_manifest.plan(files))
+        changed = [fp for fp in files if fp in need_restaurants or fp in need_categories]
+        for fp, data in iter_pages(changed):
+            if fp in need_restaurants:
+                restaurant_manifest.record(fp, restaurants.page_rows(data))
+            if fp in need_categories:
+                category_manifest.record(fp, categories.page_rows(data))
+        s.set(rows_in=len(changed), bytes_read=sum(fp.stat().st_size for fp in changed))
+
+    with span("parse_detail_files", workers=args.workers) as s:
+        changed_details = hours_manifest.plan(detail_files())
+        for fp, rows, missing_hours, stamp in hours.parse_files(changed_details, args.workers):
+            hours_manifest.record(fp, rows, stamp, missing_hours=missing_hours)
+        s.set(rows_in=len(changed_details), bytes_read=sum(fp.stat().st_size for fp in changed_details))
+
+    for m in (restaurant_manifest, category_manifest, hours_manifest):
+        m.save()
+
+    print(f"Search pages parsed: {len(changed)} of {len(files)}")
+    print(f"Detail files parsed: {len(changed_details)} of {len(hours_manifest.entries)}\n")
+
+    restaurants.save(restaurants.frame_from_rows(list(restaurant_manifest.rows()), reference_points))
+    print()
+    categories.save(categories.frame_from_rows(list(category_manifest.rows())))
+    print()
+    missing_hours = sum(bool(m) for m in hours_manifest.meta("missing_hours"))
+    hours.save(hours.frame_from_rows(list(hours_manifest.rows())), missing_hours)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,101 @@
-import json
-from pathlib import Path
+import argparse
 import pandas as pd
 
-RAW_DIR = Path("data/raw")
-OUT_DIR = Path("data/staging")
-OUT_PATH = OUT_DIR / "staging_categories.csv"
-
-
-def main() -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-    rows = []
-    files = sorted(RAW_DIR.glob("yelp_search_offset_*.json"))
-    if not files:
-        raise FileNotFoundError("No raw files found in data/raw")
-    
-    for fp in files:
-        data = json.loads(fp.read_text(encoding="utf-8"))
-        businesses = data.get("businesses", [])
-
-        for b in businesses:
-            source_id = b.get("id")
-            if not source_id:
-                continue
-
-            categories = b.get("categories") or []
-            for c in categories:
-                rows.append(
-                    {
-                        "source": "yelp",
-                        "source_id": source_id,
-                        "category_title": c.get("title"),
-                        "category_alias": c.get("alias")
-                    }
-                )
-    df = pd.DataFrame(rows)
+from manifest import Manifest
+from metrics import span
+from raw_reader import iter_pages, search_files
+from restaurant_keys import lookup_keys
+from staging_io import blanks_to_na, write_table
+
+OUT = "staging_categories"
+
+# Bump when category_rows changes so cached manifest rows are rebuilt
+ROWS_VERSION = 1
+
+
+def category_rows(b: dict) -> list[dict]:
+    source_id = b.get("id")
+    if not source_id:
+        return []
+
+    categories = b.get("categories") or []
+    return [
+        {
+            "source": "yelp",
+            "source_id": source_id,
+            "category_title": c.get("title"),
+            "category_alias": c.get("alias")
+        }
+        for c in categories
+    ]
+
+
+def page_rows(data: dict) -> list[dict]:
+    return [row for b in data.get("businesses", []) for row in category_rows(b)]
+
+
+def frame_from_rows(rows: list[dict]) -> pd.DataFrame:
+    df = blanks_to_na(pd.DataFrame(rows))
 
     # Drop totally empty category from rows
     df = df.dropna(subset=["source_id", "category_alias"])
 
+    # Swap the string id for the int32 key shared with staging_restaurants
+    keys = lookup_keys(df["source_id"], OUT)
+    df = df[keys.notna()]
+    df.insert(1, "restaurant_key", keys.dropna().astype("int32"))
+    df = df.drop(columns=["source_id"])
+
     # Deduplicate in case the same restaurant appears in multiple pages
-    df = df.drop_duplicates(subset=["source_id", "category_alias"], keep='first')
+    df = df.drop_duplicates(subset=["restaurant_key", "category_alias"], keep='first')
+    return df
+
 
-    df.to_csv(OUT_PATH, index=False)
-    print(f"Saved: {OUT_PATH}")
+def save(df: pd.DataFrame) -> None:
+    out_path = write_table(df, OUT)
+    print(f"Saved: {out_path}")
     print(f"Category rows: {len(df)}")
-    print(f"Unique restaurants with categories: {df['source_id'].nunique()}")
+    print(f"Unique restaurants with categories: {df['restaurant_key'].nunique()}")
 
     print("\nTop 10 categories by count:")
     print(
-        df.groupby("category_title")["source_id"]
+        df.groupby("category_title")["restaurant_key"]
         .count()
         .sort_values(ascending=False)
         .head(10)
         .to_string()
     )
 
+
+def build(full: bool = False) -> pd.DataFrame:
+    """Parse only new/changed search pages; reuse manifest rows for the rest."""
+    manifest = Manifest("staging_categories", version=ROWS_VERSION)
+    if full:
+        manifest.clear()
+
+    with span("build_staging_categories") as s:
+        changed = manifest.plan(search_files())
+        for fp, data in iter_pages(changed):
+            manifest.record(fp, page_rows(data))
+        manifest.save()
+
+        print(f"Search pages parsed: {len(changed)} (cached: {len(manifest.entries) - len(changed)})")
+        df = frame_from_rows(list(manifest.rows()))
+        s.set(
+            rows_in=len(changed),
+            bytes_read=sum(fp.stat().st_size for fp in changed),
+            rows_out=len(df),
+            cached_files=len(manifest.entries) - len(changed),
+        )
+    return df
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build data/staging/staging_categories.csv.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-parse every raw file")
+    args = parser.parse_args(argv)
+
+    save(build(full=args.full))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
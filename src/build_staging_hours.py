@@ -1,94 +1,206 @@
-import json
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
-import pandas as pd
+from typing import Iterator
 
+import pandas as pd
 
-DETAILS_DIR = Path("data/raw/details")
-OUT_DIR = Path("data/staging")
-OUT_PATH = OUT_DIR / "staging_hours.csv"
+from manifest import Manifest, file_stamp
+from metrics import span
+from raw_reader import detail_files, iter_pages
+from raw_store import StoredResponse
+from restaurant_keys import lookup_keys
+from staging_io import write_table
 
-LATE_NIGHT_CUTOFF = "23:00" # 11PM
 
+OUT = "staging_hours"
 
-def hhmm_from_yelp(time_str: str | None) -> str | None:
-    """Convert Yelp time like '1730' -> '17:30'."""
-    if not time_str or not isinstance(time_str, str):
-        return None
-    s = time_str.strip()
-    if len(s) != 4 or not s.isdigit():
-        return None
-    return f"{s[:2]} : {s[2:]}"
-
-
-def main() -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-    files = sorted(DETAILS_DIR.glob("*.json"))
-    if not files:
-        raise FileNotFoundError("No detail JSON files found in data/raw/details")
-    
-    rows = []
-    missing_hours = 0
-
-    for fp in files:
-        data = json.loads(fp.read_text(encoding='utf-8'))
-        source_id = data.get('id')
-        if not source_id:
-            continue
-
-        hours_list = data.get("hours") or []
-        if not hours_list:
-            missing_hours += 1
-            continue
-
-        # Yelp can have multiple "hours" entries
-        open_periods = hours_list[0].get('open') or []
-        for p in open_periods:
-            day = p.get("day")
-            start = hhmm_from_yelp(p.get("start"))
-            end = hhmm_from_yelp(p.get("end"))
-
-            if start is None or end is None or day is None:
-                continue
-
-            # Overnight if it crosses midnight (18:00 -> 02:00)
-            is_overnight = end < start
-
-            # Late-night: open past 11pm or overnight
-            is_late_night_llpm = is_overnight or (end >= LATE_NIGHT_CUTOFF)
-
-            rows.append(
-                {
-                    "source": "yelp",
-                    "source_id": source_id,
-                    "day": int(day),
-                    "start_time": start,
-                    "end_time": end,
-                    "is_overnight": int(is_overnight),
-                    "is_late_night_11pm": int(is_late_night_llpm)
-                }
-            )
-    df = pd.DataFrame(rows)
+LATE_NIGHT_CUTOFF = "23:00" # 11PM
+LATE_NIGHT_CUTOFF_MINUTE = int(LATE_NIGHT_CUTOFF[:2]) * 60 + int(LATE_NIGHT_CUTOFF[3:])
+
+# Only regular weekly hours drive the late-night flag; special/holiday sets are kept but not flagged
+REGULAR = "REGULAR"
+
+COLUMNS = [
+    "source",
+    "restaurant_key",
+    "hours_type",
+    "day",
+    "start_time",
+    "end_time",
+    "start_minute",
+    "end_minute",
+    "is_overnight",
+    "is_late_night_11pm"
+]
+
+PERIOD_COLUMNS = ["source_id", "hours_type", "day", "start", "end"]
+
+# Bump when hour_rows changes so cached manifest rows are rebuilt
+ROWS_VERSION = 2
+
+# Shards per worker process; more, smaller shards even out slow files
+SHARDS_PER_WORKER = 4
+
+
+def hour_rows(data: dict) -> list[list]:
+    """Raw open periods as flat [source_id, hours_type, day, start, end] records.
+
+    Every "hours" entry is kept (REGULAR plus any special sets); parsing is
+    left to frame_from_rows, which does it column-wise over all files at once.
+    """
+    source_id = data.get('id')
+    if not source_id:
+        return []
+
+    return [
+        [source_id, h.get("hours_type") or REGULAR, p.get("day"), p.get("start"), p.get("end")]
+        for h in data.get("hours") or []
+        for p in h.get("open") or []
+    ]
+
+
+def is_missing_hours(data: dict) -> bool:
+    return bool(data.get('id')) and not data.get("hours")
+
+
+def parse_shard(files: list[Path | StoredResponse]) -> list[tuple[list[list], bool, dict]]:
+    """(hour rows, missing hours, manifest stamp) for each detail file of one shard, in order."""
+    return [(hour_rows(data), is_missing_hours(data), file_stamp(fp)) for fp, data in iter_pages(files)]
+
+
+def parse_files(
+    files: list[Path | StoredResponse],
+    workers: int = 1,
+) -> Iterator[tuple[Path | StoredResponse, list[list], bool, dict]]:
+    """Parse detail files, optionally sharded across `workers` processes.
+
+    Shards are contiguous slices of `files` and their results are joined
+    in shard order, so the output does not depend on `workers`. Workers are
+    spawned rather than forked, since the pipeline calls this from a thread.
+    """
+    if workers <= 1 or len(files) < 2:
+        results = parse_shard(files)
+    else:
+        size = math.ceil(len(files) / (workers * SHARDS_PER_WORKER))
+        shards = [files[i:i + size] for i in range(0, len(files), size)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            results = [item for shard in pool.map(parse_shard, shards) for item in shard]
+
+    for fp, (rows, missing_hours, stamp) in zip(files, results):
+        yield fp, rows, missing_hours, stamp
+
+
+def hhmm_minutes(s: pd.Series) -> pd.Series:
+    """Yelp "HHMM" strings -> minutes since midnight."""
+    return s.str[:2].astype(int) * 60 + s.str[2:].astype(int)
+
+
+def frame_from_rows(rows: list[list]) -> pd.DataFrame:
+    """Build the hours frame from period records, parsing every time column-wise."""
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+
+    df = pd.DataFrame.from_records(rows, columns=PERIOD_COLUMNS)
+
+    # Yelp times are "HHMM"; drop periods with a missing day or malformed time,
+    # and periods of businesses with no staging_restaurants row
+    start = df["start"].astype("string").str.strip()
+    end = df["end"].astype("string").str.strip()
+    keys = lookup_keys(df["source_id"], OUT)
+    valid = (
+        start.str.fullmatch(r"\d{4}").fillna(False)
+        & end.str.fullmatch(r"\d{4}").fillna(False)
+        & df["day"].notna()
+        & keys.notna()
+    )
+    df, start, end, keys = df[valid], start[valid], end[valid], keys[valid]
+
+    start_minute = hhmm_minutes(start)
+    end_minute = hhmm_minutes(end)
+    start_time = start.str[:2] + " : " + start.str[2:]
+    end_time = end.str[:2] + " : " + end.str[2:]
+    hours_type = df["hours_type"]
+
+    # Overnight if it crosses midnight (18:00 -> 02:00)
+    is_overnight = end_minute < start_minute
+
+    # Late-night: regular hours open past 11pm or overnight. Compared in minutes;
+    # the "HH : MM" strings sort before "23:00", so no 11pm close ever counted.
+    is_late_night = (hours_type == REGULAR) & (is_overnight | (end_minute >= LATE_NIGHT_CUTOFF_MINUTE))
+
+    out = pd.DataFrame({
+        "source": "yelp",
+        "restaurant_key": keys.astype("int32"),
+        "hours_type": hours_type,
+        "day": df["day"].astype(int),
+        "start_time": start_time,
+        "end_time": end_time,
+        "start_minute": start_minute.astype("int16"),
+        "end_minute": end_minute.astype("int16"),
+        "is_overnight": is_overnight.astype(int),
+        "is_late_night_11pm": is_late_night.astype(int),
+    }).reset_index(drop=True)
 
     # Dedupe in case of weird duplicates
-    if not df.empty:
-        df = df.drop_duplicates(subset=['source_id', 'day', 'start_time', 'end_time'], keep='first')
+    return out.drop_duplicates(subset=['restaurant_key', 'hours_type', 'day', 'start_time', 'end_time'], keep='first')
+
 
-    df.to_csv(OUT_PATH, index=False)
+def save(df: pd.DataFrame, missing_hours: int) -> None:
+    out_path = write_table(df, OUT)
 
-    print(f"Saved: {OUT_PATH}")
+    print(f"Saved: {out_path}")
     print(f"Hour rows: {len(df)}")
-    print(f"Restaurants with hours: {df['source_id'].nunique() if not df.empty else 0}")
+    print(f"Restaurants with hours: {df['restaurant_key'].nunique() if not df.empty else 0}")
     print(f"Restaurants missing hours: {missing_hours}")
 
     if not df.empty:
-        late = df.groupby('source_id')['is_late_night_11pm'].max()
+        late = df.groupby('restaurant_key')['is_late_night_11pm'].max()
         print(f"Late-night (11pm+) restaurants: {int(late.sum())}")
 
         print("\nSample late-night rows:")
         sample = df[df['is_late_night_11pm'] == 1].head(10)
-        print(sample[['source_id', 'day', 'start_time', 'end_time', 'is_overnight', 'is_late_night_11pm']].to_string(index=False))
+        print(sample[['restaurant_key', 'hours_type', 'day', 'start_time', 'end_time', 'is_overnight', 'is_late_night_11pm']].to_string(index=False))
+
+
+def build(full: bool = False, workers: int = 1) -> tuple[pd.DataFrame, int]:
+    """Parse only new/changed detail files; reuse manifest rows for the rest.
+
+    With `workers` > 1 the changed files are parsed in that many processes.
+    Returns the hours frame and the number of restaurants missing hours.
+    """
+    manifest = Manifest("staging_hours", version=ROWS_VERSION)
+    if full:
+        manifest.clear()
+
+    with span("build_staging_hours", workers=workers) as s:
+        changed = manifest.plan(detail_files())
+        for fp, rows, missing_hours, stamp in parse_files(changed, workers):
+            manifest.record(fp, rows, stamp, missing_hours=missing_hours)
+        manifest.save()
+
+        print(f"Detail files parsed: {len(changed)} (cached: {len(manifest.entries) - len(changed)})")
+        missing_hours = sum(bool(m) for m in manifest.meta("missing_hours"))
+        df = frame_from_rows(list(manifest.rows()))
+        s.set(
+            rows_in=len(changed),
+            bytes_read=sum(fp.stat().st_size for fp in changed),
+            rows_out=len(df),
+            cached_files=len(manifest.entries) - len(changed),
+        )
+    return df, missing_hours
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build data/staging/staging_hours.csv.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-parse every detail file")
+    parser.add_argument("--workers", type=int, default=1, help="processes parsing detail files (1 = serial)")
+    args = parser.parse_args(argv)
+
+    save(*build(full=args.full, workers=args.workers))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,89 +1,109 @@
-import json
-from pathlib import Path
-from math import radians, sin, cos, asin, sqrt
+import argparse
+from typing import Iterable, Iterator
+import numpy as np
 import pandas as pd
 
+from manifest import Manifest
+from metrics import span
+from raw_reader import iter_businesses, iter_pages, search_files
+from restaurant_keys import assign_keys
+from staging_io import blanks_to_na, write_table
+
 # UCF center point
 UCF_LAT = 28.6024
 UCF_LON = -81.2001
 
-RAW_DIR = Path("data/raw")
-OUT_DIR = Path("data/staging")
-OUT_PATH = OUT_DIR / "staging_restaurants.csv"
+# One distance_to_{name}_miles column is emitted per reference point;
+# the first one drives the output sort order.
+REFERENCE_POINTS = {
+    "ucf": (UCF_LAT, UCF_LON),
+}
+
+OUT = "staging_restaurants"
+
+# Bump when restaurant_row changes so cached manifest rows are rebuilt
+ROWS_VERSION = 2
 
 
-def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Great-circle distance between two points (miles)."""
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points (miles).
+
+    Works on scalars or NumPy arrays (broadcast); NaN coordinates give NaN.
+    """
     # radius of Earth (miles)
     R = 3958.7613
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
     dlat = lat2- lat1
     dlon = lon2- lon1
 
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
     return R * c
 
-def load_businesses() -> list[dict]:
-    files = sorted(RAW_DIR.glob("yelp_search_offset_*.json"))
-    if not files:
-        raise FileNotFoundError("No raw files found in data/raw (expected yelp_search_offset_*.json)")
-    
-    businesses: list[dict] = []
-    for fp in files:
-        data = json.loads(fp.read_text(encoding="utf-8"))
-        businesses.extend(data.get("businesses", []))
-    return businesses
-
-def normalize(businesses: list[dict]) -> pd.DataFrame:
-    rows = []
-    for b in businesses:
-        bid = b.get("id")
-        coords = b.get("coordinates") or {}
-        loc = b.get("location") or {}
-
-        lat = coords.get("latitude")
-        lon = coords.get("longitude")
-
-        # Basic address flattening
-        display_address = loc.get("display_address") or []
-        address_1 = loc.get("address1")
-        address_2 = loc.get("address2")
-        address_3 = loc.get("address3")
-        city = loc.get("city")
-        state = loc.get("state")
-        zip_code = loc.get("zip_code")
-        full_address = ", ".join([x for x in display_address if x]) if display_address else None
-
-        # Distance to UCF
-        if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
-            distance_to_ucf = haversine_miles(UCF_LAT, UCF_LON, float(lat), float(lon))
-
-        rows.append(
-            {
-                "source": "yelp",
-                "source_id": bid,
-                "name": b.get("name"),
-                "rating": b.get("rating"),
-                "review_count": b.get("review_count"),
-                "price": b.get("price"),
-                "is_closed": b.get("is_closed"),
-                "phone": b.get("phone"),
-                "display_phone": b.get("display_phone"),
-                "url": b.get("url"),
-                "latitude": lat,
-                "longitude": lon,
-                "distance_to_ucf_miles": distance_to_ucf,
-                "address1": address_1,
-                "address2": address_2,
-                "address3": address_3,
-                "city": city,
-                "state": state,
-                "zip_code": zip_code,
-                "full_address": full_address
-            }
-        )
-    
+def distance_column(name: str) -> str:
+    return f"distance_to_{name}_miles"
+
+def add_distance_columns(df: pd.DataFrame, reference_points: dict[str, tuple[float, float]]) -> pd.DataFrame:
+    """Add one distance column per reference point in a single vectorized pass.
+
+    Columns are inserted right after `longitude`; rows without coordinates get NaN.
+    """
+    lat = pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=float)
+
+    at = df.columns.get_loc("longitude") + 1
+    for i, (name, (ref_lat, ref_lon)) in enumerate(reference_points.items()):
+        df.insert(at + i, distance_column(name), haversine_miles(ref_lat, ref_lon, lat, lon))
+    return df
+
+def load_businesses() -> Iterator[dict]:
+    """Stream businesses from data/raw/yelp_search_offset_*.json, one page at a time."""
+    return iter_businesses()
+
+def restaurant_row(b: dict) -> dict:
+    bid = b.get("id")
+    coords = b.get("coordinates") or {}
+    loc = b.get("location") or {}
+
+    lat = coords.get("latitude")
+    lon = coords.get("longitude")
+
+    # Basic address flattening
+    display_address = loc.get("display_address") or []
+    address_1 = loc.get("address1")
+    address_2 = loc.get("address2")
+    address_3 = loc.get("address3")
+    city = loc.get("city")
+    state = loc.get("state")
+    zip_code = loc.get("zip_code")
+    full_address = ", ".join([x for x in display_address if x]) if display_address else None
+
+    return {
+        "source": "yelp",
+        "source_id": bid,
+        "name": b.get("name"),
+        "rating": b.get("rating"),
+        "review_count": b.get("review_count"),
+        "price": b.get("price"),
+        "is_closed": b.get("is_closed"),
+        "phone": b.get("phone"),
+        "display_phone": b.get("display_phone"),
+        "url": b.get("url"),
+        "latitude": lat,
+        "longitude": lon,
+        "address1": address_1,
+        "address2": address_2,
+        "address3": address_3,
+        "city": city,
+        "state": state,
+        "zip_code": zip_code,
+        "full_address": full_address
+    }
+
+def frame_from_rows(
+    rows: list[dict],
+    reference_points: dict[str, tuple[float, float]] = REFERENCE_POINTS,
+) -> pd.DataFrame:
     df = pd.DataFrame(rows)
 
     # Drop rows missing a business id
@@ -92,24 +112,78 @@ def normalize(businesses: list[dict]) -> pd.DataFrame:
     # Deduplicate: keep first occurrence per source_id
     df = df.drop_duplicates(subset=['source_id'], keep= "first")
 
-    # Sort by distance
-    if "distance_to_ucf_miles" in df.columns:
-        df = df.sort_values(by='distance_to_ucf_miles', ascending=True, na_position='last')
-    return df
+    # Yelp sends "" for absent address parts; store them as missing, as CSV staging does
+    df = blanks_to_na(df)
+
+    # Dense int32 surrogate key; the other staging tables carry only this
+    df.insert(0, "restaurant_key", assign_keys(df["source_id"]))
 
+    # Distances are computed once per unique restaurant, not per raw row
+    df = add_distance_columns(df, reference_points)
 
-def main() -> None:
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    # Sort by distance to the first reference point
+    sort_col = distance_column(next(iter(reference_points)))
+    df = df.sort_values(by=sort_col, ascending=True, na_position='last')
+    return df
 
-    businesses = load_businesses()
-    df = normalize(businesses)
+def normalize(
+    businesses: Iterable[dict],
+    reference_points: dict[str, tuple[float, float]] = REFERENCE_POINTS,
+) -> pd.DataFrame:
+    return frame_from_rows([restaurant_row(b) for b in businesses], reference_points)
+
+def parse_reference_points(extra: list[list[str]] | None) -> dict[str, tuple[float, float]]:
+    """REFERENCE_POINTS plus any `--ref NAME LAT LON` given on the command line."""
+    points = dict(REFERENCE_POINTS)
+    for name, lat, lon in extra or []:
+        points[name] = (float(lat), float(lon))
+    return points
+
+def page_rows(data: dict) -> list[dict]:
+    return [restaurant_row(b) for b in data.get("businesses", [])]
+
+def build(
+    full: bool = False,
+    reference_points: dict[str, tuple[float, float]] = REFERENCE_POINTS,
+) -> pd.DataFrame:
+    """Normalize only new/changed search pages; reuse manifest rows for the rest."""
+    manifest = Manifest("staging_restaurants", version=ROWS_VERSION)
+    if full:
+        manifest.clear()
+
+    with span("build_staging_restaurants") as s:
+        changed = manifest.plan(search_files())
+        for fp, data in iter_pages(changed):
+            manifest.record(fp, page_rows(data))
+        manifest.save()
+
+        print(f"Search pages parsed: {len(changed)} (cached: {len(manifest.entries) - len(changed)})")
+        df = frame_from_rows(list(manifest.rows()), reference_points)
+        s.set(
+            rows_in=len(changed),
+            bytes_read=sum(fp.stat().st_size for fp in changed),
+            rows_out=len(df),
+            cached_files=len(manifest.entries) - len(changed),
+        )
+    return df
 
-    df.to_csv(OUT_PATH, index=False)
-    print(f"Saved: {OUT_PATH}")
+
+def save(df: pd.DataFrame) -> None:
+    out_path = write_table(df, OUT)
+    print(f"Saved: {out_path}")
     print(f"Unique restaurants: {len(df)}")
     print("Top 5 closest (name, miles):")
     print(df[["name", "distance_to_ucf_miles"]].head(5).to_string(index=False))
 
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build data/staging/staging_restaurants.csv.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-parse every raw file")
+    parser.add_argument("--ref", nargs=3, action="append", metavar=("NAME", "LAT", "LON"),
+                        help="extra reference point; adds a distance_to_NAME_miles column")
+    args = parser.parse_args(argv)
+
+    save(build(full=args.full, reference_points=parse_reference_points(args.ref)))
+
 if __name__ == "__main__":
     main()
-        
\ No newline at end of file
@@ -0,0 +1,52 @@
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+# Yelp category aliases with their parent alias and, where one applies, a
+# canonical cuisine. Aliases without a cuisine inherit their nearest ancestor's.
+TAXONOMY_PATH = Path("data/reference/yelp_categories.csv")
+
+MAX_DEPTH = 16
+
+
+def load_taxonomy(path: Path = TAXONOMY_PATH) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype=str, keep_default_na=False).replace("", None)
+    dupes = df["alias"][df["alias"].duplicated()]
+    if not dupes.empty:
+        raise ValueError(f"{path}: duplicate aliases {sorted(dupes.unique())}")
+    return df
+
+
+def resolve(taxonomy: pd.DataFrame) -> pd.DataFrame:
+    """alias -> canonical_cuisine for every alias that resolves to one.
+
+    Walks every unresolved alias one level up the parent chain per step, for
+    all aliases at once, until each has a cuisine or runs out of parents.
+    """
+    parent = taxonomy.set_index("alias")["parent"]
+    cuisine = taxonomy.set_index("alias")["canonical_cuisine"]
+
+    resolved = cuisine.copy()
+    ancestor = parent.copy()
+    for _ in range(MAX_DEPTH + 1):
+        pending = resolved.isna() & ancestor.notna()
+        if not pending.any():
+            break
+        resolved[pending] = ancestor[pending].map(cuisine)
+        ancestor[pending] = ancestor[pending].map(parent)
+    else:
+        raise ValueError(f"category parent chains deeper than {MAX_DEPTH}; is there a cycle?")
+
+    out = resolved.dropna().rename("canonical_cuisine").rename_axis("category_alias").reset_index()
+    return out
+
+
+@lru_cache(maxsize=4)
+def _resolved(path: str, mtime_ns: int) -> pd.DataFrame:
+    return resolve(load_taxonomy(Path(path)))
+
+
+def cuisine_lookup(path: Path = TAXONOMY_PATH) -> pd.DataFrame:
+    """Resolved alias -> canonical_cuisine table, cached until the taxonomy file changes."""
+    return _resolved(str(path), path.stat().st_mtime_ns)
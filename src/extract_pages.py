@@ -1,38 +1,273 @@
-import json
+import argparse
+import math
 import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import requests
 from dotenv import load_dotenv
 
+from http_cache import DEFAULT_TTL_DAYS, ResponseCache
+from metrics import http, span
+from raw_store import StoreCache, open_cache
+from yelp_client import DEFAULT_BASE_URL, TokenBucket, conditional_get_json, make_session
+
 UCF_LAT = 28.6024
 UCF_LON = -81.2001
 
-SEARCH_URL = "https://api.yelp.com/v3/businesses/search"
+SEARCH_PATH = "/v3/businesses/search"
+SEARCH_URL = DEFAULT_BASE_URL + SEARCH_PATH
 
-def fetch_page(api_key: str, offset: int, radius: int = 5000) -> dict:
-    headers = {"Authorization": f"Bearer {api_key}"}
-    params = {
-        "latitude": UCF_LAT,
-        "longitude": UCF_LON,
+PAGE_SIZE = 50
+OFFSET_CAP = 240            # Yelp only pages through the first 240 results of a query
+MAX_RADIUS_M = 40000        # Yelp's maximum search radius
+
+# (south, west, north, east)
+ORANGE_COUNTY_BBOX = (28.3470, -81.6590, 28.7860, -80.8620)
+MIN_CELL_DEG = 0.005        # ~500m; stop splitting below this even if still over the cap
+
+Cell = tuple[float, float, float, float]
+
+
+def search_params(latitude: float, longitude: float, radius: int, offset: int, limit: int = PAGE_SIZE) -> dict:
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
         "radius": radius,
         "categories": "restaurants",
-        "limit": 50,
+        "limit": limit,
         "offset": offset,
         "sort_by": "rating"
     }
 
+
+def fetch_page(
+    api_key: str,
+    offset: int,
+    radius: int = 5000,
+    latitude: float = UCF_LAT,
+    longitude: float = UCF_LON,
+    etag: str | None = None,
+) -> tuple[dict | None, str | None]:
+    """(page, ETag); page is None when Yelp answers 304 to `etag`."""
+    headers = {"Authorization": f"Bearer {api_key}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    params = search_params(latitude, longitude, radius, offset)
+
+    start = time.perf_counter()
     resp = requests.get(SEARCH_URL, headers=headers, params=params, timeout=30)
+    http.observe(time.perf_counter() - start, resp.status_code)
 
     #Rate-limit handling
     if resp.status_code == 429:
         raise RuntimeError("Rate limited (429). Try again later or slow down requests.")
-    
+    if resp.status_code == 304:
+        return None, resp.headers.get("ETag", etag)
+
     resp.raise_for_status()
-    return resp.json()
+    return resp.json(), resp.headers.get("ETag")
+
+
+def record_ids(businesses: list[dict], seen_ids: set[str]) -> int:
+    """Add business ids to seen_ids. Returns how many were new."""
+    before = len(seen_ids)
+    for b in businesses:
+        bid = b.get("id")
+        if bid:
+            seen_ids.add(bid)
+    return len(seen_ids) - before
+
+
+def cell_center(cell: Cell) -> tuple[float, float]:
+    south, west, north, east = cell
+    return (south + north) / 2, (west + east) / 2
+
+
+def cell_radius_m(cell: Cell) -> int:
+    """Radius (meters) of the circle around the cell center that covers the whole cell."""
+    south, west, north, east = cell
+    lat, _ = cell_center(cell)
+    half_h = (north - south) / 2 * 111_320
+    half_w = (east - west) / 2 * 111_320 * math.cos(math.radians(lat))
+    return min(MAX_RADIUS_M, math.ceil(math.hypot(half_h, half_w)))
+
+
+def tile_bbox(bbox: Cell, cell_deg: float) -> list[tuple[str, Cell]]:
+    """Split a bounding box into a grid of roughly cell_deg x cell_deg cells."""
+    south, west, north, east = bbox
+    rows = max(1, math.ceil((north - south) / cell_deg))
+    cols = max(1, math.ceil((east - west) / cell_deg))
+    dlat = (north - south) / rows
+    dlon = (east - west) / cols
+
+    cells = []
+    for r in range(rows):
+        for c in range(cols):
+            cell = (south + r * dlat, west + c * dlon, south + (r + 1) * dlat, west + (c + 1) * dlon)
+            cells.append((f"r{r:02d}c{c:02d}", cell))
+    return cells
+
+
+def split_cell(cell_id: str, cell: Cell) -> list[tuple[str, Cell]]:
+    """Quarter a cell; child ids append the quadrant number to the parent id."""
+    south, west, north, east = cell
+    mid_lat, mid_lon = cell_center(cell)
+    return [
+        (f"{cell_id}q0", (south, west, mid_lat, mid_lon)),
+        (f"{cell_id}q1", (south, mid_lon, mid_lat, east)),
+        (f"{cell_id}q2", (mid_lat, west, north, mid_lon)),
+        (f"{cell_id}q3", (mid_lat, mid_lon, north, east)),
+    ]
+
+
+def crawl_grid(
+    api_key: str,
+    bbox: Cell,
+    out_dir: Path,
+    cell_deg: float = 0.05,
+    workers: int = 8,
+    limiter: TokenBucket | None = None,
+    search_url: str = SEARCH_URL,
+    cache: ResponseCache | StoreCache | None = None,
+    ttl_days: float = DEFAULT_TTL_DAYS["search"],
+    budget: int | None = None,
+) -> set[str]:
+    """Crawl every restaurant in bbox by tiling it into cells.
+
+    A cell whose `total` exceeds OFFSET_CAP is quartered instead of paged, so
+    no query is ever truncated (down to MIN_CELL_DEG). Cells and pages are
+    fetched concurrently under one shared rate limiter, and every page is
+    cached as data/raw/yelp_search_offset_{cell}_{offset}.json so the staging
+    builders pick it up alongside the single-center pages.
+
+    Cached pages are reused until they are due per `cache.plan` (older than
+    `ttl_days`, at most `budget` of them); due pages are revalidated with
+    their ETag.
+    """
+    limiter = limiter or TokenBucket(rate=5.0)
+    cache = cache or open_cache(out_dir)
+    session = make_session(pool_size=workers)
+    seen_ids: set[str] = set()
+    lock = threading.Lock()
+    stats = {"cells": 0, "split": 0, "truncated": 0, "pages": 0, "fetched": 0, "not_modified": 0, "failed": 0}
+    failed: list[tuple[str, int, str]] = []
+
+    _, refresh = cache.plan(cache.glob(out_dir, "yelp_search_offset_r*.json"), ttl_days, budget)
+    due = set(refresh)
+
+    def load_page(cell_id: str, cell: Cell, offset: int) -> dict:
+        out_path = out_dir / f"yelp_search_offset_{cell_id}_{offset:03d}.json"
+
+        data = None
+        if not cache.exists(out_path) or out_path in due:
+            lat, lon = cell_center(cell)
+            # Yelp rejects limit + offset past OFFSET_CAP, so the last page is shorter
+            params = search_params(lat, lon, cell_radius_m(cell), offset, limit=min(PAGE_SIZE, OFFSET_CAP - offset))
+            data, etag = conditional_get_json(
+                session, search_url, api_key, limiter, params=params, etag=cache.etag(out_path)
+            )
+            if data is not None:
+                cache.write(out_path, data)
+            cache.record(out_path, etag)
+            with lock:
+                stats["fetched" if data is not None else "not_modified"] += 1
+
+        # Fresh or unchanged: reuse the cached file
+        if data is None:
+            data = cache.read(out_path)
+
+        with lock:
+            record_ids(data.get("businesses", []), seen_ids)
+            stats["pages"] += 1
+        return data
+
+    def try_load_page(cell_id: str, cell: Cell, offset: int) -> dict | None:
+        """load_page, recording an HTTP failure in `stats` instead of ending the crawl."""
+        try:
+            return load_page(cell_id, cell, offset)
+        except requests.RequestException as e:
+            with lock:
+                stats["failed"] += 1
+                failed.append((cell_id, offset, str(e)))
+            return None
+
+    def crawl_page(cell_id: str, cell: Cell, offset: int) -> list:
+        try_load_page(cell_id, cell, offset)
+        return []
+
+    def crawl_cell(cell_id: str, cell: Cell) -> list:
+        """Fetch the first page of a cell; returns follow-up tasks."""
+        data = try_load_page(cell_id, cell, 0)
+        if data is None:
+            return []
+        total = data.get("total") or 0
+        size = min(cell[2] - cell[0], cell[3] - cell[1])
+
+        split = total > OFFSET_CAP and size / 2 >= MIN_CELL_DEG
+
+        with lock:
+            stats["cells"] += 1
+            if split:
+                stats["split"] += 1
+            elif total > OFFSET_CAP:
+                stats["truncated"] += 1
+
+        if split:
+            return [(crawl_cell, child_id, child) for child_id, child in split_cell(cell_id, cell)]
+
+        last = min(total, OFFSET_CAP)
+        return [(crawl_page, cell_id, cell, offset) for offset in range(PAGE_SIZE, last, PAGE_SIZE)]
+
+    reported = 0
+    try:
+        with session, ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {pool.submit(crawl_cell, cell_id, cell) for cell_id, cell in tile_bbox(bbox, cell_deg)}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for fn, *task_args in future.result():
+                        running.add(pool.submit(fn, *task_args))
+
+                with lock:
+                    if stats["pages"] - reported >= 100:
+                        reported = stats["pages"]
+                        cache.save()
+                        print(
+                            f"cells={stats['cells']} | split={stats['split']} | pages={stats['pages']} "
+                            f"| unique_so_far={len(seen_ids)} | rate={limiter.rate:.2f}/s"
+                        )
+    finally:
+        cache.save()
+
+    print(
+        f"\nGrid crawl: cells={stats['cells']} | split={stats['split']} | "
+        f"truncated={stats['truncated']} | pages={stats['pages']} | "
+        f"fetched={stats['fetched']} | not_modified={stats['not_modified']} | failed={stats['failed']}"
+    )
+    for cell_id, offset, error in failed:
+        print(f"Failed page: cell={cell_id} offset={offset}: {error}")
+    return seen_ids
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Extract Yelp search pages into data/raw.")
+    parser.add_argument("--grid", action="store_true",
+                        help="crawl a bounding box as concurrent geo cells instead of one UCF-centered query")
+    parser.add_argument("--bbox", type=float, nargs=4, default=ORANGE_COUNTY_BBOX,
+                        metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    parser.add_argument("--cell-deg", type=float, default=0.05, help="initial grid cell size in degrees")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="max requests/sec shared by all workers")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS["search"],
+                        help="refetch cached pages older than this")
+    parser.add_argument("--budget", type=int,
+                        help="max cached pages to refresh this run, oldest first; spare budget "
+                             "refreshes pages close to expiry (default: every expired page)")
+    args = parser.parse_args(argv)
 
-def main() -> None:
     load_dotenv()
     api_key = os.getenv("YELP_API_KEY")
     if not api_key:
@@ -40,6 +275,27 @@ def main() -> None:
     
     out_dir = Path("data/raw")
     out_dir.mkdir(parents=True, exist_ok=True)
+    cache = open_cache(out_dir)
+
+    if args.grid:
+        search_url = os.getenv("YELP_API_BASE_URL", DEFAULT_BASE_URL).rstrip("/") + SEARCH_PATH
+        with span("crawl_grid", workers=args.workers) as s:
+            seen_ids = crawl_grid(
+                api_key,
+                tuple(args.bbox),
+                out_dir,
+                cell_deg=args.cell_deg,
+                workers=args.workers,
+                limiter=TokenBucket(rate=args.rate),
+                search_url=search_url,
+                cache=cache,
+                ttl_days=args.ttl_days,
+                budget=args.budget,
+            )
+            s.set(rows_out=len(seen_ids))
+        print(f"Done. Unique restaurants collected: {len(seen_ids)}")
+        print("Raw files saved in: data/raw/")
+        return
 
     target_restaurants = 200    # Stop once ~200 unique businesses
     pause_sec = 1.0
@@ -49,37 +305,43 @@ def main() -> None:
     offset = 0
     page_num = 0
 
-    while len(seen_ids) < target_restaurants and offset <= max_offset:
-        out_path = out_dir / f"yelp_search_offset_{offset:03d}.json"
-
-        # If file already exists, reuse it
-        if out_path.exists():
-            data = json.loads(out_path.read_text(encoding="utf-8"))
-        else:
-            data = fetch_page(api_key, offset)
-            out_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
-
-        businesses = data.get("businesses", [])
-        if not businesses:
-            print(f"No more results at offset={offset}. Stopping.")
-            break
-
-        for b in businesses:
-            bid = b.get("id")
-            if bid:
-                seen_ids.add(bid)
+    _, refresh = cache.plan(cache.glob(out_dir, "yelp_search_offset_[0-9]*.json"), args.ttl_days, args.budget)
+    due = set(refresh)
+
+    with span("extract_pages") as s:
+        while len(seen_ids) < target_restaurants and offset <= max_offset:
+            out_path = out_dir / f"yelp_search_offset_{offset:03d}.json"
+
+            # Reuse the cached file unless it is missing, or due and changed upstream
+            data = None
+            if not cache.exists(out_path) or out_path in due:
+                data, etag = fetch_page(api_key, offset, etag=cache.etag(out_path))
+                if data is not None:
+                    cache.write(out_path, data)
+                cache.record(out_path, etag)
+                cache.save()
+            if data is None:
+                data = cache.read(out_path)
+
+            businesses = data.get("businesses", [])
+            if not businesses:
+                print(f"No more results at offset={offset}. Stopping.")
+                break
+
+            record_ids(businesses, seen_ids)
         
-        print(
-            f"Saved/loaded {out_path.name} | "
-            f"page_businesses={len(businesses)} | "
-            f"unique_so_far={len(seen_ids)}"
-        )
-
-        # Next page
-        page_num += 1
-        offset += 50
-        time.sleep(pause_sec)
-    
+            print(
+                f"Saved/loaded {out_path.name} | "
+                f"page_businesses={len(businesses)} | "
+                f"unique_so_far={len(seen_ids)}"
+            )
+
+            # Next page
+            page_num += 1
+            offset += 50
+            time.sleep(pause_sec)
+        s.set(rows_in=page_num, rows_out=len(seen_ids))
+
     print(f"\nDone. Unique restaurants collected: {len(seen_ids)}")
     print("Raw files saved in: data/raw/")
 
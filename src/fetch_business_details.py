@@ -1,82 +1,209 @@
-import json
+import argparse
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import pandas as pd
 import requests
 from dotenv import load_dotenv
 
-DETAILS_URL = "https://api.yelp.com/v3/businesses/{}"
-STAGING_RESTAURANTS = Path("data/staging/staging_restaurants.csv")
+from http_cache import DEFAULT_TTL_DAYS, ResponseCache
+from metrics import http, span
+from raw_store import StoreCache, open_cache
+from staging_io import read_table
+from yelp_client import (
+    DEFAULT_BASE_URL,
+    RateLimitError,
+    TokenBucket,
+    conditional_get_json,
+    make_session,
+    parse_retry_after,
+)
+
+DETAILS_PATH = "/v3/businesses/{}"
+DETAILS_URL = DEFAULT_BASE_URL + DETAILS_PATH
+STAGING_RESTAURANTS = "staging_restaurants"
 OUT_DIR = Path("data/raw/details")
 
 
-def fetch_one(api_key: str, business_id: str) -> dict:
+def fetch_one(
+    api_key: str,
+    business_id: str,
+    session: requests.Session | None = None,
+    details_url: str = DETAILS_URL,
+    etag: str | None = None,
+) -> tuple[dict | None, str | None]:
+    """(details, ETag); details is None when Yelp answers 304 to `etag`."""
     headers = {"Authorization": f"Bearer {api_key}"}
-    url = DETAILS_URL.format(business_id)
-    resp = requests.get(url, headers=headers, timeout=30)
+    if etag:
+        headers["If-None-Match"] = etag
+    url = details_url.format(business_id)
+    start = time.perf_counter()
+    resp = (session or requests).get(url, headers=headers, timeout=30)
+    http.observe(time.perf_counter() - start, resp.status_code)
 
     # Yelp rate limiting can return 429 :contentReference[oaicite:4]{index=4}
     if resp.status_code == 429:
-        raise RuntimeError("429 rate limit from Yelp (Too Many Requests)")
-    
+        raise RateLimitError(
+            "429 rate limit from Yelp (Too Many Requests)",
+            retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+        )
+    if resp.status_code == 304:
+        return None, resp.headers.get("ETag", etag)
+
     resp.raise_for_status()
-    return resp.json()
+    return resp.json(), resp.headers.get("ETag")
+
+
+def due_ids(
+    cache: ResponseCache | StoreCache,
+    ids: list[str],
+    ttl_days: float,
+    budget: int | None = None,
+) -> list[str]:
+    """Ids with no cached details, then cached ones due for a refresh (see ResponseCache.plan)."""
+    missing, refresh = cache.plan([OUT_DIR / f"{bid}.json" for bid in ids], ttl_days, budget)
+    return [path.stem for path in missing + refresh]
+
+
+def fetch_concurrent(
+    api_key: str,
+    ids: list[str],
+    workers: int,
+    limiter: TokenBucket,
+    details_url: str = DETAILS_URL,
+    cache: ResponseCache | StoreCache | None = None,
+) -> tuple[int, int]:
+    """Fetch `ids` on a thread pool sharing one session and rate limiter.
+
+    Cached ids are revalidated with their ETag. Returns (saved,
+    not_modified), where not_modified counts 304s that kept the cached file.
+    """
+    cache = cache or open_cache()
+    saved = 0
+    not_modified = 0
 
+    session = make_session(pool_size=workers)
+
+    def fetch_and_save(business_id: str) -> bool:
+        out_path = OUT_DIR / f"{business_id}.json"
+        url = details_url.format(business_id)
+        data, etag = conditional_get_json(session, url, api_key, limiter, etag=cache.etag(out_path))
+        if data is not None:
+            cache.write(out_path, data)
+        cache.record(out_path, etag)
+        return data is not None
+
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_and_save, bid): bid for bid in ids}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if future.result():
+                saved += 1
+            else:
+                not_modified += 1
+            if done % 100 == 0:
+                cache.save()
+                print(
+                    f"Progress: {done}/{len(ids)} | saved={saved} | not_modified={not_modified} "
+                    f"| rate={limiter.rate:.2f}/s"
+                )
+
+    return saved, not_modified
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Fetch Yelp business details into data/raw/details.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="concurrent requests; 1 keeps the original serial loop")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="max requests/sec shared by all workers")
+    parser.add_argument("--max-ids", type=int, default=200,
+                        help="safety cap on ids to process (0 = no cap)")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL_DAYS["details"],
+                        help="refetch cached details older than this")
+    parser.add_argument("--budget", type=int,
+                        help="max cached entries to refresh this run, oldest first; spare budget "
+                             "refreshes entries close to expiry (default: every expired entry)")
+    args = parser.parse_args(argv)
 
-def main() -> None:
     load_dotenv()
     api_key = os.getenv("YELP_API_KEY")
     if not api_key:
         raise RuntimeError("Missing YELP_API_KEY in your .env file")
+    details_url = os.getenv("YELP_API_BASE_URL", DEFAULT_BASE_URL).rstrip("/") + DETAILS_PATH
     
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    df = pd.read_csv(STAGING_RESTAURANTS)
+    df = read_table(STAGING_RESTAURANTS, columns=["source_id"])
     ids = df["source_id"].dropna().astype(str).unique().tolist()
 
     # Safety cap
-    ids = ids[:200]
+    if args.max_ids:
+        ids = ids[:args.max_ids]
 
-    pause_seconds = 0.35    # if hit 429, increase to 0.75-1.0
-    max_retries_429 = 5
+    cache = open_cache()
+    pending = due_ids(cache, ids, args.ttl_days, args.budget)
+    fresh = len(ids) - len(pending)
 
-    saved = 0
-    skipped = 0
-
-    for i, business_id in enumerate(ids, start=1):
-        out_path = OUT_DIR / f"{business_id}.json"
-
-        # Cache: don't refresh if file exists
-        if out_path.exists():
-            skipped += 1
-            continue
-
-        retries = 0
-        while True:
+    with span("fetch_business_details", workers=args.workers) as s:
+        s.set(rows_in=len(pending), fresh=fresh)
+        if args.workers > 1:
+            limiter = TokenBucket(rate=args.rate)
             try:
-                data = fetch_one(api_key, business_id)
-                out_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
-                saved += 1
-                break
-            except RuntimeError as e:
-                if "429" in str(e) and retries < max_retries_429:
-                    # simple backoff
-                    wait = (2 ** retries) * 1.0
-                    print(f"[{i}/{len(ids)}] 429 rate limit. Sleeping {wait:.1f}s then retrying...")
-                    time.sleep(wait)
-                    retries += 1
-                    continue
-                raise
-        if i % 10 == 0:
-            print(f"Progress: {i}/{len(ids)} | saved={saved} | skipped={skipped}")
-            time.sleep(pause_seconds)
-    print("\nDONE")
-    print(f"Saved new detail files: {saved}")
-    print(f"Already existed (cached): {skipped}")
-    print(f"Details folder: {OUT_DIR}")
+                saved, not_modified = fetch_concurrent(api_key, pending, args.workers, limiter, details_url, cache)
+            finally:
+                cache.save()
+            s.set(rows_out=saved, not_modified=not_modified)
+            print("\nDONE")
+            print(f"Saved detail files: {saved}")
+            print(f"Revalidated (304, unchanged): {not_modified}")
+            print(f"Still fresh (cached): {fresh}")
+            print(f"Details folder: {OUT_DIR}")
+            return
+
+        pause_seconds = 0.35    # if hit 429, increase to 0.75-1.0
+        max_retries_429 = 5
+
+        saved = 0
+        not_modified = 0
+
+        try:
+            for i, business_id in enumerate(pending, start=1):
+                out_path = OUT_DIR / f"{business_id}.json"
+
+                retries = 0
+                while True:
+                    try:
+                        data, etag = fetch_one(api_key, business_id, details_url=details_url, etag=cache.etag(out_path))
+                        if data is None:
+                            not_modified += 1
+                        else:
+                            cache.write(out_path, data)
+                            saved += 1
+                        cache.record(out_path, etag)
+                        break
+                    except RateLimitError as e:
+                        if retries < max_retries_429:
+                            # honor Retry-After when Yelp sends it, else simple backoff
+                            wait = e.retry_after if e.retry_after is not None else (2 ** retries) * 1.0
+                            print(f"[{i}/{len(pending)}] 429 rate limit. Sleeping {wait:.1f}s then retrying...")
+                            time.sleep(wait)
+                            http.retried()
+                            http.waited(wait)
+                            retries += 1
+                            continue
+                        raise
+                if i % 10 == 0:
+                    print(f"Progress: {i}/{len(pending)} | saved={saved} | not_modified={not_modified}")
+                    time.sleep(pause_seconds)
+        finally:
+            cache.save()
+        s.set(rows_out=saved, not_modified=not_modified)
+        print("\nDONE")
+        print(f"Saved detail files: {saved}")
+        print(f"Revalidated (304, unchanged): {not_modified}")
+        print(f"Still fresh (cached): {fresh}")
+        print(f"Details folder: {OUT_DIR}")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# fetched-at / ETag metadata for every cached raw response, keyed by file path
+CACHE_INDEX = Path("data/raw/.http_cache.json")
+
+# How long a cached response is trusted, per endpoint
+DEFAULT_TTL_DAYS = {
+    "search": 7.0,
+    "details": 30.0,
+}
+
+# Entries in the last 20% of their TTL may be refreshed early when budget allows
+REFRESH_AHEAD = 0.2
+
+DAY_SECONDS = 86400
+
+
+def plan_refresh(
+    stamps: list[tuple[Path, float | None]],
+    ttl_days: float,
+    budget: int | None = None,
+    now: float | None = None,
+) -> tuple[list[Path], list[Path]]:
+    """Split (path, fetched_at) pairs into (missing, refresh).
+
+    Missing entries (no fetched_at) are always fetched. Refreshes are the
+    expired entries, oldest first; with a `budget`, at most that many are
+    refreshed and any budget left over goes to the oldest entries in the
+    refresh-ahead window, so they are renewed before they expire.
+    """
+    now = time.time() if now is None else now
+    ttl = ttl_days * DAY_SECONDS
+
+    missing = []
+    expired = []
+    ahead = []
+    for path, fetched_at in stamps:
+        if fetched_at is None:
+            missing.append(path)
+        elif now - fetched_at >= ttl:
+            expired.append((fetched_at, path))
+        elif now - fetched_at >= ttl * (1 - REFRESH_AHEAD):
+            ahead.append((fetched_at, path))
+
+    expired.sort(key=lambda item: item[0])
+    if budget is None:
+        return missing, [path for _, path in expired]
+
+    ahead.sort(key=lambda item: item[0])
+    due = expired + ahead
+    return missing, [path for _, path in due[:budget]]
+
+
+class ResponseCache:
+    """Freshness metadata for the raw response files under data/raw.
+
+    Each entry records when the file was last fetched (or revalidated) and
+    the ETag Yelp returned with it. Files cached before this index existed
+    count as fetched at their mtime.
+    """
+
+    def __init__(self, index_path: Path = CACHE_INDEX) -> None:
+        self.index_path = index_path
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if index_path.exists():
+            self.entries = json.loads(index_path.read_text(encoding="utf-8"))
+
+    def fetched_at(self, path: Path) -> float | None:
+        entry = self.entries.get(str(path))
+        if entry is not None:
+            return entry["fetched_at"]
+        if path.exists():
+            return path.stat().st_mtime
+        return None
+
+    def etag(self, path: Path) -> str | None:
+        if not path.exists():
+            return None
+        return self.entries.get(str(path), {}).get("etag")
+
+    def plan(
+        self,
+        paths: list[Path],
+        ttl_days: float,
+        budget: int | None = None,
+        now: float | None = None,
+    ) -> tuple[list[Path], list[Path]]:
+        return plan_refresh([(path, self.fetched_at(path)) for path in paths], ttl_days, budget, now)
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        return sorted(directory.glob(pattern))
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def read(self, path: Path) -> dict:
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def write(self, path: Path, data: dict) -> None:
+        """Write via a temp file so a crashed worker never leaves a half-written cache entry."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def record(self, path: Path, etag: str | None, now: float | None = None) -> None:
+        """Mark `path` as fetched or revalidated just now."""
+        entry = {"fetched_at": time.time() if now is None else now}
+        if etag:
+            entry["etag"] = etag
+        with self._lock:
+            self.entries[str(path)] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(self.entries, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, self.index_path)
@@ -1,41 +1,541 @@
 from pathlib import Path
+import argparse
+import csv
+import io
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
 import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 
+from metrics import path_bytes, peak_rss_mb, span
+from staging_io import CHUNK_ROWS, iter_chunks, read_table, staging_path, stringify_times
+from warehouse_merge import merge_rows, with_row_hash
+from warehouse_schema import INDEXES, PRIMARY_KEYS, check_key_columns, column_type, index_name, pandas_dtypes
+from warehouse_views import DERIVED, STAGING_TABLES, forget_definition, merge_staging, refresh_derived, start_merge
+
 load_dotenv()
 
-STAGING_DIR = Path("data/staging")
+# Staging tables loaded under the same name (CSV, Parquet or Arrow; see staging_io)
+TABLES = [
+    "staging_restaurants",
+    "staging_categories",
+    "staging_cuisine_map",
+    "staging_hours",
+    "indian_restaurants",
+    "late_night_restaurants",
+    "late_night_indian_restaurants",
+    "cuisine_restaurants"
+]
 
-TABLES = {
-    "staging_restaurants": STAGING_DIR / "staging_restaurants.csv",
-    "staging_categories": STAGING_DIR / "staging_categories.csv",
-    "staging_cuisine_map": STAGING_DIR / "staging_cuisine_map.csv",
-    "staging_hours": STAGING_DIR / "staging_hours.csv",
-    "indian_restaurants": STAGING_DIR / "indian_restaurants.csv",
-    "late_night_restaurants": STAGING_DIR / "late_night_restaurants.csv",
-    "late_night_indian_restaurants": STAGING_DIR / "late_night_indian_restaurants.csv"
+PG_TYPES = {
+    "text": "text",
+    "integer": "integer",
+    "bigint": "bigint",
+    "smallint": "smallint",
+    "real": "real",
+    "double": "double precision",
+    "boolean": "boolean",
 }
 
-def main() -> None:
+
+def quote(ident: str) -> str:
+    return '"' + ident.replace('"', '""') + '"'
+
+
+def open_as_csv(source: Path | pd.DataFrame, table_name: str):
+    """A CSV text stream for COPY; frames and columnar staging files are rendered to CSV in memory."""
+    if isinstance(source, pd.DataFrame):
+        df = stringify_times(source.copy())
+    elif source.suffix == ".csv":
+        return source.open("r", encoding="utf-8")
+    else:
+        df = stringify_times(read_table(table_name, dtypes=pandas_dtypes(table_name)))
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    return buf
+
+
+def copy_from_file(cur, sql: str, f) -> None:
+    """COPY ... FROM STDIN for either psycopg2 or psycopg 3 cursors."""
+    if hasattr(cur, "copy_expert"):
+        cur.copy_expert(sql, f)
+        return
+    with cur.copy(sql) as copy:
+        while chunk := f.read(1 << 20):
+            copy.write(chunk)
+
+
+def col_defs(table_name: str, columns: list[str]) -> str:
+    check_key_columns(table_name, columns)
+    return ", ".join(f"{quote(c)} {PG_TYPES[column_type(table_name, c)]}" for c in columns)
+
+
+def copy_into(cur, table_name: str, source: Path | pd.DataFrame) -> tuple[str, list[str], int]:
+    """COPY a staging CSV (or in-memory frame) into a fresh typed `{table}__load` table.
+
+    Returns the shadow table's name, its columns and its row count.
+    """
+    load_table = f"{table_name}__load"
+    f = open_as_csv(source, table_name)
+    columns = next(csv.reader([f.readline()]))
+    f.seek(0)
+    col_list = ", ".join(quote(c) for c in columns)
+
+    cur.execute(f"DROP TABLE IF EXISTS {quote(load_table)}")
+    cur.execute(f"CREATE TABLE {quote(load_table)} ({col_defs(table_name, columns)})")
+    with f:
+        copy_from_file(cur, f"COPY {quote(load_table)} ({col_list}) FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+    cur.execute(f"SELECT count(*) FROM {quote(load_table)}")
+    return load_table, columns, cur.fetchone()[0]
+
+
+def index_statements(table_name: str, on: str | None = None) -> list[str]:
+    """CREATE INDEX statements for `table_name`'s primary key and secondary indexes on table `on`.
+
+    Indexes are named after `on` (default: the table itself). The primary
+    key is built as a unique index and attached by attach_primary_key, so
+    every statement takes only a SHARE lock and they can run concurrently.
+    """
+    on = on or table_name
+    statements = []
+    pk = PRIMARY_KEYS.get(table_name)
+    if pk:
+        statements.append(
+            f"CREATE UNIQUE INDEX {quote(on + '_pkey')} ON {quote(on)} ({', '.join(quote(c) for c in pk)})"
+        )
+    for i, cols in enumerate(INDEXES.get(table_name, [])):
+        col_sql = ", ".join(
+            quote(c.split()[0]) + (" DESC" if c.endswith(" DESC") else "") for c in cols
+        )
+        statements.append(f"CREATE INDEX {quote(index_name(on, i))} ON {quote(on)} ({col_sql})")
+    return statements
+
+
+def attach_primary_key(cur, table_name: str, on: str | None = None) -> None:
+    """Turn the unique `{on}_pkey` index into the table's primary key constraint."""
+    on = on or table_name
+    if PRIMARY_KEYS.get(table_name):
+        cur.execute(
+            f"ALTER TABLE {quote(on)} ADD CONSTRAINT {quote(on + '_pkey')} "
+            f"PRIMARY KEY USING INDEX {quote(on + '_pkey')}"
+        )
+
+
+def create_indexes(cur, table_name: str, on: str | None = None) -> None:
+    """Build `table_name`'s primary key and secondary indexes on table `on` (default: itself), named after `on`."""
+    for sql in index_statements(table_name, on):
+        cur.execute(sql)
+    attach_primary_key(cur, table_name, on)
+
+
+def rename_into_place(raw_conn, cur, table_name: str, load_table: str) -> None:
+    """Atomically replace `table_name` with the indexed `load_table`, renaming its key and indexes."""
+    cur.execute(f"DROP TABLE IF EXISTS {quote(table_name)}")
+    cur.execute(f"ALTER TABLE {quote(load_table)} RENAME TO {quote(table_name)}")
+    if PRIMARY_KEYS.get(table_name):
+        cur.execute(
+            f"ALTER TABLE {quote(table_name)} RENAME CONSTRAINT "
+            f"{quote(load_table + '_pkey')} TO {quote(table_name + '_pkey')}"
+        )
+    for i in range(len(INDEXES.get(table_name, []))):
+        cur.execute(f"ALTER INDEX {quote(index_name(load_table, i))} RENAME TO {quote(index_name(table_name, i))}")
+    forget_definition(cur, table_name)
+    raw_conn.commit()
+
+
+def swap_in(raw_conn, cur, table_name: str, load_table: str) -> None:
+    """Index a loaded shadow table, then swap it in (and rename its indexes) in one transaction."""
+    # Keys and indexes are built once, after the bulk load
+    create_indexes(cur, table_name, on=load_table)
+    cur.execute(f"ANALYZE {quote(load_table)}")
+    raw_conn.commit()
+    rename_into_place(raw_conn, cur, table_name, load_table)
+
+
+def copy_load(raw_conn, table_name: str, source: Path | pd.DataFrame) -> int:
+    """Stream a CSV (or in-memory frame) into a typed shadow table via COPY, index it, then swap it in.
+
+    Readers keep seeing the old table until the final transaction, which
+    drops it and renames the shadow table (and its indexes) into place.
+    """
+    cur = raw_conn.cursor()
+    load_table, _, rows = copy_into(cur, table_name, source)
+    swap_in(raw_conn, cur, table_name, load_table)
+    cur.close()
+    return rows
+
+
+def stream_into(cur, table_name: str, chunk_rows: int = CHUNK_ROWS) -> tuple[str, int]:
+    """COPY a staging table into a fresh `{table}__load` table in `chunk_rows` chunks with declared dtypes.
+
+    Each chunk is rendered to CSV and COPYed on its own, so memory stays
+    bounded by the chunk size for every staging format. Returns the shadow
+    table's name and its row count.
+    """
+    load_table = None
+    rows = 0
+    for chunk in iter_chunks(table_name, chunk_rows, pandas_dtypes(table_name)):
+        chunk = stringify_times(chunk)
+        if load_table is None:
+            load_table = f"{table_name}__load"
+            cur.execute(f"DROP TABLE IF EXISTS {quote(load_table)}")
+            cur.execute(f"CREATE TABLE {quote(load_table)} ({col_defs(table_name, list(chunk.columns))})")
+            col_list = ", ".join(quote(c) for c in chunk.columns)
+        buf = io.StringIO()
+        chunk.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        copy_from_file(cur, f"COPY {quote(load_table)} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf)
+        rows += len(chunk)
+    if load_table is None:
+        # No rows at all: take the (empty) table's columns from a regular load
+        load_table, _, rows = copy_into(cur, table_name, staging_path(table_name))
+    return load_table, rows
+
+
+def stream_copy_load(raw_conn, table_name: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Like copy_load, but stream the staging table in `chunk_rows` chunks (see stream_into)."""
+    cur = raw_conn.cursor()
+    load_table, rows = stream_into(cur, table_name, chunk_rows)
+    swap_in(raw_conn, cur, table_name, load_table)
+    cur.close()
+    return rows
+
+
+def on_connection(engine, fn: Callable, *args):
+    """Run fn(cursor, *args) on a connection from the engine's pool and commit."""
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        result = fn(cur, *args)
+        raw_conn.commit()
+        cur.close()
+        return result
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+
+def parallel_load_all(
+    engine,
+    frames: dict[str, pd.DataFrame] | None = None,
+    workers: int = 4,
+    chunk_rows: int | None = None,
+) -> dict[str, dict[str, float]]:
+    """Load every table concurrently over `workers` pooled connections.
+
+    Tables are COPYed (streamed in `chunk_rows` chunks when given) into
+    their shadow tables largest first, one per worker, and committed. As
+    soon as a table is in, each of its indexes is queued as a task of its
+    own, so a big table's indexes build side by side with each other and
+    with other tables' loads. Once a table's last index is built, its
+    primary key is attached, it is analyzed and it is swapped in. The
+    engine's pool should hold `workers` connections. Returns rows and
+    copy / index / swap seconds per table.
+    """
+    frames = frames or {}
+    sources = {}
+    for table_name in TABLES:
+        source = frames.get(table_name)
+        if source is None:
+            source = staging_path(table_name)
+            if not source.exists():
+                print(f"Skipping {table_name}: missing {source}")
+                continue
+        sources[table_name] = source
+    # Longest first, so the biggest table is not the last one to start
+    order = sorted(sources, key=lambda t: path_bytes(staging_path(t)), reverse=True)
+
+    def load(cur, table_name: str) -> tuple[str, int, float]:
+        start = time.perf_counter()
+        with span(f"postgres_copy:{table_name}") as s:
+            if chunk_rows and table_name not in frames:
+                load_table, rows = stream_into(cur, table_name, chunk_rows)
+            else:
+                load_table, _, rows = copy_into(cur, table_name, sources[table_name])
+            s.set(rows_out=rows)
+        return load_table, rows, time.perf_counter() - start
+
+    def build_index(cur, sql: str) -> float:
+        start = time.perf_counter()
+        cur.execute(sql)
+        return time.perf_counter() - start
+
+    def finish(cur, table_name: str, load_table: str) -> float:
+        start = time.perf_counter()
+        attach_primary_key(cur, table_name, load_table)
+        cur.execute(f"ANALYZE {quote(load_table)}")
+        cur.connection.commit()
+        rename_into_place(cur.connection, cur, table_name, load_table)
+        return time.perf_counter() - start
+
+    stats: dict[str, dict[str, float]] = {}
+    shadow: dict[str, str] = {}
+    indexes_left: dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {pool.submit(on_connection, engine, load, t): ("copy", t) for t in order}
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step, table_name = running.pop(future)
+                result = future.result()
+                if step == "copy":
+                    shadow[table_name], rows, seconds = result
+                    stats[table_name] = {"rows": rows, "copy_s": seconds, "index_s": 0.0, "swap_s": 0.0}
+                    statements = index_statements(table_name, shadow[table_name])
+                    indexes_left[table_name] = len(statements)
+                    for sql in statements:
+                        running[pool.submit(on_connection, engine, build_index, sql)] = ("index", table_name)
+                elif step == "index":
+                    stats[table_name]["index_s"] += result
+                    indexes_left[table_name] -= 1
+                else:
+                    stats[table_name]["swap_s"] = result
+                    continue
+                if indexes_left[table_name] == 0:
+                    indexes_left[table_name] = -1
+                    running[pool.submit(on_connection, engine, finish, table_name, shadow[table_name])] = ("swap", table_name)
+    return {t: stats[t] for t in TABLES if t in stats}
+
+
+def table_columns(cur) -> dict[str, list[str]]:
+    """Columns of every table in the current schema, in order."""
+    cur.execute(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() ORDER BY table_name, ordinal_position"
+    )
+    columns: dict[str, list[str]] = {}
+    for table_name, column in cur.fetchall():
+        columns.setdefault(table_name, []).append(column)
+    return columns
+
+
+def stream_load_all(engine, chunk_rows: int = CHUNK_ROWS) -> dict[str, tuple[int, float]]:
+    """Stream-load every staging table in `chunk_rows` chunks; returns (rows, seconds) per table."""
+    loaded = {}
+    for table_name in TABLES:
+        if not staging_path(table_name).exists():
+            print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+            continue
+        start = time.perf_counter()
+        raw_conn = engine.raw_connection()
+        try:
+            with span(f"postgres_stream:{table_name}", chunk_rows=chunk_rows) as s:
+                rows = stream_copy_load(raw_conn, table_name, chunk_rows)
+                s.set(rows_out=rows, bytes_read=path_bytes(staging_path(table_name)))
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+        loaded[table_name] = (rows, time.perf_counter() - start)
+    return loaded
+
+
+def copy_load_all(engine, frames: dict[str, pd.DataFrame] | None = None) -> dict[str, int]:
+    """COPY-load every table; `frames` supplies in-memory tables by name.
+
+    Returns (rows, seconds) per table.
+    """
+    frames = frames or {}
+    loaded = {}
+    for table_name in TABLES:
+        start = time.perf_counter()
+        source = frames.get(table_name)
+        if source is None:
+            source = staging_path(table_name)
+            if not source.exists():
+                print(f"Skipping {table_name}: missing {source}")
+                continue
+        raw_conn = engine.raw_connection()
+        try:
+            with span(f"postgres_load:{table_name}") as s:
+                rows = copy_load(raw_conn, table_name, source)
+                s.set(rows_out=rows)
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+        loaded[table_name] = (rows, time.perf_counter() - start)
+    return loaded
+
+
+def merge_load_all(engine, frames: dict[str, pd.DataFrame] | None = None) -> dict[str, tuple[int, int, int]]:
+    """Merge every table into Postgres in one transaction, writing only rows whose hash changed.
+
+    Each table is COPYed with its ROW_HASH into a shadow table, then
+    upserted with INSERT ... ON CONFLICT DO UPDATE and pruned of vanished
+    keys (see warehouse_merge). A table that is missing or has other
+    columns is swapped in whole. Returns (upserted, deleted, rows) per table.
+    """
+    frames = frames or {}
+    merged = {}
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        existing = table_columns(cur)
+        for table_name in TABLES:
+            df = frames.get(table_name)
+            if df is None:
+                if not staging_path(table_name).exists():
+                    print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+                    continue
+                df = read_table(table_name, dtypes=pandas_dtypes(table_name))
+            with span(f"postgres_merge:{table_name}") as s:
+                load_table, columns, rows = copy_into(cur, table_name, with_row_hash(stringify_times(df.copy()), table_name))
+                if existing.get(table_name) != columns:
+                    cur.execute(f"DROP TABLE IF EXISTS {quote(table_name)}")
+                    cur.execute(f"ALTER TABLE {quote(load_table)} RENAME TO {quote(table_name)}")
+                    create_indexes(cur, table_name)
+                    merged[table_name] = (rows, 0, rows)
+                else:
+                    merged[table_name] = (*merge_rows(cur, table_name, load_table, columns), rows)
+                forget_definition(cur, table_name)
+                s.set(rows_in=rows, rows_out=merged[table_name][0], deleted=merged[table_name][1])
+        raw_conn.commit()
+        cur.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return merged
+
+
+def incremental_load_all(engine, frames: dict[str, pd.DataFrame] | None = None) -> dict[str, int]:
+    """Merge the staging tables into Postgres and refresh the derived tables in SQL.
+
+    Same scheme as load_to_sqlite.incremental_load_all: COPY into shadow
+    tables, EXCEPT-diff against the live tables, rewrite only the changed
+    restaurant keys and refresh the derived tables for those keys, all in
+    one transaction. Returns changed keys per staging table and rows
+    written per derived table.
+    """
+    frames = frames or {}
+    changed = {}
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        existing = table_columns(cur)
+        start_merge(cur)
+        full = False
+        for table_name in STAGING_TABLES:
+            source = frames.get(table_name)
+            if source is None:
+                source = staging_path(table_name)
+                if not source.exists():
+                    print(f"Skipping {table_name}: missing {source}")
+                    continue
+            with span(f"postgres_merge:{table_name}") as s:
+                load_table, columns, rows = copy_into(cur, table_name, source)
+                keys = merge_staging(cur, table_name, load_table, columns, existing.get(table_name))
+                if keys is None:
+                    # New table or new columns: take it whole and rebuild everything derived
+                    cur.execute(f"DROP TABLE IF EXISTS {quote(table_name)}")
+                    cur.execute(f"ALTER TABLE {quote(load_table)} RENAME TO {quote(table_name)}")
+                    create_indexes(cur, table_name)
+                    full = True
+                    keys = rows
+                s.set(rows_in=rows, rows_out=keys)
+            changed[table_name] = keys
+
+        missing = [t for t in STAGING_TABLES if t not in table_columns(cur)]
+        if missing:
+            print(f"Skipping derived tables: missing {', '.join(missing)}")
+        else:
+            for name in DERIVED:
+                with span(f"postgres_refresh:{name}") as s:
+                    changed[name] = refresh_derived(cur, name, col_defs, create_indexes, existing.get(name), full)
+                    s.set(rows_out=changed[name])
+        raw_conn.commit()
+        cur.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return changed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load staging CSVs into Postgres.")
+    parser.add_argument("--mode", choices=["copy", "stream", "merge", "incremental", "replace"], default="copy",
+                        help="copy: COPY into typed, indexed tables swapped in atomically; "
+                             "stream: as copy, reading each table in bounded chunks; "
+                             "merge: upsert changed rows by primary key and row hash, delete vanished ones; "
+                             "incremental: merge staging tables by changed key and derive the rest in SQL; "
+                             "replace: pandas to_sql with inferred types")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk in stream mode")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="copy/stream: tables loaded and indexes built concurrently (1 = one table at a time)")
+    args = parser.parse_args(argv)
+
     pg_url = os.getenv("POSTGRES_URL")
     if not pg_url:
         raise RuntimeError("Missing POSTGRES_URL in .env")
-    
-    engine = create_engine(pg_url)
 
-    for table_name, csv_path in TABLES.items():
-        if not csv_path.exists():
-            print(f"Skipping {table_name}: missing {csv_path}")
+    # One pooled connection per worker
+    engine = create_engine(pg_url, pool_size=max(args.workers, 1), max_overflow=0)
+
+    if args.workers > 1 and args.mode in ("copy", "stream"):
+        start = time.perf_counter()
+        chunk_rows = args.chunk_rows if args.mode == "stream" else None
+        stats = parallel_load_all(engine, workers=args.workers, chunk_rows=chunk_rows)
+        wall = time.perf_counter() - start
+        for table_name, t in stats.items():
+            print(f"Loaded {table_name} ({t['rows']} rows, copy {t['copy_s']:.2f}s, "
+                  f"indexes {t['index_s']:.2f}s, swap {t['swap_s']:.2f}s)")
+        serial = sum(t["copy_s"] + t["index_s"] + t["swap_s"] for t in stats.values())
+        print(f"\n✅ Postgres load complete ({wall:.2f}s wall, {serial:.2f}s summed over tables, "
+              f"peak RSS {peak_rss_mb():.0f} MB).")
+        return
+
+    if args.mode == "stream":
+        for table_name, (rows, seconds) in stream_load_all(engine, args.chunk_rows).items():
+            print(f"Loaded {table_name} ({rows} rows, {rows / max(seconds, 1e-9):,.0f} rows/s)")
+        print(f"\n✅ Postgres load complete (peak RSS {peak_rss_mb():.0f} MB).")
+        return
+
+    if args.mode == "merge":
+        for table_name, (upserted, deleted, rows) in merge_load_all(engine).items():
+            print(f"Merged {table_name} ({upserted} upserted, {deleted} deleted, {rows} rows)")
+        print("\n✅ Postgres load complete.")
+        return
+
+    if args.mode == "incremental":
+        for table_name, n in incremental_load_all(engine).items():
+            what = "changed keys" if table_name in STAGING_TABLES else "rows refreshed"
+            print(f"Merged {table_name} ({n} {what})")
+        print("\n✅ Postgres load complete.")
+        return
+
+    if args.mode == "copy":
+        for table_name, (rows, seconds) in copy_load_all(engine).items():
+            print(f"Loaded {table_name} ({rows} rows, {seconds:.2f}s)")
+        print("\n✅ Postgres load complete.")
+        return
+
+    for table_name in TABLES:
+        path = staging_path(table_name)
+        if not path.exists():
+            print(f"Skipping {table_name}: missing {path}")
             continue
 
-        df = pd.read_csv(csv_path)
-        df.to_sql(table_name, engine, if_exists="replace", index=False)
+        df = stringify_times(read_table(table_name))
+        with engine.begin() as conn:
+            df.to_sql(table_name, conn, if_exists="replace", index=False)
+            forget_definition(conn.connection.cursor(), table_name)
         print(f"Loaded {table_name} ({len(df)} rows)")
-    
+
     print("\n✅ Postgres load complete.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
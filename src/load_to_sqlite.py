@@ -1,34 +1,400 @@
 from pathlib import Path
+import argparse
+import sqlite3
+import time
 import pandas as pd
 from sqlalchemy import create_engine
 
+from metrics import path_bytes, peak_rss_mb, span
+from staging_io import CHUNK_ROWS, iter_chunks, read_table, staging_path, stringify_times
+from warehouse_merge import merge_rows, with_row_hash
+from warehouse_schema import INDEXES, PRIMARY_KEYS, check_key_columns, column_type, index_name, pandas_dtypes
+from warehouse_views import DERIVED, STAGING_TABLES, forget_definition, merge_staging, refresh_derived, start_merge
+
 
-STAGING_DIR = Path("data/staging")
 WAREHOUSE_DIR = Path("data/warehouse")
 DB_PATH = WAREHOUSE_DIR / "restaurants.db"
 
-TABLES = {
-    "staging_restaurants": STAGING_DIR / "staging_restaurants.csv",
-    "staging_categories": STAGING_DIR / "staging_categories.csv",
-    "staging_cuisine_map": STAGING_DIR / "staging_cuisine_map.csv",
-    "staging_hours": STAGING_DIR / "staging_hours.csv",
-    "indian_restaurants": STAGING_DIR / "indian_restaurants.csv",
-    "late_night_restaurants": STAGING_DIR / "late_night_restaurants.csv",
-    "late_night_indian_restaurants": STAGING_DIR / "late_night_indian_restaurants.csv"
+# Staging tables loaded under the same name (CSV, Parquet or Arrow; see staging_io)
+TABLES = [
+    "staging_restaurants",
+    "staging_categories",
+    "staging_cuisine_map",
+    "staging_hours",
+    "indian_restaurants",
+    "late_night_restaurants",
+    "late_night_indian_restaurants",
+    "cuisine_restaurants"
+]
+
+SQLITE_TYPES = {
+    "text": "TEXT",
+    "integer": "INTEGER",
+    "bigint": "INTEGER",
+    "smallint": "INTEGER",
+    "real": "REAL",
+    "double": "REAL",
+    "boolean": "INTEGER",
+}
+
+PRAGMAS = {
+    "journal_mode": "WAL",      # readers are never blocked by a load
+    "synchronous": "NORMAL",    # safe with WAL, far fewer fsyncs than FULL
+    "cache_size": -65536,       # 64 MiB page cache
+    "temp_store": "MEMORY",     # index sorts stay off disk
 }
 
+BATCH_SIZE = 10_000
+
+
+def quote(ident: str) -> str:
+    return '"' + ident.replace('"', '""') + '"'
+
+
+def connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+def col_defs(table_name: str, columns: list[str]) -> str:
+    check_key_columns(table_name, columns)
+    return ", ".join(f"{quote(c)} {SQLITE_TYPES[column_type(table_name, c)]}" for c in columns)
+
+
+def create_shadow(conn, table_name: str, columns: list[str]) -> str:
+    """Create an empty declared-schema `{table}__load` table and return its name."""
+    load_table = f"{table_name}__load"
+    conn.execute(f"DROP TABLE IF EXISTS {quote(load_table)}")
+    conn.execute(f"CREATE TABLE {quote(load_table)} ({col_defs(table_name, columns)})")
+    return load_table
+
+
+def insert_frame(conn, load_table: str, df: pd.DataFrame) -> None:
+    """Append a frame's rows with batched executemany."""
+    columns = list(df.columns)
+    insert = (
+        f"INSERT INTO {quote(load_table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    values = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    batch = []
+    for row in values:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+
+
+def load_shadow(
+    conn,
+    table_name: str,
+    df: pd.DataFrame | None = None,
+    row_hash: bool = False,
+) -> tuple[str, list[str], int]:
+    """Load a staging table into a fresh declared-schema `{table}__load` table.
+
+    Loads `df` when given, else reads the table from staging; `row_hash`
+    adds the ROW_HASH column merge mode compares. Returns the shadow
+    table's name, its columns and its row count.
+    """
+    df = stringify_times(read_table(table_name, dtypes=pandas_dtypes(table_name)) if df is None else df.copy())
+    if row_hash:
+        df = with_row_hash(df, table_name)
+    columns = list(df.columns)
+    load_table = create_shadow(conn, table_name, columns)
+    insert_frame(conn, load_table, df)
+    return load_table, columns, len(df)
+
+
+def stream_shadow(conn, table_name: str, chunk_rows: int = CHUNK_ROWS) -> tuple[str, int]:
+    """Load a staging table into `{table}__load` one chunk at a time.
+
+    Chunks are read with the declared dtypes, so memory is bounded by
+    `chunk_rows` rather than the table size. Returns the shadow table's
+    name and its row count.
+    """
+    load_table = None
+    rows = 0
+    for chunk in iter_chunks(table_name, chunk_rows, pandas_dtypes(table_name)):
+        chunk = stringify_times(chunk)
+        if load_table is None:
+            load_table = create_shadow(conn, table_name, list(chunk.columns))
+        insert_frame(conn, load_table, chunk)
+        rows += len(chunk)
+    if load_table is None:
+        # No rows at all: take the (empty) table's columns from a regular read
+        load_table, _, rows = load_shadow(conn, table_name)
+    return load_table, rows
+
+
+def create_indexes(conn, table_name: str) -> None:
+    """Build a table's unique key and secondary indexes over the data already in it."""
+    pk = PRIMARY_KEYS.get(table_name)
+    if pk:
+        conn.execute(
+            f"CREATE UNIQUE INDEX {quote(table_name + '_pkey')} ON {quote(table_name)} "
+            f"({', '.join(quote(c) for c in pk)})"
+        )
+    for i, cols in enumerate(INDEXES.get(table_name, [])):
+        col_sql = ", ".join(
+            quote(c.split()[0]) + (" DESC" if c.endswith(" DESC") else "") for c in cols
+        )
+        conn.execute(f"CREATE INDEX {quote(index_name(table_name, i))} ON {quote(table_name)} ({col_sql})")
+
+
+def swap_in(conn, table_name: str, load_table: str) -> None:
+    conn.execute(f"DROP TABLE IF EXISTS {quote(table_name)}")
+    conn.execute(f"ALTER TABLE {quote(load_table)} RENAME TO {quote(table_name)}")
+    # Indexes are built once over the loaded data rather than maintained per insert
+    create_indexes(conn, table_name)
+    forget_definition(conn, table_name)
+
+
+def fast_load(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame | None = None) -> int:
+    """Load a staging table into a declared-schema shadow table, swap it in and index it.
+
+    Loads `df` when given, else reads the table from staging. Must run
+    inside an open transaction, so readers see either the old table or
+    the new, indexed one.
+    """
+    load_table, _, rows = load_shadow(conn, table_name, df)
+    swap_in(conn, table_name, load_table)
+    return rows
+
+
+def stream_load_all(chunk_rows: int = CHUNK_ROWS) -> dict[str, tuple[int, float]]:
+    """Stream every staging table into SQLite in `chunk_rows` chunks, in one transaction.
 
-def main() -> None:
+    Same shadow-table swap and indexes as fast_load_all, but no table is
+    ever held in memory whole. Returns (rows, seconds) per table.
+    """
     WAREHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    loaded = {}
+    conn = connect()
+    # Index builds sort in temp files, which would otherwise grow with the table in memory
+    conn.execute("PRAGMA temp_store = FILE")
+    try:
+        conn.execute("BEGIN")
+        for table_name in TABLES:
+            if not staging_path(table_name).exists():
+                print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+                continue
+            start = time.perf_counter()
+            with span(f"sqlite_stream:{table_name}", chunk_rows=chunk_rows) as s:
+                load_table, rows = stream_shadow(conn, table_name, chunk_rows)
+                swap_in(conn, table_name, load_table)
+                s.set(rows_out=rows, bytes_read=path_bytes(staging_path(table_name)))
+            loaded[table_name] = (rows, time.perf_counter() - start)
+        with span("sqlite_commit"):
+            conn.execute("COMMIT")
+            conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return loaded
+
+
+def table_columns(conn) -> dict[str, list[str]]:
+    """Columns of every table in the database, in order."""
+    names = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {name: [row[1] for row in conn.execute(f"PRAGMA table_info({quote(name)})")] for name in names}
+
+
+def fast_load_all(frames: dict[str, pd.DataFrame] | None = None) -> dict[str, int]:
+    """Fast-load every table in one transaction; `frames` supplies in-memory tables by name.
+
+    Returns rows loaded per table.
+    """
+    frames = frames or {}
+    WAREHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    loaded = {}
+    conn = connect()
+    try:
+        conn.execute("BEGIN")
+        for table_name in TABLES:
+            if table_name not in frames and not staging_path(table_name).exists():
+                print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+                continue
+            with span(f"sqlite_load:{table_name}") as s:
+                loaded[table_name] = fast_load(conn, table_name, frames.get(table_name))
+                s.set(rows_out=loaded[table_name])
+        with span("sqlite_commit"):
+            conn.execute("COMMIT")
+            conn.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return loaded
+
+
+def merge_load(cur, table_name: str, existing: list[str] | None, df: pd.DataFrame | None = None) -> tuple[int, int, int]:
+    """Merge a staging table into its warehouse copy row by row; returns (upserted, deleted, rows).
+
+    A table that is missing or lacks the same columns (e.g. one fast-loaded
+    without ROW_HASH) is swapped in whole instead.
+    """
+    load_table, columns, rows = load_shadow(cur, table_name, df, row_hash=True)
+    if existing != columns:
+        swap_in(cur, table_name, load_table)
+        return rows, 0, rows
+    upserted, deleted = merge_rows(cur, table_name, load_table, columns)
+    forget_definition(cur, table_name)
+    return upserted, deleted, rows
+
+
+def merge_load_all(frames: dict[str, pd.DataFrame] | None = None) -> dict[str, tuple[int, int, int]]:
+    """Merge every table in one transaction, writing only rows whose hash changed.
+
+    Readers keep the live tables throughout; nothing is dropped or swapped
+    once a table has been merged before. Returns (upserted, deleted, rows)
+    per table.
+    """
+    frames = frames or {}
+    WAREHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    merged = {}
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN")
+        existing = table_columns(cur)
+        for table_name in TABLES:
+            if table_name not in frames and not staging_path(table_name).exists():
+                print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+                continue
+            with span(f"sqlite_merge:{table_name}") as s:
+                merged[table_name] = merge_load(cur, table_name, existing.get(table_name), frames.get(table_name))
+                s.set(rows_in=merged[table_name][2], rows_out=merged[table_name][0], deleted=merged[table_name][1])
+        with span("sqlite_commit"):
+            cur.execute("COMMIT")
+            cur.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return merged
+
+
+def incremental_load_all(frames: dict[str, pd.DataFrame] | None = None) -> dict[str, int]:
+    """Merge the staging tables into the warehouse and refresh the derived tables in SQL.
+
+    Each staging table is loaded into a shadow table and diffed against the
+    warehouse copy; only the restaurant keys whose rows differ are rewritten,
+    and the derived tables (see warehouse_views) are refreshed for just those
+    keys. Everything runs in one transaction. `frames` supplies in-memory
+    staging tables by name. Returns changed keys per staging table and rows
+    written per derived table.
+    """
+    frames = frames or {}
+    WAREHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    changed = {}
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN")
+        existing = table_columns(cur)
+        start_merge(cur)
+        full = False
+        for table_name in STAGING_TABLES:
+            if table_name not in frames and not staging_path(table_name).exists():
+                print(f"Skipping {table_name}: missing {staging_path(table_name)}")
+                continue
+            with span(f"sqlite_merge:{table_name}") as s:
+                load_table, columns, rows = load_shadow(cur, table_name, frames.get(table_name))
+                keys = merge_staging(cur, table_name, load_table, columns, existing.get(table_name))
+                if keys is None:
+                    # New table or new columns: take it whole and rebuild everything derived
+                    swap_in(cur, table_name, load_table)
+                    full = True
+                    keys = rows
+                s.set(rows_in=rows, rows_out=keys)
+            changed[table_name] = keys
+
+        missing = [t for t in STAGING_TABLES if t not in table_columns(cur)]
+        if missing:
+            print(f"Skipping derived tables: missing {', '.join(missing)}")
+        else:
+            for name in DERIVED:
+                with span(f"sqlite_refresh:{name}") as s:
+                    changed[name] = refresh_derived(cur, name, col_defs, create_indexes, existing.get(name), full)
+                    s.set(rows_out=changed[name])
+        with span("sqlite_commit"):
+            cur.execute("COMMIT")
+            cur.execute("ANALYZE")
+    except Exception:
+        if conn.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return changed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load staging CSVs into the SQLite warehouse.")
+    parser.add_argument("--mode", choices=["fast", "stream", "merge", "incremental", "replace"], default="fast",
+                        help="fast: declared schema, one transaction, WAL, indexes; "
+                             "stream: as fast, reading each table in bounded chunks; "
+                             "merge: upsert changed rows by primary key and row hash, delete vanished ones; "
+                             "incremental: merge staging tables by changed key and derive the rest in SQL; "
+                             "replace: pandas to_sql with inferred types")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk in stream mode")
+    args = parser.parse_args(argv)
+
+    WAREHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.mode == "stream":
+        start = time.perf_counter()
+        for table_name, (rows, seconds) in stream_load_all(args.chunk_rows).items():
+            print(f"Loaded {table_name} ({rows} rows, {rows / max(seconds, 1e-9):,.0f} rows/s)")
+        print(f"\n✅ SQLite DB ready: {DB_PATH} ({time.perf_counter() - start:.2f}s, peak RSS {peak_rss_mb():.0f} MB)")
+        return
+
+    if args.mode == "merge":
+        start = time.perf_counter()
+        for table_name, (upserted, deleted, rows) in merge_load_all().items():
+            print(f"Merged {table_name} ({upserted} upserted, {deleted} deleted, {rows} rows)")
+        print(f"\n✅ SQLite DB ready: {DB_PATH} ({time.perf_counter() - start:.2f}s)")
+        return
+
+    if args.mode == "incremental":
+        start = time.perf_counter()
+        for table_name, n in incremental_load_all().items():
+            what = "changed keys" if table_name in STAGING_TABLES else "rows refreshed"
+            print(f"Merged {table_name} ({n} {what})")
+        print(f"\n✅ SQLite DB ready: {DB_PATH} ({time.perf_counter() - start:.2f}s)")
+        return
+
+    if args.mode == "fast":
+        start = time.perf_counter()
+        for table_name, rows in fast_load_all().items():
+            print(f"Loaded {table_name} ({rows} rows)")
+        print(f"\n✅ SQLite DB ready: {DB_PATH} ({time.perf_counter() - start:.2f}s)")
+        return
+
     engine = create_engine(f"sqlite:///{DB_PATH}")
 
-    for table_name, csv_path in TABLES.items():
-        if not csv_path.exists():
-            print(f"Skipping {table_name}: missing {csv_path}")
+    for table_name in TABLES:
+        path = staging_path(table_name)
+        if not path.exists():
+            print(f"Skipping {table_name}: missing {path}")
             continue
-    
-        df = pd.read_csv(csv_path)
-        df.to_sql(table_name, engine, if_exists="replace", index=False)
+
+        df = stringify_times(read_table(table_name))
+        with engine.begin() as conn:
+            df.to_sql(table_name, conn, if_exists="replace", index=False)
+            forget_definition(conn.connection.cursor(), table_name)
         print(f"Loaded {table_name} ({len(df)} rows)")
 
     print(f"\n✅ SQLite DB ready: {DB_PATH}")
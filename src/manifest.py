@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+from raw_reader import loads
+from raw_store import StoredResponse
+
+MANIFEST_DIR = Path("data/staging/.manifest")
+
+
+def file_digest(fp: Path | StoredResponse) -> str:
+    if isinstance(fp, StoredResponse):
+        return fp.sha256
+    h = hashlib.sha256()
+    with fp.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stamp(fp: Path | StoredResponse) -> dict:
+    """The mtime, size and sha256 a manifest entry keeps for `fp`."""
+    st = fp.stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": file_digest(fp)}
+
+
+# Cached rows are split across this many shard files by a hash of the raw file's
+# path, so a run rewrites only the shards holding files that changed
+ROW_SHARDS = 256
+
+
+def shard_of(key: str) -> str:
+    return f"{int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % ROW_SHARDS:03d}"
+
+
+def write_json(path: Path, data) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class Manifest:
+    """Record of the raw files a staging build has processed and the rows each produced.
+
+    Each entry keeps the file's mtime, size and sha256 plus its rows, so a
+    re-run only parses new or changed files and reassembles the output from
+    cached rows for the rest. Bumping `version` (when a row builder changes)
+    invalidates every entry.
+
+    On disk, `{name}/files.json` holds the stamps (and any `meta`) of every
+    file, and the rows live in `{name}/rows/NNN.json` shards, loaded when
+    first needed. `save` rewrites the stamps and only the row shards that
+    changed.
+    """
+
+    def __init__(self, name: str, version: int = 1, manifest_dir: Path = MANIFEST_DIR) -> None:
+        self.dir = manifest_dir / name
+        self.path = self.dir / "files.json"
+        self.legacy_path = manifest_dir / f"{name}.json"     # single-file layout, rows inline
+        self.version = version
+        self.entries: dict[str, dict] = {}
+        self._order: list[str] = []
+        self._shards: dict[str, dict[str, list]] = {}
+        self._dirty: set[str] = set()
+        self._changed = False
+        self._reset = True
+
+        if self.path.exists():
+            saved = loads(self.path.read_bytes())
+            if saved.get("version") == version:
+                self.entries = saved.get("files", {})
+                self._reset = False
+
+    def clear(self) -> None:
+        self.entries = {}
+        self._shards = {}
+        self._dirty = set()
+        self._reset = True
+
+    def _shard(self, shard: str) -> dict[str, list]:
+        if shard not in self._shards:
+            path = self.dir / "rows" / f"{shard}.json"
+            self._shards[shard] = loads(path.read_bytes()) if not self._reset and path.exists() else {}
+        return self._shards[shard]
+
+    def plan(self, files: list[Path]) -> list[Path]:
+        """Return the files that need parsing; forget entries for files that are gone."""
+        self._order = [str(fp) for fp in files]
+        present = set(self._order)
+        for key in [k for k in self.entries if k not in present]:
+            del self.entries[key]
+            self._shard(shard_of(key)).pop(key, None)
+            self._dirty.add(shard_of(key))
+            self._changed = True
+
+        changed = []
+        for fp in files:
+            entry = self.entries.get(str(fp))
+            st = fp.stat()
+            if entry is None or entry["size"] != st.st_size:
+                changed.append(fp)
+            elif entry["mtime_ns"] != st.st_mtime_ns:
+                # Touched: only re-parse if the content actually changed
+                if file_digest(fp) == entry["sha256"]:
+                    entry["mtime_ns"] = st.st_mtime_ns
+                    self._changed = True
+                else:
+                    changed.append(fp)
+        return changed
+
+    def record(self, fp: Path, rows: list[dict], stamp: dict | None = None, **meta) -> None:
+        """Cache `rows` for `fp`; `stamp` (see file_stamp) may come from a worker process."""
+        key = str(fp)
+        self.entries[key] = {**(stamp or file_stamp(fp)), **meta}
+        self._shard(shard_of(key))[key] = rows
+        self._dirty.add(shard_of(key))
+        self._changed = True
+
+    def rows(self) -> Iterator[dict]:
+        """Rows of every planned file, in the order the files were planned."""
+        for key in self._order:
+            yield from self._shard(shard_of(key))[key]
+
+    def meta(self, field: str) -> Iterator:
+        for key in self._order:
+            yield self.entries[key].get(field)
+
+    def save(self) -> None:
+        """Write the changed row shards, then the stamps; a no-op if nothing changed.
+
+        Stamps go last, so an interrupted save at worst makes the next run
+        re-parse the files whose rows were being written.
+        """
+        if not (self._changed or self._reset):
+            return
+        rows_dir = self.dir / "rows"
+        if self._reset:
+            # Without the stamps every file is re-parsed, whatever shards remain
+            if self.path.exists():
+                self.path.unlink()
+            shutil.rmtree(rows_dir, ignore_errors=True)
+        rows_dir.mkdir(parents=True, exist_ok=True)
+        for shard in sorted(self._dirty):
+            path = rows_dir / f"{shard}.json"
+            if self._shards[shard]:
+                write_json(path, self._shards[shard])
+            elif path.exists():
+                path.unlink()
+        write_json(self.path, {"version": self.version, "files": self.entries})
+        if self.legacy_path.exists():
+            self.legacy_path.unlink()
+        self._dirty = set()
+        self._changed = False
+        self._reset = False
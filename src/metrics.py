@@ -0,0 +1,266 @@
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator
+
+# One JSON line per finished span, plus an HTTP summary per process that made requests
+RUN_LOG = Path("data/logs/run_log.jsonl")
+
+# When set, each script also writes <dir>/<script>.prom for node_exporter's textfile collector
+TEXTFILE_DIR_ENV = "METRICS_TEXTFILE_DIR"
+
+PREFIX = "restaurants_pipeline"
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Shared by every process of one run (e.g. a pipeline and the workers it starts)
+RUN_ID = os.environ.setdefault("PIPELINE_RUN_ID", uuid.uuid4().hex[:12])
+SCRIPT = Path(sys.argv[0]).stem or "python"
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans: dict[str, dict] = {}
+_registered = False
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Span:
+    """Counters for one timed unit of work; set them while the span is open."""
+
+    def __init__(self, name: str, parent: str | None, attrs: dict) -> None:
+        self.name = name
+        self.parent = parent
+        self.rows_in: int | None = None
+        self.rows_out: int | None = None
+        self.bytes_read: int | None = None
+        self.bytes_written: int | None = None
+        self.attrs = attrs
+
+    def set(self, **values) -> None:
+        """Set rows_in / rows_out / bytes_read / bytes_written, or any extra attribute."""
+        for key, value in values.items():
+            if key in ("rows_in", "rows_out", "bytes_read", "bytes_written"):
+                setattr(self, key, value)
+            else:
+                self.attrs[key] = value
+
+
+class HttpMetrics:
+    """Thread-safe request counters and latency histogram for the Yelp clients."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)   # last bucket is +Inf
+        self.latency_sum = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    def observe(self, seconds: float, status: int | str) -> None:
+        """One completed request and how long it took."""
+        _register()
+        i = next((i for i, le in enumerate(LATENCY_BUCKETS) if seconds <= le), len(LATENCY_BUCKETS))
+        with self._lock:
+            self.requests[str(status)] = self.requests.get(str(status), 0) + 1
+            self.buckets[i] += 1
+            self.latency_sum += seconds
+            if str(status) == "429":
+                self.rate_limited += 1
+
+    def retried(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def waited(self, seconds: float) -> None:
+        """Time spent blocked by the rate limiter or a Retry-After pause."""
+        if seconds > 0:
+            with self._lock:
+                self.wait_seconds += seconds
+
+    def count(self) -> int:
+        return sum(self.requests.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = []
+            total = 0
+            for n in self.buckets:
+                total += n
+                cumulative.append(total)
+            return {
+                "requests": dict(self.requests),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "rate_limit_wait_s": round(self.wait_seconds, 3),
+                "latency_sum_s": round(self.latency_sum, 3),
+                "latency_buckets": {
+                    **{str(le): n for le, n in zip(LATENCY_BUCKETS, cumulative)},
+                    "+Inf": cumulative[-1],
+                },
+            }
+
+
+http = HttpMetrics()
+
+
+def _write_log(record: dict) -> None:
+    line = json.dumps(record, separators=(",", ":"))
+    with _lock:
+        RUN_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with RUN_LOG.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _register() -> None:
+    global _registered
+    with _lock:
+        if not _registered:
+            atexit.register(export)
+            _registered = True
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a block and log it to RUN_LOG when it ends, even if it raises.
+
+    Records wall time, process CPU time (all threads), the rows and bytes
+    set on the span, and the process's peak RSS so far. Spans nest per
+    thread; each names its parent.
+    """
+    _register()
+    stack = _local.__dict__.setdefault("stack", [])
+    s = Span(name, stack[-1].name if stack else None, attrs)
+    stack.append(s)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    status = "ok"
+    try:
+        yield s
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        stack.pop()
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": RUN_ID,
+            "script": SCRIPT,
+            "pid": os.getpid(),
+            "type": "span",
+            "span": s.name,
+            "parent": s.parent,
+            "status": status,
+            "wall_s": round(time.perf_counter() - wall, 4),
+            "cpu_s": round(time.process_time() - cpu, 4),
+            "rows_in": s.rows_in,
+            "rows_out": s.rows_out,
+            "bytes_read": s.bytes_read,
+            "bytes_written": s.bytes_written,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            **s.attrs,
+        }
+        with _lock:
+            _spans[s.name] = record
+        _write_log(record)
+
+
+def traced(name: str) -> Callable:
+    """Decorator: run the function in a span, counting rows of the frames it takes and returns."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as s:
+                out = fn(*args, **kwargs)
+                frames = [a for a in (*args, *kwargs.values()) if hasattr(a, "columns")]
+                s.set(
+                    rows_in=sum(len(f) for f in frames) if frames else None,
+                    rows_out=len(out) if hasattr(out, "columns") else None,
+                )
+            return out
+        return wrapper
+    return decorate
+
+
+def path_bytes(path: Path) -> int:
+    """Size of a file, or of every file under a directory (e.g. a partitioned dataset)."""
+    if path.is_dir():
+        return sum(fp.stat().st_size for fp in path.rglob("*") if fp.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def prometheus_text() -> str:
+    """The last record of each span plus the HTTP metrics, in Prometheus text format."""
+    with _lock:
+        spans = list(_spans.values())
+
+    lines = []
+
+    def gauge(metric: str, help_text: str, samples: list[tuple[str, float]], kind: str = "gauge") -> None:
+        if not samples:
+            return
+        lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+        lines.extend(f"{PREFIX}_{metric}{labels} {value}" for labels, value in samples)
+
+    def by_span(field: str) -> list[tuple[str, float]]:
+        return [(f'{{span="{r["span"]}"}}', r[field]) for r in spans if r[field] is not None]
+
+    gauge("span_wall_seconds", "Wall time of the span's last run.", by_span("wall_s"))
+    gauge("span_cpu_seconds", "Process CPU time during the span's last run.", by_span("cpu_s"))
+    gauge("span_rows_in", "Rows (or files) read by the span's last run.", by_span("rows_in"))
+    gauge("span_rows_out", "Rows written by the span's last run.", by_span("rows_out"))
+    gauge("span_bytes_read", "Bytes read by the span's last run.", by_span("bytes_read"))
+    gauge("span_bytes_written", "Bytes written by the span's last run.", by_span("bytes_written"))
+    gauge("peak_rss_megabytes", "Peak resident memory of the process.", [("", round(peak_rss_mb(), 1))])
+
+    if http.count():
+        snap = http.snapshot()
+        gauge("http_requests_total", "Yelp API responses by status.",
+              [(f'{{status="{status}"}}', n) for status, n in sorted(snap["requests"].items())], "counter")
+        gauge("http_retries_total", "Requests retried after a 429.", [("", snap["retries"])], "counter")
+        gauge("http_rate_limited_total", "429 responses.", [("", snap["rate_limited"])], "counter")
+        gauge("http_rate_limit_wait_seconds_total", "Time blocked by the rate limiter.",
+              [("", snap["rate_limit_wait_s"])], "counter")
+        buckets = [(f'_bucket{{le="{le}"}}', n) for le, n in snap["latency_buckets"].items()]
+        buckets += [("_sum", snap["latency_sum_s"]), ("_count", http.count())]
+        gauge("http_request_duration_seconds", "Yelp API request latency.", buckets, "histogram")
+
+    gauge("last_run_timestamp_seconds", "When the script last exported metrics.",
+          [(f'{{script="{SCRIPT}"}}', int(time.time()))])
+    return "\n".join(lines) + "\n"
+
+
+def export() -> None:
+    """Log the HTTP summary and write the Prometheus textfile; runs at process exit."""
+    if http.count():
+        _write_log({
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": RUN_ID,
+            "script": SCRIPT,
+            "pid": os.getpid(),
+            "type": "http",
+            **http.snapshot(),
+        })
+
+    textfile_dir = os.getenv(TEXTFILE_DIR_ENV)
+    if textfile_dir:
+        path = Path(textfile_dir) / f"{SCRIPT}.prom"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(prometheus_text(), encoding="utf-8")
+        os.replace(tmp_path, path)
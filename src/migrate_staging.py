@@ -0,0 +1,115 @@
+import argparse
+
+import pandas as pd
+
+import build_canonical_cuisine as cuisine_map
+import build_cuisine_restaurants as cuisine_restaurants
+import build_indian_restaurants as indian
+import build_late_night_indian as late_night_indian
+import build_late_night_restaurants as late_night
+import build_staging_categories as categories
+import build_staging_hours as hours
+import build_staging_restaurants as restaurants
+from restaurant_keys import KEYS, assign_keys, lookup_keys
+from staging_io import read_table, staging_path, table_columns, table_exists, write_table
+from warehouse_schema import pandas_dtypes
+
+
+def is_legacy(name: str) -> bool:
+    """Whether a staging table was written before tables carried `restaurant_key`."""
+    return table_exists(name) and "restaurant_key" not in table_columns(name)
+
+
+def migrate_restaurants(df: pd.DataFrame) -> pd.DataFrame:
+    # Keys are assigned in file order, as build_staging_restaurants does before sorting
+    df.insert(0, "restaurant_key", assign_keys(df["source_id"]))
+    return df
+
+
+def migrate_categories(df: pd.DataFrame) -> pd.DataFrame:
+    keys = lookup_keys(df["source_id"], categories.OUT)
+    df = df[keys.notna()]
+    df.insert(1, "restaurant_key", keys.dropna().astype("int32"))
+    df = df.drop(columns=["source_id"])
+    return df.drop_duplicates(subset=["restaurant_key", "category_alias"], keep="first")
+
+
+def migrate_hours(df: pd.DataFrame) -> pd.DataFrame:
+    """Legacy hours ("HH : MM" times, regular hours only) -> the current table.
+
+    The rows are turned back into raw open periods and rebuilt with
+    build_staging_hours.frame_from_rows, so keys, minute columns and flags
+    come out exactly as a rebuild from raw data would give them.
+    """
+    periods = pd.DataFrame({
+        "source_id": df["source_id"],
+        "hours_type": df["hours_type"] if "hours_type" in df else hours.REGULAR,
+        "day": df["day"],
+        "start": df["start_time"].astype(str).str.replace(" : ", "", regex=False),
+        "end": df["end_time"].astype(str).str.replace(" : ", "", regex=False),
+    })
+    return hours.frame_from_rows(periods[hours.PERIOD_COLUMNS].values.tolist())
+
+
+MIGRATIONS = {
+    restaurants.OUT: migrate_restaurants,
+    categories.OUT: migrate_categories,
+    hours.OUT: migrate_hours,
+}
+
+
+def migrate() -> list[str]:
+    """Add `restaurant_key` to legacy staging tables and rebuild everything derived from them.
+
+    Restaurants are migrated first, so their keys follow restaurant order
+    like a fresh build. Returns the names of the tables written; nothing is
+    written if no table is legacy.
+    """
+    legacy = [name for name in MIGRATIONS if is_legacy(name)]
+    if not legacy:
+        return []
+
+    written = []
+    for name in legacy:
+        # Declared dtypes keep text such as phone and zip_code as written
+        present = table_columns(name)
+        dtypes = {col: dtype for col, dtype in pandas_dtypes(name).items() if col in present}
+        df = MIGRATIONS[name](read_table(name, dtypes=dtypes))
+        write_table(df, name)
+        written.append(name)
+
+    r = read_table(restaurants.OUT)
+    c = cuisine_map.build(read_table(categories.OUT))
+    h = read_table(hours.OUT)
+    i = indian.build(r, c)
+    ln = late_night.build(r, h)
+    derived = {
+        cuisine_map.OUT: (c, None),
+        indian.OUT: (i, None),
+        late_night.OUT: (ln, None),
+        late_night_indian.OUT: (late_night_indian.build(ln, i), None),
+        cuisine_restaurants.OUT: (cuisine_restaurants.build(r, c, h), "canonical_cuisine"),
+    }
+    for name, (df, partition_by) in derived.items():
+        write_table(df, name, partition_by=partition_by)
+        written.append(name)
+    return [*written, KEYS]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Upgrade staging tables written before restaurant_key to the current schema."
+    )
+    parser.parse_args(argv)
+
+    written = migrate()
+    if not written:
+        print("Staging tables are already on the current schema.")
+        return
+    for name in written:
+        print(f"Saved: {staging_path(name)} ({len(read_table(name))} rows)")
+    print("\n✅ Staging migration complete.")
+
+
+if __name__ == "__main__":
+    main()
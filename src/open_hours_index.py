@@ -0,0 +1,216 @@
+import argparse
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from build_staging_hours import REGULAR
+from staging_io import read_table
+
+WAREHOUSE_DIR = Path("data/warehouse")
+HOURS = "staging_hours"
+HOURS_COLUMNS = ["restaurant_key", "hours_type", "day", "start_minute", "end_minute"]
+RESTAURANTS = "staging_restaurants"
+INDEX_PATH = WAREHOUSE_DIR / "open_hours_index.npz"
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]   # Yelp day 0 is Monday
+
+
+def minute_of_week(ts: datetime) -> int:
+    return ts.weekday() * DAY_MINUTES + ts.hour * 60 + ts.minute
+
+
+def parse_when(day: str, hhmm: str) -> int:
+    """("fri", "01:30") -> minute of week.
+
+    Raises ValueError for an unknown day or a time outside 00:00-23:59.
+    """
+    h, m = hhmm.split(":")
+    hour, minute = int(h), int(m)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"time {hhmm!r} is not between 00:00 and 23:59")
+    if day[:3].lower() not in DAYS:
+        raise ValueError(f"day {day!r} is not one of {', '.join(DAYS)}")
+    return DAYS.index(day[:3].lower()) * DAY_MINUTES + hour * 60 + minute
+
+
+def week_intervals(hours: pd.DataFrame) -> pd.DataFrame:
+    """REGULAR hours rows -> half-open [start, end) minute-of-week intervals.
+
+    A period whose end is not after its start runs past midnight (an equal
+    start and end, e.g. 0000-0000, is open 24 hours); it is split at the
+    day boundary, with Sunday night wrapping to Monday. Overlapping and
+    touching intervals of one restaurant within a day are merged, so each
+    restaurant's intervals are disjoint and none is longer than a day.
+    """
+    hours = hours[hours["hours_type"] == REGULAR]
+    day = hours["day"].to_numpy(dtype=np.int64)
+    start = hours["start_minute"].to_numpy(dtype=np.int64)
+    end = hours["end_minute"].to_numpy(dtype=np.int64)
+    overnight = end <= start
+    ids = hours["restaurant_key"].to_numpy(dtype=np.int32)
+
+    base = day * DAY_MINUTES
+    next_base = ((day + 1) % 7) * DAY_MINUTES
+    df = pd.DataFrame({
+        "restaurant_key": np.concatenate([ids, ids[overnight]]),
+        "start": np.concatenate([base + start, next_base[overnight]]),
+        "end": np.concatenate([base + np.where(overnight, DAY_MINUTES, end), next_base[overnight] + end[overnight]]),
+    })
+    df = df[df["end"] > df["start"]].sort_values(["restaurant_key", "start", "end"], kind="stable")
+
+    # Merge per restaurant and day: a new run starts wherever an interval begins after every earlier one ended
+    keys = [df["restaurant_key"], df["start"] // DAY_MINUTES]
+    prev_end = df.groupby(keys)["end"].cummax().groupby(keys).shift()
+    df["run"] = (prev_end.isna() | (df["start"] > prev_end)).cumsum()
+    return (
+        df.groupby("run")
+        .agg(restaurant_key=("restaurant_key", "first"), start=("start", "min"), end=("end", "max"))
+        .reset_index(drop=True)
+    )
+
+
+class OpenHoursIndex:
+    """Minute-of-week intervals sorted by start.
+
+    No interval is longer than `max_len` (at most one day), so every
+    interval containing minute t starts in (t - max_len, t]: a point query
+    is one `searchsorted` over the starts plus a check of that window.
+    """
+
+    def __init__(self, restaurant_key: np.ndarray, start: np.ndarray, end: np.ndarray) -> None:
+        order = np.argsort(start, kind="stable")
+        self.start = start[order].astype(np.int32)
+        self.end = end[order].astype(np.int32)
+        self.restaurant_key = restaurant_key[order]
+        self.max_len = int((self.end - self.start).max()) if len(self.start) else 0
+
+    @classmethod
+    def from_hours(cls, hours: pd.DataFrame) -> "OpenHoursIndex":
+        df = week_intervals(hours)
+        return cls(df["restaurant_key"].to_numpy(dtype=np.int32), df["start"].to_numpy(), df["end"].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def save(self, path: Path = INDEX_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, restaurant_key=self.restaurant_key, start=self.start, end=self.end)
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH) -> "OpenHoursIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["restaurant_key"], data["start"], data["end"])
+
+    def _window(self, lo: int, hi: int) -> slice:
+        """Intervals whose start lies in [lo, hi)."""
+        return slice(
+            int(np.searchsorted(self.start, lo, side="left")),
+            int(np.searchsorted(self.start, hi, side="left")),
+        )
+
+    def open_at(self, t: int | datetime) -> np.ndarray:
+        """restaurant_keys open at minute-of-week `t` (or a datetime)."""
+        if isinstance(t, datetime):
+            t = minute_of_week(t)
+        t %= WEEK_MINUTES
+        w = self._window(t - self.max_len + 1, t + 1)
+        hit = self.end[w] > t
+        return self._keys(np.bincount(self.restaurant_key[w][hit]))
+
+    def _overlaps(self, t0: int, t1: int) -> tuple[np.ndarray, np.ndarray]:
+        """(restaurant_key, overlap minutes) of each interval overlapping [t0, t1), t1 <= week end."""
+        w = self._window(t0 - self.max_len + 1, t1)
+        overlap = np.minimum(self.end[w], t1) - np.maximum(self.start[w], t0)
+        keep = overlap > 0
+        return self.restaurant_key[w][keep], overlap[keep]
+
+    def _range(self, t0: int, span: int) -> tuple[np.ndarray, np.ndarray]:
+        t1 = t0 + span
+        parts = [self._overlaps(t0, min(t1, WEEK_MINUTES))]
+        if t1 > WEEK_MINUTES:
+            parts.append(self._overlaps(0, t1 - WEEK_MINUTES))
+        ids = np.concatenate([p[0] for p in parts])
+        minutes = np.concatenate([p[1] for p in parts])
+        return ids, minutes
+
+    def open_between(self, t0: int | datetime, t1: int | datetime, throughout: bool = False) -> np.ndarray:
+        """restaurant_keys open at any point of [t0, t1); with `throughout`, for all of it.
+
+        Times are taken modulo the week, so a range ending at or before its
+        start wraps around (an equal start and end means the whole week).
+        """
+        if isinstance(t0, datetime):
+            t0 = minute_of_week(t0)
+        if isinstance(t1, datetime):
+            t1 = minute_of_week(t1)
+        span = (t1 - t0) % WEEK_MINUTES or WEEK_MINUTES
+        ids, minutes = self._range(t0 % WEEK_MINUTES, span)
+        if not throughout:
+            return self._keys(np.bincount(ids))
+
+        # Intervals are disjoint per restaurant, so full coverage means the overlaps sum to the range
+        return self._keys(np.bincount(ids, weights=minutes) >= span)
+
+    def _keys(self, per_key: np.ndarray) -> np.ndarray:
+        """Sorted restaurant_keys with a nonzero count in a per-key array.
+
+        Keys are dense, so counting per key is a linear pass where np.unique
+        would sort the whole window.
+        """
+        return np.flatnonzero(per_key).astype(self.restaurant_key.dtype)
+
+
+def build(hours: pd.DataFrame | None = None, path: Path = INDEX_PATH) -> OpenHoursIndex:
+    if hours is None:
+        hours = read_table(HOURS, columns=HOURS_COLUMNS)
+    index = OpenHoursIndex.from_hours(hours)
+    index.save(path)
+    return index
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or query the minute-of-week open-hours index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help=f"build {INDEX_PATH} from {HOURS}")
+
+    q = sub.add_parser("query", help="restaurants open at a time, or during a time range")
+    q.add_argument("--day", required=True, help="mon..sun")
+    q.add_argument("--at", required=True, metavar="HH:MM")
+    q.add_argument("--until", metavar="HH:MM", help="end of a range; wraps into the next day if earlier")
+    q.add_argument("--throughout", action="store_true", help="require being open for the whole range")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build()
+        print(f"Saved: {INDEX_PATH}")
+        print(f"Open intervals: {len(index)} (longest {index.max_len} min)")
+        return
+
+    index = OpenHoursIndex.load() if INDEX_PATH.exists() else build()
+    t0 = parse_when(args.day, args.at)
+
+    start = time.perf_counter()
+    if args.until:
+        t1 = parse_when(args.day, args.until)
+        ids = index.open_between(t0, t1, throughout=args.throughout)
+    else:
+        ids = index.open_at(t0)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    restaurants = read_table(RESTAURANTS, columns=["restaurant_key", "name", "rating", "review_count", "distance_to_ucf_miles"])
+    out = restaurants[restaurants["restaurant_key"].isin(ids)].sort_values(
+        by=["rating", "review_count", "distance_to_ucf_miles"],
+        ascending=[False, False, True],
+        na_position="last"
+    )
+    print(f"Open: {len(out)} ({elapsed_ms:.2f} ms)")
+    print(out[["name", "rating", "review_count", "distance_to_ucf_miles"]].head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from open_hours_index import HOURS_COLUMNS, OpenHoursIndex, parse_when
+from staging_io import read_table
+
+RESTAURANTS = "staging_restaurants"
+CUISINE = "staging_cuisine_map"
+HOURS = "staging_hours"
+
+COLUMNS = [
+    "restaurant_key",
+    "source_id",
+    "name",
+    "rating",
+    "review_count",
+    "price",
+    "distance_to_ucf_miles",
+    "full_address",
+    "url"
+]
+
+
+class SortedColumn:
+    """One numeric column sorted once, so a threshold filter is a single searchsorted."""
+
+    def __init__(self, values: np.ndarray) -> None:
+        self.n = len(values)
+        self.order = np.argsort(values, kind="stable")
+        self.sorted = values[self.order]
+
+    def _mask(self, positions: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.n, dtype=bool)
+        mask[positions] = True
+        return mask
+
+    def at_least(self, value: float) -> np.ndarray:
+        return self._mask(self.order[np.searchsorted(self.sorted, value, side="left"):])
+
+    def at_most(self, value: float) -> np.ndarray:
+        # NaNs sort last, so they never pass
+        return self._mask(self.order[:np.searchsorted(self.sorted, value, side="right")])
+
+
+class QueryEngine:
+    """Restaurants, cuisines and opening hours preloaded into per-attribute filters.
+
+    Every filter yields a boolean bitmap over the restaurant rows; a query
+    ANDs the bitmaps it needs and takes the top K by a precomputed global
+    rank with `argpartition`, so only the K winners are fully sorted.
+    """
+
+    def __init__(self, restaurants: pd.DataFrame, cuisine: pd.DataFrame, hours: pd.DataFrame) -> None:
+        self.restaurants = restaurants[COLUMNS].reset_index(drop=True)
+        self.n = len(self.restaurants)
+
+        # restaurant_key -> row (-1 for keys not in the frame); keys are dense, so this is a plain array
+        keys = self.restaurants["restaurant_key"].to_numpy(dtype=np.int64)
+        self.row_of_key = np.full(int(keys.max()) + 1 if self.n else 1, -1, dtype=np.int64)
+        self.row_of_key[keys] = np.arange(self.n)
+
+        # rank[i] = position of row i when sorted best rated, most reviewed, then closest first
+        r = self.restaurants
+        ranking = np.lexsort((
+            r["distance_to_ucf_miles"].fillna(np.inf).to_numpy(),
+            -r["review_count"].fillna(-1).to_numpy(),
+            -r["rating"].fillna(-1).to_numpy(),
+        ))
+        self.rank = np.empty(self.n, dtype=np.int64)
+        self.rank[ranking] = np.arange(self.n)
+
+        self.rating = SortedColumn(r["rating"].to_numpy(dtype=float))
+        self.review_count = SortedColumn(r["review_count"].to_numpy(dtype=float))
+        self.distance = SortedColumn(r["distance_to_ucf_miles"].to_numpy(dtype=float))
+
+        self.cuisines = {
+            name.lower(): self._bitmap(group["restaurant_key"].to_numpy())
+            for name, group in cuisine.groupby("canonical_cuisine", observed=True)
+        }
+        late_keys = hours.loc[hours["is_late_night_11pm"] == 1, "restaurant_key"].to_numpy()
+        self.late_night = self._bitmap(late_keys)
+        self.open_hours = OpenHoursIndex.from_hours(hours)
+
+    @classmethod
+    def load(cls) -> "QueryEngine":
+        return cls(
+            read_table(RESTAURANTS, columns=COLUMNS),
+            read_table(CUISINE, columns=["restaurant_key", "canonical_cuisine"]),
+            read_table(HOURS, columns=[*HOURS_COLUMNS, "is_late_night_11pm"]),
+        )
+
+    def _bitmap(self, restaurant_keys: np.ndarray) -> np.ndarray:
+        """restaurant_keys -> boolean mask over restaurant rows (unknown keys are ignored)."""
+        mask = np.zeros(self.n, dtype=bool)
+        keys = restaurant_keys[restaurant_keys < len(self.row_of_key)]
+        rows = self.row_of_key[keys]
+        mask[rows[rows >= 0]] = True
+        return mask
+
+    def top_rows(
+        self,
+        cuisine: str | None = None,
+        late_night: bool = False,
+        open_at: int | None = None,
+        open_between: tuple[int, int] | None = None,
+        throughout: bool = False,
+        max_miles: float | None = None,
+        min_rating: float | None = None,
+        min_reviews: int | None = None,
+        k: int = 10,
+    ) -> np.ndarray:
+        """Rows of `restaurants` of the top `k` restaurants passing every given filter, best first.
+
+        `open_at` and `open_between` are minutes of the week (see
+        open_hours_index.parse_when).
+        """
+        mask = np.ones(self.n, dtype=bool)
+        if cuisine:
+            mask &= self.cuisines.get(cuisine.lower(), np.zeros(self.n, dtype=bool))
+        if late_night:
+            mask &= self.late_night
+        if open_at is not None:
+            mask &= self._bitmap(self.open_hours.open_at(open_at))
+        if open_between is not None:
+            mask &= self._bitmap(self.open_hours.open_between(*open_between, throughout=throughout))
+        if max_miles is not None:
+            mask &= self.distance.at_most(max_miles)
+        if min_rating is not None:
+            mask &= self.rating.at_least(min_rating)
+        if min_reviews is not None:
+            mask &= self.review_count.at_least(min_reviews)
+
+        rows = np.flatnonzero(mask)
+        if len(rows) > k:
+            rows = rows[np.argpartition(self.rank[rows], k - 1)[:k]]
+        return rows[np.argsort(self.rank[rows], kind="stable")]
+
+    def query(self, **filters) -> pd.DataFrame:
+        """Top restaurants as a frame; takes the same arguments as top_rows."""
+        return self.restaurants.iloc[self.top_rows(**filters)].reset_index(drop=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Query restaurants by cuisine, hours, distance and rating.")
+    parser.add_argument("--cuisine", help="canonical cuisine, e.g. Indian")
+    parser.add_argument("--late-night", action="store_true", help="open past 11 PM on some day")
+    parser.add_argument("--open-at", nargs=2, metavar=("DAY", "HH:MM"), help="open at this time, e.g. fri 01:30")
+    parser.add_argument("--open-between", nargs=3, metavar=("DAY", "HH:MM", "HH:MM"),
+                        help="open during this window; the end wraps into the next day if earlier")
+    parser.add_argument("--throughout", action="store_true", help="with --open-between, open for all of it")
+    parser.add_argument("--max-miles", type=float, help="max distance to UCF")
+    parser.add_argument("--min-rating", type=float)
+    parser.add_argument("--min-reviews", type=int)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    engine = QueryEngine.load()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    open_between = None
+    if args.open_between:
+        day, t0, t1 = args.open_between
+        open_between = (parse_when(day, t0), parse_when(day, t1))
+
+    start = time.perf_counter()
+    out = engine.query(
+        cuisine=args.cuisine,
+        late_night=args.late_night,
+        open_at=parse_when(*args.open_at) if args.open_at else None,
+        open_between=open_between,
+        throughout=args.throughout,
+        max_miles=args.max_miles,
+        min_rating=args.min_rating,
+        min_reviews=args.min_reviews,
+        k=args.k,
+    )
+    query_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Matches: {len(out)} (load {load_ms:.0f} ms, query {query_ms:.2f} ms)")
+    print(out[["name", "rating", "review_count", "distance_to_ucf_miles"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
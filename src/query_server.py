@@ -0,0 +1,197 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from open_hours_index import parse_when
+from query_restaurants import CUISINE, HOURS, RESTAURANTS, QueryEngine
+from staging_io import staging_path
+
+HOST = "127.0.0.1"
+PORT = 8780
+POLL_SECONDS = 2.0
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+def staging_fingerprint() -> tuple:
+    """Names, sizes and mtimes of the staging tables the engine is built from."""
+    parts = []
+    for name in (RESTAURANTS, CUISINE, HOURS):
+        path = staging_path(name)
+        files = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for fp in files:
+            if fp.is_file():
+                st = fp.stat()
+                parts.append((str(fp), st.st_size, st.st_mtime_ns))
+    return tuple(parts)
+
+
+class Loaded(NamedTuple):
+    engine: QueryEngine
+    rows: list[str]         # each restaurant row, pre-encoded as a JSON object
+    fingerprint: tuple
+    loaded_at: float
+
+
+def encode_rows(df: pd.DataFrame) -> list[str]:
+    """Each row as a JSON object, with missing values as null."""
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    return [json.dumps(r) for r in records]
+
+
+def load(fingerprint: tuple) -> Loaded:
+    engine = QueryEngine.load()
+    return Loaded(engine, encode_rows(engine.restaurants), fingerprint, time.time())
+
+
+class Snapshot:
+    """The current QueryEngine, rebuilt off the request path when staging changes.
+
+    Requests read `current` once and use that object throughout, so swapping
+    in a new engine is a single reference assignment: a request sees either
+    the old snapshot or the new one, never a mix.
+    """
+
+    def __init__(self) -> None:
+        self.current = load(staging_fingerprint())
+        self.reloads = 0
+
+    def maybe_reload(self, seen: tuple) -> tuple:
+        """Reload if staging changed and has held still since the last poll (`seen`).
+
+        Staging CSVs are rewritten in place, so a snapshot is only taken once
+        the files stop changing, and it is dropped if they changed while it
+        loaded. A failed load keeps the current snapshot. Returns the
+        fingerprint observed now, to pass to the next call.
+        """
+        now = staging_fingerprint()
+        if now == self.current.fingerprint or now != seen:
+            return now
+        start = time.perf_counter()
+        try:
+            loaded = load(now)
+        except Exception as e:
+            print(f"Reload failed, keeping current snapshot: {e}")
+            return now
+        if staging_fingerprint() != now:
+            return ()
+        self.current = loaded
+        self.reloads += 1
+        print(f"Reloaded snapshot ({loaded.engine.n} restaurants, {(time.perf_counter() - start) * 1000:.0f} ms)")
+        return now
+
+    def watch(self, poll_seconds: float = POLL_SECONDS) -> None:
+        seen = self.current.fingerprint
+        while True:
+            time.sleep(poll_seconds)
+            seen = self.maybe_reload(seen)
+
+
+def query_args(params: dict[str, list[str]]) -> dict:
+    """Query-string parameters -> QueryEngine.query keyword arguments.
+
+    `open_at` is "DAY HH:MM" and `open_between` is "DAY HH:MM HH:MM", as
+    on the query_restaurants.py command line.
+    """
+    def get(key: str) -> str | None:
+        return params[key][-1] if key in params else None
+
+    kwargs = {
+        "cuisine": get("cuisine"),
+        "late_night": (get("late_night") or "").lower() in TRUE_VALUES,
+        "throughout": (get("throughout") or "").lower() in TRUE_VALUES,
+        "k": int(get("k") or 10),
+    }
+    if get("open_at"):
+        kwargs["open_at"] = parse_when(*get("open_at").split())
+    if get("open_between"):
+        day, t0, t1 = get("open_between").split()
+        kwargs["open_between"] = (parse_when(day, t0), parse_when(day, t1))
+    for key, cast in (("max_miles", float), ("min_rating", float), ("min_reviews", int)):
+        if get(key) is not None:
+            kwargs[key] = cast(get(key))
+    if kwargs["k"] < 1:
+        raise ValueError("k must be at least 1")
+    return kwargs
+
+
+class Handler(BaseHTTPRequestHandler):
+    snapshot: Snapshot
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        current = self.snapshot.current
+
+        if url.path == "/health":
+            self.send_json(200, {
+                "restaurants": current.engine.n,
+                "loaded_at": current.loaded_at,
+                "reloads": self.snapshot.reloads,
+            })
+            return
+        if url.path != "/restaurants":
+            self.send_json(404, {"error": f"unknown path {url.path}; use /restaurants or /health"})
+            return
+
+        start = time.perf_counter()
+        try:
+            kwargs = query_args(parse_qs(url.query))
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {"error": f"bad query: {e}"})
+            return
+        rows = current.engine.top_rows(**kwargs)
+        results = ", ".join(current.rows[i] for i in rows)
+        query_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.send_body(200, (
+            f'{{"count": {len(rows)}, "query_ms": {query_ms}, '
+            f'"loaded_at": {current.loaded_at}, "results": [{results}]}}'
+        ))
+
+    def send_json(self, status: int, body: dict) -> None:
+        self.send_body(status, json.dumps(body))
+
+    def send_body(self, status: int, body: str) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        # One line per request is noise at thousands of requests a day
+        pass
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve restaurant queries as JSON from an in-memory snapshot.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS,
+                        help="seconds between checks of staging for changes")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    Handler.snapshot = Snapshot()
+    print(f"Loaded snapshot ({Handler.snapshot.current.engine.n} restaurants, "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms)")
+    threading.Thread(target=Handler.snapshot.watch, args=(args.poll,), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{args.port}/restaurants (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from raw_store import DETAILS, READ_BATCH, SEARCH, SEARCH_GLOB, StoredResponse, store_for
+
+# orjson is optional; it decodes the raw pages several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RAW_DIR = Path("data/raw")
+DETAILS_DIR = RAW_DIR / "details"
+
+
+def loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def read_json(fp: Path) -> Any:
+    return loads(fp.read_bytes())
+
+
+def search_files(raw_dir: Path = RAW_DIR) -> list[Path | StoredResponse]:
+    """Search pages, from the raw store once it exists, else from the JSON files."""
+    store = store_for(raw_dir)
+    files = store.entries(SEARCH) if store else sorted(raw_dir.glob(SEARCH_GLOB))
+    if not files:
+        raise FileNotFoundError(f"No raw files found in {raw_dir} (expected {SEARCH_GLOB})")
+    return files
+
+
+def detail_files(details_dir: Path = DETAILS_DIR) -> list[Path | StoredResponse]:
+    store = store_for(details_dir.parent)
+    files = store.entries(DETAILS) if store else sorted(details_dir.glob("*.json"))
+    if not files:
+        raise FileNotFoundError(f"No detail JSON files found in {details_dir}")
+    return files
+
+
+def _decode_stored(batch: list[StoredResponse]) -> Iterator[tuple[StoredResponse, dict]]:
+    if batch:
+        for stored, raw in zip(batch, batch[0].store.read_many(batch)):
+            yield stored, loads(raw)
+
+
+def iter_pages(files: Iterable[Path | StoredResponse]) -> Iterator[tuple[Path | StoredResponse, dict]]:
+    """Decode each raw file exactly once, one at a time.
+
+    Stored responses are read READ_BATCH per query rather than one by one.
+    """
+    batch: list[StoredResponse] = []
+    for fp in files:
+        if isinstance(fp, StoredResponse):
+            batch.append(fp)
+            if len(batch) == READ_BATCH:
+                yield from _decode_stored(batch)
+                batch = []
+        else:
+            yield from _decode_stored(batch)
+            batch = []
+            yield fp, read_json(fp)
+    yield from _decode_stored(batch)
+
+
+def iter_businesses(files: Iterable[Path] | None = None) -> Iterator[dict]:
+    """Lazily yield every business from the search pages; only one page is held in memory."""
+    for _, data in iter_pages(search_files() if files is None else files):
+        yield from data.get("businesses", [])
+
+
+def iter_details(files: Iterable[Path] | None = None) -> Iterator[dict]:
+    """Lazily yield every business details response."""
+    for _, data in iter_pages(detail_files() if files is None else files):
+        yield data
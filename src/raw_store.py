@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from http_cache import CACHE_INDEX, ResponseCache, plan_refresh
+
+STORE_NAME = "raw.sqlite"
+STORE_PATH = Path("data/raw") / STORE_NAME
+
+# kinds of stored response; search pages are keyed by their legacy file stem, details by business id
+SEARCH = "search"
+DETAILS = "details"
+
+SEARCH_GLOB = "yelp_search_offset_*.json"
+READ_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    size INTEGER NOT NULL,      -- uncompressed bytes
+    sha256 TEXT NOT NULL,       -- of the uncompressed bytes
+    body BLOB NOT NULL,         -- zlib-compressed JSON
+    PRIMARY KEY (kind, key)
+)
+"""
+
+
+class StoredResponse(NamedTuple):
+    """A response held in the raw store, standing in for its legacy file path.
+
+    It has the `name`, `stat()` and `read_bytes()` the staging code uses on
+    raw files, and prints as the path the file had, so manifests and
+    pipeline fingerprints treat stored and on-disk responses alike.
+    """
+
+    store: "RawStore"
+    kind: str
+    key: str
+    path: Path
+    st_size: int
+    st_mtime_ns: int
+    sha256: str
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def stat(self) -> "StoredResponse":
+        return self
+
+    def read_bytes(self) -> bytes:
+        return self.store.get(self.kind, self.key)
+
+
+class RawStore:
+    """Raw Yelp responses as compressed rows of one SQLite table.
+
+    Replaces a JSON file per search page and per business with one file:
+    random access by (kind, key), batched reads in key order, and
+    fetched-at / ETag metadata next to each body. A re-fetch replaces the
+    row in place.
+    """
+
+    def __init__(self, path: Path = STORE_PATH) -> None:
+        self.path = path
+        self.raw_dir = path.parent
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn.execute(SCHEMA)
+
+    def __reduce__(self):
+        # Worker processes reopen the store instead of inheriting a connection
+        return open_store, (self.path,)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """One connection per thread; fetch workers and pipeline stages share the store."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def legacy_path(self, kind: str, key: str) -> Path:
+        if kind == DETAILS:
+            return self.raw_dir / "details" / f"{key}.json"
+        return self.raw_dir / f"{key}.json"
+
+    def get(self, kind: str, key: str) -> bytes | None:
+        row = self.conn.execute(
+            "SELECT body FROM responses WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def read_many(self, responses: list[StoredResponse]) -> list[bytes]:
+        """Bodies of `responses` (all of one kind), in order, READ_BATCH keys per query."""
+        out = []
+        for i in range(0, len(responses), READ_BATCH):
+            batch = responses[i:i + READ_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = dict(self.conn.execute(
+                f"SELECT key, body FROM responses WHERE kind = ? AND key IN ({marks})",
+                (batch[0].kind, *(r.key for r in batch)),
+            ))
+            out.extend(zlib.decompress(rows[r.key]) for r in batch)
+        return out
+
+    def put(self, kind: str, key: str, raw: bytes, etag: str | None = None, fetched_at: float | None = None) -> None:
+        self.put_many([(kind, key, raw, etag, time.time() if fetched_at is None else fetched_at)])
+
+    def put_many(self, rows: Iterable[tuple[str, str, bytes, str | None, float]]) -> int:
+        """Insert or replace (kind, key, raw, etag, fetched_at) rows in one transaction."""
+        records = [
+            (kind, key, fetched_at, etag, len(raw), hashlib.sha256(raw).hexdigest(), zlib.compress(raw))
+            for kind, key, raw, etag, fetched_at in rows
+        ]
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO responses (kind, key, fetched_at, etag, size, sha256, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+        return len(records)
+
+    def touch(self, kind: str, key: str, etag: str | None = None, fetched_at: float | None = None) -> None:
+        """Mark a stored response as revalidated (a 304) without rewriting its body."""
+        self.conn.execute(
+            "UPDATE responses SET fetched_at = ?, etag = COALESCE(?, etag) WHERE kind = ? AND key = ?",
+            (time.time() if fetched_at is None else fetched_at, etag, kind, key),
+        )
+
+    def meta(self, kind: str) -> dict[str, tuple[float, str | None]]:
+        """key -> (fetched_at, etag) for every response of `kind`."""
+        rows = self.conn.execute("SELECT key, fetched_at, etag FROM responses WHERE kind = ?", (kind,))
+        return {key: (fetched_at, etag) for key, fetched_at, etag in rows}
+
+    def entries(self, kind: str) -> list[StoredResponse]:
+        """Every response of `kind`, sorted like the legacy files' paths."""
+        rows = self.conn.execute(
+            "SELECT key, size, fetched_at, sha256 FROM responses WHERE kind = ?", (kind,)
+        )
+        entries = [
+            StoredResponse(self, kind, key, self.legacy_path(kind, key), size, int(fetched_at * 1e9), sha256)
+            for key, size, fetched_at, sha256 in rows
+        ]
+        entries.sort(key=lambda r: r.name)
+        return entries
+
+    def count(self, kind: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM responses WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+class StoreCache:
+    """ResponseCache over the raw store, for the fetchers once data/raw is migrated.
+
+    Callers keep addressing responses by their legacy file paths; each path
+    maps to a (kind, key) row, and fetched-at / ETag live in that row.
+    """
+
+    def __init__(self, store: "RawStore") -> None:
+        self.store = store
+        self._meta: dict[str, dict[str, tuple[float, str | None]]] = {}
+        self._lock = threading.Lock()
+
+    def _locate(self, path: Path) -> tuple[dict, str, str]:
+        kind = DETAILS if path.parent.name == "details" else SEARCH
+        with self._lock:
+            if kind not in self._meta:
+                self._meta[kind] = self.store.meta(kind)
+        return self._meta[kind], kind, path.stem
+
+    def fetched_at(self, path: Path) -> float | None:
+        meta, _, key = self._locate(path)
+        return meta[key][0] if key in meta else None
+
+    def etag(self, path: Path) -> str | None:
+        meta, _, key = self._locate(path)
+        return meta[key][1] if key in meta else None
+
+    def plan(
+        self,
+        paths: list[Path],
+        ttl_days: float,
+        budget: int | None = None,
+        now: float | None = None,
+    ) -> tuple[list[Path], list[Path]]:
+        return plan_refresh([(path, self.fetched_at(path)) for path in paths], ttl_days, budget, now)
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        """Legacy paths of the stored responses matching `directory / pattern`, sorted."""
+        meta, _, _ = self._locate(directory / "_")
+        return sorted(path for path in (directory / f"{key}.json" for key in meta) if path.match(pattern))
+
+    def exists(self, path: Path) -> bool:
+        meta, _, key = self._locate(path)
+        return key in meta
+
+    def read(self, path: Path) -> dict:
+        _, kind, key = self._locate(path)
+        return json.loads(self.store.get(kind, key))
+
+    def write(self, path: Path, data: dict) -> None:
+        meta, kind, key = self._locate(path)
+        now = time.time()
+        self.store.put(kind, key, json.dumps(data, separators=(",", ":")).encode(), fetched_at=now)
+        meta[key] = (now, None)
+
+    def record(self, path: Path, etag: str | None, now: float | None = None) -> None:
+        meta, kind, key = self._locate(path)
+        now = time.time() if now is None else now
+        self.store.touch(kind, key, etag, fetched_at=now)
+        meta[key] = (now, etag or meta.get(key, (now, None))[1])
+
+    def save(self) -> None:
+        """Every write is already committed."""
+
+
+@lru_cache(maxsize=None)
+def open_store(path: Path = STORE_PATH) -> RawStore:
+    return RawStore(path)
+
+
+def store_for(raw_dir: Path) -> RawStore | None:
+    """The raw store under `raw_dir`, once migrate has created it."""
+    path = raw_dir / STORE_NAME
+    return open_store(path) if path.exists() else None
+
+
+def open_cache(raw_dir: Path = STORE_PATH.parent) -> ResponseCache | StoreCache:
+    """The fetchers' response cache: the raw store once it exists, else the per-file layout."""
+    store = store_for(raw_dir)
+    return StoreCache(store) if store else ResponseCache(raw_dir / CACHE_INDEX.name)
+
+
+def legacy_files(raw_dir: Path) -> list[tuple[str, Path]]:
+    """(kind, path) of every per-file response under `raw_dir`."""
+    return [
+        *((SEARCH, fp) for fp in sorted(raw_dir.glob(SEARCH_GLOB))),
+        *((DETAILS, fp) for fp in sorted((raw_dir / "details").glob("*.json"))),
+    ]
+
+
+def migrate(raw_dir: Path = STORE_PATH.parent, delete: bool = False, batch: int = 1000) -> int:
+    """Copy the per-file raw layout into the store; with `delete`, remove the files after.
+
+    Bodies are stored byte for byte, so the staging manifests recognise
+    every migrated response as unchanged. Fetched-at and ETag come from the
+    HTTP cache index where present, else the file's mtime.
+    """
+    cache_index = raw_dir / CACHE_INDEX.name
+    cache = ResponseCache(cache_index)
+    store = open_store(raw_dir / STORE_NAME)
+    files = legacy_files(raw_dir)
+
+    for i in range(0, len(files), batch):
+        store.put_many(
+            (kind, fp.stem, fp.read_bytes(), cache.etag(fp), cache.fetched_at(fp))
+            for kind, fp in files[i:i + batch]
+        )
+
+    if delete:
+        for _, fp in files:
+            fp.unlink()
+        cache_index.unlink(missing_ok=True)
+    return len(files)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=f"Manage the consolidated raw store ({STORE_PATH}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="copy data/raw JSON files into the store")
+    m.add_argument("--delete", action="store_true", help="delete the JSON files once they are stored")
+    sub.add_parser("stats", help="responses and bytes per kind")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        start = time.perf_counter()
+        n = migrate(delete=args.delete)
+        print(f"Migrated {n} raw files into {STORE_PATH} ({time.perf_counter() - start:.2f}s)")
+        if args.delete:
+            print("Deleted the migrated JSON files")
+        return
+
+    store = open_store()
+    for kind, n, size, stored in store.conn.execute(
+        "SELECT kind, COUNT(*), SUM(size), SUM(LENGTH(body)) FROM responses GROUP BY kind ORDER BY kind"
+    ):
+        print(f"{kind:<10}{n:>10} responses {size / 1e6:>10.1f} MB raw {stored / 1e6:>10.1f} MB stored")
+    print(f"Store file: {STORE_PATH.stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+
+import pandas as pd
+
+from staging_io import read_table, table_exists, write_table
+
+# Persisted source_id -> restaurant_key map; keys are never reused or reassigned
+KEYS = "restaurant_keys"
+
+_lock = threading.Lock()
+
+
+def load_keys() -> pd.Series:
+    """restaurant_key indexed by source_id."""
+    if not table_exists(KEYS):
+        return pd.Series([], index=pd.Index([], dtype=object, name="source_id"), dtype="int32", name="restaurant_key")
+    df = read_table(KEYS, columns=["source_id", "restaurant_key"])
+    return df.set_index("source_id")["restaurant_key"].astype("int32")
+
+
+def assign_keys(source_ids: pd.Series) -> pd.Series:
+    """Dense int32 surrogate key for each source_id.
+
+    Ids seen before keep their key; new ids get the next free keys (from 1,
+    in order of first appearance) and the map is saved, so keys are stable
+    across runs and shared by every staging table. Only the restaurant
+    dimension (build_staging_restaurants, and the staging migration) calls
+    this; the other tables use lookup_keys.
+    """
+    with _lock:
+        keys = load_keys()
+        new_ids = pd.unique(source_ids[~source_ids.isin(keys.index)].dropna())
+        if len(new_ids):
+            start = int(keys.max()) + 1 if len(keys) else 1
+            added = pd.Series(range(start, start + len(new_ids)), index=new_ids, dtype="int32")
+            keys = pd.concat([keys, added])
+            write_table(
+                pd.DataFrame({"source_id": keys.index, "restaurant_key": keys.to_numpy()}),
+                KEYS,
+            )
+        return source_ids.map(keys).astype("int32")
+
+
+def lookup_keys(source_ids: pd.Series, table: str) -> pd.Series:
+    """restaurant_key of each source_id from the saved map, without adding to it.
+
+    Ids with no key have no staging_restaurants row; they come back as NA
+    and are reported, so callers can drop rows that would point at nothing.
+    """
+    keys = source_ids.map(load_keys()).astype("Int32")
+    unknown = source_ids[keys.isna()].nunique()
+    if unknown:
+        print(f"{table}: dropped rows for {unknown} source_id(s) with no staging_restaurants row")
+    return keys
@@ -0,0 +1,335 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, NamedTuple
+
+import pandas as pd
+
+import build_canonical_cuisine as cuisine_map
+import build_cuisine_restaurants as cuisine_restaurants
+import build_indian_restaurants as indian
+import build_late_night_indian as late_night_indian
+import build_late_night_restaurants as late_night
+import build_staging_categories as categories
+import build_staging_hours as hours
+import build_staging_restaurants as restaurants
+import load_to_postgres
+import load_to_sqlite
+import open_hours_index
+import warehouse_views
+from cuisine_taxonomy import TAXONOMY_PATH
+from manifest import MANIFEST_DIR
+from metrics import span
+from raw_reader import detail_files, search_files
+from staging_io import read_table, table_exists, write_table
+
+STATE_PATH = MANIFEST_DIR / "pipeline.json"
+SRC_DIR = Path(__file__).resolve().parent
+
+SEARCH = "search_pages"
+DETAILS = "detail_files"
+TAXONOMY = "taxonomy"
+
+
+class Stage(NamedTuple):
+    module: ModuleType                  # its source is part of the stage fingerprint
+    deps: tuple[str, ...]               # upstream stages, or SEARCH / DETAILS / TAXONOMY inputs
+    run: Callable[[dict], pd.DataFrame | int]
+    output: str | None = None           # staging table written from the returned frame
+    exists: Callable[[], bool] | None = None  # whether a loader's target is still there
+    partition_by: str | None = None     # see staging_io.write_table
+
+
+def stages(
+    full: bool,
+    reference_points: dict[str, tuple[float, float]],
+    postgres: bool,
+    parse_workers: int = 1,
+    incremental: bool = False,
+) -> dict[str, Stage]:
+    """The pipeline DAG, in a valid topological order.
+
+    With `incremental`, the warehouse loads merge only the staging tables
+    and derive the rest in SQL, so the pandas derived stages are dropped.
+    """
+    dag = {
+        "staging_restaurants": Stage(
+            restaurants, (SEARCH,),
+            lambda _: restaurants.build(full=full, reference_points=reference_points),
+            restaurants.OUT,
+        ),
+        "staging_categories": Stage(
+            # Keys are assigned in restaurant order, so the dimension is built first
+            categories, (SEARCH, "staging_restaurants"),
+            lambda _: categories.build(full=full),
+            categories.OUT,
+        ),
+        "staging_hours": Stage(
+            hours, (DETAILS, "staging_restaurants"),
+            lambda _: hours.build(full=full, workers=parse_workers)[0],
+            hours.OUT,
+        ),
+        "staging_cuisine_map": Stage(
+            cuisine_map, ("staging_categories", TAXONOMY),
+            lambda i: cuisine_map.build(i["staging_categories"]),
+            cuisine_map.OUT,
+        ),
+        "indian_restaurants": Stage(
+            indian, ("staging_restaurants", "staging_cuisine_map"),
+            lambda i: indian.build(i["staging_restaurants"], i["staging_cuisine_map"]),
+            indian.OUT,
+        ),
+        "late_night_restaurants": Stage(
+            late_night, ("staging_restaurants", "staging_hours"),
+            lambda i: late_night.build(i["staging_restaurants"], i["staging_hours"]),
+            late_night.OUT,
+        ),
+        "late_night_indian_restaurants": Stage(
+            late_night_indian, ("late_night_restaurants", "indian_restaurants"),
+            lambda i: late_night_indian.build(i["late_night_restaurants"], i["indian_restaurants"]),
+            late_night_indian.OUT,
+        ),
+        "cuisine_restaurants": Stage(
+            cuisine_restaurants, ("staging_restaurants", "staging_cuisine_map", "staging_hours"),
+            lambda i: cuisine_restaurants.build(
+                i["staging_restaurants"], i["staging_cuisine_map"], i["staging_hours"]
+            ),
+            cuisine_restaurants.OUT,
+            partition_by="canonical_cuisine",
+        ),
+        "open_hours_index": Stage(
+            open_hours_index, ("staging_hours",),
+            lambda i: len(open_hours_index.build(i["staging_hours"])),
+            exists=open_hours_index.INDEX_PATH.exists,
+        ),
+        "load_sqlite": Stage(
+            load_to_sqlite, tuple(load_to_sqlite.TABLES),
+            lambda i: sum(load_to_sqlite.fast_load_all(i).values()),
+            exists=load_to_sqlite.DB_PATH.exists,
+        ),
+    }
+    if postgres:
+        dag["load_postgres"] = Stage(
+            load_to_postgres, tuple(load_to_postgres.TABLES),
+            lambda i: sum(rows for rows, _ in load_to_postgres.copy_load_all(pg_engine(), i).values()),
+        )
+
+    if incremental:
+        for name in warehouse_views.DERIVED:
+            del dag[name]
+        dag["load_sqlite"] = dag["load_sqlite"]._replace(
+            deps=tuple(warehouse_views.STAGING_TABLES),
+            run=lambda i: sum(load_to_sqlite.incremental_load_all(i).values()),
+        )
+        if postgres:
+            dag["load_postgres"] = dag["load_postgres"]._replace(
+                deps=tuple(warehouse_views.STAGING_TABLES),
+                run=lambda i: sum(load_to_postgres.incremental_load_all(pg_engine(), i).values()),
+            )
+    return dag
+
+
+def pg_engine():
+    from sqlalchemy import create_engine
+
+    pg_url = os.getenv("POSTGRES_URL")
+    if not pg_url:
+        raise RuntimeError("Missing POSTGRES_URL in .env")
+    return create_engine(pg_url)
+
+
+def files_fingerprint(files: list[Path]) -> str:
+    """Cheap fingerprint of a raw file set: names, sizes and mtimes."""
+    h = hashlib.sha256()
+    for fp in files:
+        st = fp.stat()
+        h.update(f"{fp.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def is_local(module: ModuleType) -> bool:
+    path = getattr(module, "__file__", None)
+    return path is not None and Path(path).resolve().parent == SRC_DIR
+
+
+def local_modules(module: ModuleType) -> list[ModuleType]:
+    """`module` plus every repo-local module it imports, directly or transitively, sorted by name.
+
+    Both `import x` and `from x import y` count: a global that is a module,
+    or whose `__module__` names one, pulls that module in.
+    """
+    found = {}
+    pending = [module]
+    while pending:
+        m = pending.pop()
+        if m.__name__ in found:
+            continue
+        found[m.__name__] = m
+        for value in vars(m).values():
+            dep = value if isinstance(value, ModuleType) else sys.modules.get(getattr(value, "__module__", None) or "")
+            if dep is not None and dep.__name__ not in found and is_local(dep):
+                pending.append(dep)
+    return [found[name] for name in sorted(found)]
+
+
+def stage_fingerprint(name: str, stage: Stage, upstream: dict[str, str], extra: str = "") -> str:
+    """Hash of the stage's code and the fingerprints of everything it reads.
+
+    The code is the stage module and every repo-local module it imports, so
+    editing a shared helper such as staging_io invalidates the stages using
+    it. Derived stages are deterministic, so equal fingerprints mean equal output.
+    """
+    h = hashlib.sha256(name.encode())
+    for module in local_modules(stage.module):
+        h.update(f"{module.__name__}\n".encode())
+        h.update(inspect.getsource(module).encode())
+    for dep in stage.deps:
+        h.update(f"{dep}={upstream[dep]}\n".encode())
+    h.update(extra.encode())
+    return h.hexdigest()
+
+
+def load_state() -> dict[str, str]:
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+def save_state(state: dict[str, str]) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_PATH.with_name(STATE_PATH.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp_path, STATE_PATH)
+
+
+def run(
+    full: bool = False,
+    reference_points: dict[str, tuple[float, float]] = restaurants.REFERENCE_POINTS,
+    postgres: bool = False,
+    workers: int = 4,
+    parse_workers: int = 1,
+    incremental: bool = False,
+) -> list[dict]:
+    """Run the DAG, passing frames between stages in memory.
+
+    A stage runs as soon as all of its upstream stages are done, so
+    independent branches (the hours and categories chains) overlap. A stage
+    whose fingerprint matches the last successful run, and whose output
+    exists, is skipped; its frame is read from staging only if a downstream
+    stage actually runs. Returns one report row per stage.
+    """
+    dag = stages(full, reference_points, postgres, parse_workers, incremental)
+    previous = {} if full else load_state()
+
+    fingerprints = {
+        SEARCH: files_fingerprint(search_files()),
+        DETAILS: files_fingerprint(detail_files()),
+        TAXONOMY: files_fingerprint([TAXONOMY_PATH]),
+    }
+    for name, stage in dag.items():
+        extra = repr(sorted(reference_points.items())) if stage.module is restaurants else ""
+        fingerprints[name] = stage_fingerprint(name, stage, fingerprints, extra)
+
+    state = dict(previous)
+    frames: dict[str, pd.DataFrame] = {}
+    report: dict[str, dict] = {}
+
+    def is_fresh(name: str) -> bool:
+        stage = dag[name]
+        if previous.get(name) != fingerprints[name]:
+            return False
+        if stage.output is not None:
+            return table_exists(stage.output)
+        return stage.exists is None or stage.exists()
+
+    def execute(name: str) -> dict:
+        stage = dag[name]
+        start = time.perf_counter()
+        with span(f"stage:{name}") as s:
+            inputs = {}
+            for dep in stage.deps:
+                if dep in dag:
+                    if dep not in frames:
+                        frames[dep] = read_table(dag[dep].output)
+                    inputs[dep] = frames[dep]
+            result = stage.run(inputs)
+            if isinstance(result, pd.DataFrame):
+                frames[name] = result
+                write_table(result, stage.output, partition_by=stage.partition_by)
+                rows = len(result)
+            else:
+                rows = result
+            s.set(rows_out=rows)
+        return {"stage": name, "status": "ran", "rows": rows, "seconds": time.perf_counter() - start}
+
+    pending = dict(dag)
+    done: set[str] = set()
+    with span("run_pipeline", workers=workers), ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(d in done or d not in dag for d in stage.deps):
+                        del pending[name]
+                        if is_fresh(name):
+                            report[name] = {"stage": name, "status": "skipped", "rows": None, "seconds": 0.0}
+                            done.add(name)
+                            continue
+                        running[pool.submit(execute, name)] = name
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    report[name] = future.result()
+                    state[name] = fingerprints[name]
+                    done.add(name)
+        finally:
+            for future in running:
+                future.cancel()
+            save_state(state)
+
+    return [report[name] for name in dag]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run every build stage and the warehouse load as one DAG.")
+    parser.add_argument("--full", action="store_true",
+                        help="run every stage and ignore the per-file manifests")
+    parser.add_argument("--ref", nargs=3, action="append", metavar=("NAME", "LAT", "LON"),
+                        help="extra reference point; adds a distance_to_NAME_miles column")
+    parser.add_argument("--postgres", action="store_true", help="also COPY-load Postgres (needs POSTGRES_URL)")
+    parser.add_argument("--workers", type=int, default=4, help="stages run concurrently")
+    parser.add_argument("--parse-workers", type=int, default=1,
+                        help="processes parsing detail files in staging_hours (1 = serial)")
+    parser.add_argument("--incremental-load", action="store_true",
+                        help="merge only the staging tables into the warehouse and derive the rest in SQL")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    report = run(
+        full=args.full,
+        reference_points=restaurants.parse_reference_points(args.ref),
+        postgres=args.postgres,
+        workers=args.workers,
+        parse_workers=args.parse_workers,
+        incremental=args.incremental_load,
+    )
+
+    print(f"\n{'stage':<32}{'status':<10}{'rows':>10}{'seconds':>10}")
+    for r in report:
+        rows = "" if r["rows"] is None else r["rows"]
+        print(f"{r['stage']:<32}{r['status']:<10}{rows:>10}{r['seconds']:>10.2f}")
+    print(f"\n✅ Pipeline complete ({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
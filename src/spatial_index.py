@@ -0,0 +1,200 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from build_staging_restaurants import haversine_miles
+from staging_io import read_table
+
+WAREHOUSE_DIR = Path("data/warehouse")
+RESTAURANTS = "staging_restaurants"
+LATE_NIGHT = "late_night_restaurants"
+CUISINE = "staging_cuisine_map"
+INDEX_PATH = WAREHOUSE_DIR / "spatial_index.npz"
+
+CELL_DEG = 0.01             # ~0.7 miles of latitude per grid bucket
+MILES_PER_DEG_LAT = 69.09
+N_COLS = int(round(360 / CELL_DEG))
+N_ROWS = int(round(180 / CELL_DEG)) + 1     # latitude 90 gets a row of its own
+MAX_MILES = np.pi * 3958.7613               # half the Earth's circumference: every point is within it
+
+
+class SpatialIndex:
+    """Grid-bucket index over restaurant coordinates.
+
+    Points are sorted by their grid cell key (row * N_COLS + col), so the
+    cells of one grid row form a contiguous key range: a radius query is one
+    `searchsorted` per grid row touched, then an exact haversine over just
+    those candidates.
+    """
+
+    def __init__(self, restaurant_key: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> None:
+        keys = self._keys(lat, lon)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.restaurant_key = restaurant_key[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+
+    @staticmethod
+    def _keys(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        rows = np.floor((lat + 90) / CELL_DEG).astype(np.int64)
+        # Longitude 180 is the same meridian as -180
+        cols = np.floor((lon + 180) / CELL_DEG).astype(np.int64) % N_COLS
+        return rows * N_COLS + cols
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SpatialIndex":
+        df = df.dropna(subset=["latitude", "longitude"])
+        return cls(
+            df["restaurant_key"].to_numpy(dtype=np.int32),
+            df["latitude"].to_numpy(dtype=float),
+            df["longitude"].to_numpy(dtype=float),
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def save(self, path: Path = INDEX_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, restaurant_key=self.restaurant_key, lat=self.lat, lon=self.lon, cell_deg=CELL_DEG)
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH) -> "SpatialIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if "restaurant_key" not in data.files:
+                raise ValueError(f"{path} predates restaurant_key; rebuild it")
+            if float(data["cell_deg"]) != CELL_DEG:
+                raise ValueError(f"{path} was built with a different CELL_DEG; rebuild it")
+            return cls(data["restaurant_key"], data["lat"], data["lon"])
+
+    def _candidates(self, lat: float, lon: float, miles: float) -> np.ndarray:
+        dlat = miles / MILES_PER_DEG_LAT
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+
+        row0 = max(int(np.floor((lat - dlat + 90) / CELL_DEG)), 0)
+        row1 = min(int(np.floor((lat + dlat + 90) / CELL_DEG)), N_ROWS - 1)
+        col0 = int(np.floor((lon - dlon + 180) / CELL_DEG))
+        col1 = int(np.floor((lon + dlon + 180) / CELL_DEG))
+
+        # Column ranges stay inside the grid, wrapping across the antimeridian;
+        # a window reaching over a pole takes every column
+        if col1 - col0 + 1 >= N_COLS or abs(lat) + dlat >= 90:
+            col_ranges = [(0, N_COLS - 1)]
+        elif col0 < 0:
+            col_ranges = [(col0 + N_COLS, N_COLS - 1), (0, col1)]
+        elif col1 >= N_COLS:
+            col_ranges = [(col0, N_COLS - 1), (0, col1 - N_COLS)]
+        else:
+            col_ranges = [(col0, col1)]
+
+        rows = np.arange(row0, row1 + 1, dtype=np.int64) * N_COLS
+        parts = [np.empty(0, dtype=np.int64)]
+        for c0, c1 in col_ranges:
+            starts = np.searchsorted(self.keys, rows + c0, side="left")
+            ends = np.searchsorted(self.keys, rows + c1, side="right")
+            parts.extend(np.arange(a, b) for a, b in zip(starts, ends))
+        return np.unique(np.concatenate(parts))
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        miles: float,
+        allowed: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        """Restaurants within `miles` of (lat, lon), nearest first.
+
+        `allowed` optionally restricts results to those restaurant_keys.
+        """
+        idx = self._candidates(lat, lon, miles)
+        if allowed is not None:
+            idx = idx[np.isin(self.restaurant_key[idx], allowed)]
+
+        dist = haversine_miles(lat, lon, self.lat[idx], self.lon[idx])
+        keep = dist <= miles
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return pd.DataFrame({"restaurant_key": self.restaurant_key[idx][order], "distance_miles": dist[order]})
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        allowed: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        """The k restaurants closest to (lat, lon); fewer if fewer pass `allowed`.
+
+        Grows a radius query until it holds k hits; everything within that
+        radius is exact, so its k closest are the true k nearest. Growing
+        stops once every allowed restaurant is a hit or the radius spans
+        the globe.
+        """
+        reachable = len(self) if allowed is None else int(np.isin(self.restaurant_key, allowed).sum())
+        miles = CELL_DEG * MILES_PER_DEG_LAT
+        while True:
+            hits = self.within_radius(lat, lon, miles, allowed)
+            if len(hits) >= min(k, reachable) or miles >= MAX_MILES:
+                return hits.head(k).reset_index(drop=True)
+            miles = min(miles * 2, MAX_MILES)
+
+
+def allowed_ids(late_night: bool = False, cuisine: str | None = None) -> np.ndarray | None:
+    """restaurant_keys passing the late-night / cuisine filters (None = no filter)."""
+    ids = None
+    if late_night:
+        ids = read_table(LATE_NIGHT, columns=["restaurant_key"])["restaurant_key"].to_numpy(dtype=np.int32)
+    if cuisine:
+        cmap = read_table(CUISINE, columns=["restaurant_key", "canonical_cuisine"])
+        cuisine_ids = cmap.loc[cmap["canonical_cuisine"].astype(str).str.lower() == cuisine.lower(), "restaurant_key"].to_numpy(dtype=np.int32)
+        ids = cuisine_ids if ids is None else np.intersect1d(ids, cuisine_ids)
+    return ids
+
+
+def build(path: Path = INDEX_PATH) -> SpatialIndex:
+    index = SpatialIndex.from_frame(read_table(RESTAURANTS, columns=["restaurant_key", "latitude", "longitude"]))
+    index.save(path)
+    return index
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or query the restaurant spatial index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help=f"build {INDEX_PATH} from {RESTAURANTS}")
+
+    q = sub.add_parser("query", help="k-nearest or within-radius query")
+    q.add_argument("--lat", type=float, required=True)
+    q.add_argument("--lon", type=float, required=True)
+    q.add_argument("--radius", type=float, help="miles; omit for a k-nearest query")
+    q.add_argument("--k", type=int, default=10)
+    q.add_argument("--late-night", action="store_true")
+    q.add_argument("--cuisine")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build()
+        print(f"Saved: {INDEX_PATH}")
+        print(f"Indexed restaurants: {len(index)}")
+        return
+
+    index = SpatialIndex.load() if INDEX_PATH.exists() else build()
+    allowed = allowed_ids(args.late_night, args.cuisine)
+
+    start = time.perf_counter()
+    if args.radius is not None:
+        hits = index.within_radius(args.lat, args.lon, args.radius, allowed).head(args.k)
+    else:
+        hits = index.nearest(args.lat, args.lon, args.k, allowed)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    restaurants = read_table(RESTAURANTS, columns=["restaurant_key", "name", "rating", "review_count"])
+    out = hits.merge(restaurants, on="restaurant_key", how="left")
+    print(f"Matches: {len(out)} ({elapsed_ms:.2f} ms)")
+    print(out[["name", "rating", "review_count", "distance_miles"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from metrics import path_bytes, span
+
+STAGING_DIR = Path("data/staging")
+
+# csv (default), parquet, or arrow (uncompressed Arrow IPC, memory-mapped on read)
+STAGING_FORMAT = os.getenv("STAGING_FORMAT", "csv")
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+# Explicit dtypes applied to the columnar formats; CSV output is unchanged.
+CATEGORICAL_COLUMNS = {"source", "hours_type", "category_title", "category_alias", "canonical_cuisine", "price", "city", "state"}
+INT8_COLUMNS = {"day", "is_overnight", "is_late_night_11pm"}
+INT16_COLUMNS = {"start_minute", "end_minute"}
+INT32_COLUMNS = {"restaurant_key"}
+TIME_COLUMNS = {"start_time", "end_time"}
+
+# pandas' default float parser can be off by one ulp; round_trip reads back exactly what to_csv wrote
+CSV_FLOAT_PRECISION = "round_trip"
+
+# Rows per frame yielded by iter_chunks
+CHUNK_ROWS = 50_000
+
+
+def staging_path(name: str, fmt: str | None = None) -> Path:
+    """Path of a staging table; falls back to another format if only that one exists."""
+    fmt = fmt or STAGING_FORMAT
+    path = STAGING_DIR / f"{name}{EXTENSIONS[fmt]}"
+    if path.exists():
+        return path
+    for ext in EXTENSIONS.values():
+        other = STAGING_DIR / f"{name}{ext}"
+        if other.exists():
+            return other
+    return path
+
+
+def table_exists(name: str) -> bool:
+    return staging_path(name).exists()
+
+
+def table_columns(name: str) -> list[str]:
+    """Column names of a staging table, read from its header or schema only."""
+    path = staging_path(name)
+    if path.suffix == ".csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+
+    import pyarrow as pa
+
+    if path.suffix == ".parquet":
+        import pyarrow.dataset as ds
+        return ds.dataset(path, format="parquet", partitioning="hive").schema.names
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def check_columns(name: str, columns: list[str]) -> None:
+    """Fail with a clear message if staging table `name` lacks any of `columns`.
+
+    Tables written before the current schema (e.g. without `restaurant_key`)
+    would otherwise fail deep inside pandas or the warehouse loaders.
+    """
+    missing = [c for c in columns if c not in table_columns(name)]
+    if missing:
+        raise ValueError(
+            f"{staging_path(name)} has no column(s) {missing}; it predates the current staging schema. "
+            "Run `python src/migrate_staging.py` or rebuild staging from raw data."
+        )
+
+
+def apply_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col in INT8_COLUMNS:
+            df[col] = df[col].astype("int8")
+        elif col in INT16_COLUMNS:
+            df[col] = df[col].astype("int16")
+        elif col in INT32_COLUMNS:
+            df[col] = df[col].astype("int32")
+        elif col in TIME_COLUMNS:
+            # "HH : MM" staging strings -> datetime.time
+            df[col] = pd.to_datetime(df[col].str.replace(" ", "", regex=False), format="%H:%M").dt.time
+    return df
+
+
+def blanks_to_na(df: pd.DataFrame) -> pd.DataFrame:
+    """Empty strings -> missing, as they read back from CSV staging.
+
+    Builders apply this so a frame passed to the next stage in memory holds
+    the same values as its staged copy, whatever the staging format.
+    """
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].mask(df[col] == "")
+    return df
+
+
+def stringify_times(df: pd.DataFrame) -> pd.DataFrame:
+    """Render time columns back as the "HH : MM" strings the CSV staging layer uses."""
+    for col in TIME_COLUMNS & set(df.columns):
+        if len(df) and not isinstance(df[col].iloc[0], str):
+            df[col] = [t.strftime("%H : %M") for t in df[col]]
+    return df
+
+
+def write_table(df: pd.DataFrame, name: str, fmt: str | None = None, partition_by: str | None = None) -> Path:
+    """Write a staging table.
+
+    With `partition_by`, Parquet output is a hive-partitioned dataset
+    directory (one sub-directory per value); CSV and Arrow output is sorted
+    by that column so each partition is one contiguous run of rows.
+    """
+    fmt = fmt or STAGING_FORMAT
+    with span(f"write_table:{name}", format=fmt) as s:
+        path = _write_table(df, name, fmt, partition_by)
+        s.set(rows_out=len(df), bytes_written=path_bytes(path))
+    return path
+
+
+def _write_table(df: pd.DataFrame, name: str, fmt: str, partition_by: str | None) -> Path:
+    """Write the table in `fmt`, then delete its files in any other format.
+
+    staging_path falls back to another format's file, so a copy left behind
+    by an earlier STAGING_FORMAT would be read as current after switching
+    back; for restaurant_keys that would hand out keys already in use.
+    """
+    path = _write_format(df, name, fmt, partition_by)
+    for other_fmt, ext in EXTENSIONS.items():
+        other = STAGING_DIR / f"{name}{ext}"
+        if other_fmt == fmt:
+            continue
+        if other.is_dir():
+            shutil.rmtree(other)
+        elif other.exists():
+            other.unlink()
+    return path
+
+
+def _write_format(df: pd.DataFrame, name: str, fmt: str, partition_by: str | None) -> Path:
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    path = STAGING_DIR / f"{name}{EXTENSIONS[fmt]}"
+    if partition_by is not None:
+        df = df.sort_values(partition_by, kind="stable")
+
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = pa.Table.from_pandas(apply_dtypes(df), preserve_index=False)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        if partition_by is None:
+            pq.write_table(table, path)
+            return path
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        pq.write_to_dataset(table, tmp_path, partition_cols=[partition_by])
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+        os.replace(tmp_path, path)
+    else:
+        feather.write_feather(table, path, compression="uncompressed")
+    return path
+
+
+def read_table(
+    name: str,
+    columns: list[str] | None = None,
+    filters: dict | None = None,
+    dtypes: dict[str, str] | None = None,
+) -> pd.DataFrame:
+    """Read a staging table, projecting only `columns` when given.
+
+    `filters` maps column -> value for equality filters; a partitioned
+    Parquet dataset then reads only the matching partitions. `dtypes`
+    (column -> pandas dtype) replaces type inference for CSV; the columnar
+    formats are already typed.
+    """
+    path = staging_path(name)
+    if columns is not None:
+        check_columns(name, [*columns, *(filters or {})])
+    with span(f"read_table:{name}", format=path.suffix[1:]) as s:
+        df = _read_table(path, columns, filters, dtypes)
+        # Projected or filtered columnar reads touch only part of the file
+        full_read = path.suffix == ".csv" or (columns is None and not filters)
+        s.set(rows_out=len(df), bytes_read=path_bytes(path) if full_read else None)
+    return df
+
+
+def _read_table(
+    path: Path,
+    columns: list[str] | None,
+    filters: dict | None,
+    dtypes: dict[str, str] | None = None,
+) -> pd.DataFrame:
+    # CSV and Arrow filter after reading, so they also need the filter columns
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, *(filters or {})]))
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, usecols=read_columns, dtype=dtypes, float_precision=CSV_FLOAT_PRECISION)
+        return _filter(df, filters, columns)
+
+    import pyarrow as pa
+
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        pq_filters = [(col, "=", value) for col, value in filters.items()] if filters else None
+        table = pq.read_table(path, columns=columns, filters=pq_filters, memory_map=True)
+        return table.to_pandas()
+
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if read_columns is not None:
+        table = table.select(read_columns)
+    return _filter(table.to_pandas(), filters, columns)
+
+
+def _filter(df: pd.DataFrame, filters: dict | None, columns: list[str] | None) -> pd.DataFrame:
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for col, value in filters.items():
+            mask &= df[col] == value
+        df = df[mask].reset_index(drop=True)
+    return df if columns is None else df[columns]
+
+
+def iter_chunks(name: str, chunk_rows: int = CHUNK_ROWS, dtypes: dict[str, str] | None = None) -> Iterator[pd.DataFrame]:
+    """Stream a staging table as frames of at most `chunk_rows` rows, in file order.
+
+    CSV is parsed one chunk at a time with `dtypes` (column -> pandas
+    dtype), so every chunk gets the same types whatever values it holds.
+    Parquet (file or partitioned dataset) and Arrow yield their record
+    batches, re-sliced to `chunk_rows`; only one batch is in memory at a time.
+    """
+    path = staging_path(name)
+    if path.suffix == ".csv":
+        header = pd.read_csv(path, nrows=0).columns
+        dtypes = {col: dtype for col, dtype in (dtypes or {}).items() if col in header}
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=dtypes, float_precision=CSV_FLOAT_PRECISION)
+        return
+
+    import pyarrow as pa
+
+    if path.suffix == ".parquet":
+        import pyarrow.dataset as ds
+        batches = ds.dataset(path, format="parquet", partitioning="hive").to_batches(batch_size=chunk_rows)
+        for batch in batches:
+            yield batch.to_pandas()
+        return
+
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas()
@@ -0,0 +1,61 @@
+# Row-level merge shared by the SQLite and Postgres loaders' merge mode.
+# Every merged table carries a `row_hash` of its other columns; a load upserts
+# only rows whose hash differs from the warehouse copy (ON CONFLICT on the
+# table's primary key) and deletes only keys that left staging, so the rows
+# written scale with what changed rather than with the table. Like
+# warehouse_views, the SQL is plain text both dialects accept.
+
+import pandas as pd
+
+from warehouse_schema import PANDAS_TYPES, PRIMARY_KEYS, column_type, declared_order
+
+ROW_HASH = "row_hash"
+
+
+def quote(ident: str) -> str:
+    return '"' + ident.replace('"', '""') + '"'
+
+
+def with_row_hash(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """`df` in declared column order plus a signed 64-bit hash of each row's values.
+
+    Values are cast to the declared column types before hashing, so the hash
+    (stable across runs and processes) does not depend on the staging
+    format: an int8 `day` from Parquet hashes like the Int64 one from CSV,
+    and a partitioned dataset's trailing partition column is moved back.
+    """
+    df = df[declared_order(table_name, list(df.columns))].copy()
+    typed = pd.DataFrame({c: df[c].astype(PANDAS_TYPES[column_type(table_name, c)]) for c in df.columns})
+    df[ROW_HASH] = pd.util.hash_pandas_object(typed, index=False).astype("int64")
+    return df
+
+
+def merge_rows(cur, table_name: str, load_table: str, columns: list[str]) -> tuple[int, int]:
+    """Upsert changed rows of `load_table` into `table_name`, delete vanished keys, drop `load_table`.
+
+    `columns` must include ROW_HASH, and `table_name` must have a primary
+    key (or unique index) on PRIMARY_KEYS[table_name]. Returns (rows
+    upserted, rows deleted).
+    """
+    pk = PRIMARY_KEYS[table_name]
+    new, old = quote(load_table), quote(table_name)
+    cols = ", ".join(quote(c) for c in columns)
+    pk_cols = ", ".join(quote(c) for c in pk)
+    same_key = " AND ".join(f"o.{quote(c)} = n.{quote(c)}" for c in pk)
+    updates = ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in columns if c not in pk)
+
+    # Probed once per live row by the delete below
+    cur.execute(f"CREATE UNIQUE INDEX {quote(load_table + '_key')} ON {new} ({pk_cols})")
+
+    cur.execute(
+        f"INSERT INTO {old} AS o ({cols}) SELECT {cols} FROM {new} n "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {old} o WHERE {same_key} AND o.{ROW_HASH} = n.{ROW_HASH}) "
+        f"ON CONFLICT ({pk_cols}) DO UPDATE SET {updates}"
+    )
+    upserted = cur.rowcount
+
+    cur.execute(f"DELETE FROM {old} AS o WHERE NOT EXISTS (SELECT 1 FROM {new} n WHERE {same_key})")
+    deleted = cur.rowcount
+
+    cur.execute(f"DROP TABLE {new}")
+    return upserted, deleted
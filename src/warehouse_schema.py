@@ -0,0 +1,143 @@
+# Declared warehouse schema shared by the SQLite and Postgres loaders.
+# Column types use portable names (text, integer, bigint, smallint, real,
+# double, boolean); each loader maps them to its own dialect.
+
+RESTAURANT_COLUMNS = {
+    "restaurant_key": "integer",
+    "source": "text",
+    "source_id": "text",
+    "name": "text",
+    "rating": "real",
+    "review_count": "integer",
+    "price": "text",
+    "is_closed": "boolean",
+    "phone": "text",
+    "display_phone": "text",
+    "url": "text",
+    "latitude": "double",
+    "longitude": "double",
+    "distance_to_ucf_miles": "double",
+    "address1": "text",
+    "address2": "text",
+    "address3": "text",
+    "city": "text",
+    "state": "text",
+    "zip_code": "text",
+    "full_address": "text",
+}
+
+TABLE_COLUMNS = {
+    "staging_restaurants": RESTAURANT_COLUMNS,
+    "staging_categories": {
+        "source": "text",
+        "restaurant_key": "integer",
+        "category_title": "text",
+        "category_alias": "text",
+    },
+    "staging_cuisine_map": {
+        "source": "text",
+        "restaurant_key": "integer",
+        "category_title": "text",
+        "category_alias": "text",
+        "canonical_cuisine": "text",
+    },
+    "staging_hours": {
+        "source": "text",
+        "restaurant_key": "integer",
+        "hours_type": "text",
+        "day": "smallint",
+        "start_time": "text",
+        "end_time": "text",
+        "start_minute": "smallint",
+        "end_minute": "smallint",
+        "is_overnight": "smallint",
+        "is_late_night_11pm": "smallint",
+    },
+    "indian_restaurants": RESTAURANT_COLUMNS,
+    "late_night_restaurants": RESTAURANT_COLUMNS,
+    "late_night_indian_restaurants": RESTAURANT_COLUMNS,
+    "cuisine_restaurants": {
+        "canonical_cuisine": "text",
+        **RESTAURANT_COLUMNS,
+        "is_late_night_11pm": "smallint",
+    },
+}
+
+PRIMARY_KEYS = {
+    "staging_restaurants": ("restaurant_key",),
+    "staging_categories": ("restaurant_key", "category_alias"),
+    "staging_cuisine_map": ("restaurant_key", "canonical_cuisine"),
+    "staging_hours": ("restaurant_key", "hours_type", "day", "start_time", "end_time"),
+    "indian_restaurants": ("restaurant_key",),
+    "late_night_restaurants": ("restaurant_key",),
+    "late_night_indian_restaurants": ("restaurant_key",),
+    "cuisine_restaurants": ("canonical_cuisine", "restaurant_key"),
+}
+
+# Secondary indexes, built after the data is loaded. Lookups by restaurant_key
+# and (restaurant_key, hours_type, day) are served by the primary keys above,
+# which lead with them; the Yelp source_id is indexed on the restaurants dimension.
+# The ranking index carries `name` last so the README top-N query is covered;
+# cuisine_restaurants leads it with (cuisine, late-night) for any cuisine x late-night query.
+RANKING_INDEX = ("rating DESC", "review_count DESC", "distance_to_ucf_miles", "name")
+
+INDEXES = {
+    "staging_restaurants": [("source_id",), ("distance_to_ucf_miles",)],
+    "staging_categories": [("category_alias",)],
+    "staging_cuisine_map": [("canonical_cuisine",)],
+    "staging_hours": [("is_late_night_11pm", "restaurant_key")],
+    "indian_restaurants": [RANKING_INDEX],
+    "late_night_restaurants": [RANKING_INDEX],
+    "late_night_indian_restaurants": [RANKING_INDEX],
+    "cuisine_restaurants": [("canonical_cuisine", "is_late_night_11pm", *RANKING_INDEX)],
+}
+
+
+# Pandas dtypes for reading declared columns from CSV; nullable, so a chunk
+# with a missing value keeps the same type as one without
+PANDAS_TYPES = {
+    "text": "string",
+    "integer": "Int64",
+    "bigint": "Int64",
+    "smallint": "Int64",
+    "real": "float64",
+    "double": "float64",
+    "boolean": "boolean",
+}
+
+
+def column_type(table: str, column: str) -> str:
+    """Declared type of a column; undeclared extra distance columns are doubles, anything else text."""
+    declared = TABLE_COLUMNS.get(table, {})
+    if column in declared:
+        return declared[column]
+    if column == "row_hash":
+        return "bigint"     # see warehouse_merge
+    if column.startswith("distance_to_") and column.endswith("_miles"):
+        return "double"
+    return "text"
+
+
+def declared_order(table: str, columns: list[str]) -> list[str]:
+    """`columns` with the table's declared ones first, in declared order, then any others as given."""
+    declared = [c for c in TABLE_COLUMNS.get(table, {}) if c in columns]
+    return declared + [c for c in columns if c not in declared]
+
+
+def check_key_columns(table: str, columns: list[str]) -> None:
+    """Fail with a clear message if a table being loaded lacks any of its primary key columns."""
+    missing = [c for c in PRIMARY_KEYS.get(table, ()) if c not in columns]
+    if missing:
+        raise ValueError(
+            f"{table} has no column(s) {missing}; its staging table predates the current schema. "
+            "Run `python src/migrate_staging.py` or rebuild staging from raw data."
+        )
+
+
+def index_name(table: str, i: int) -> str:
+    return f"{table}_idx{i}"
+
+
+def pandas_dtypes(table: str) -> dict[str, str]:
+    """Declared columns of a table as pandas dtypes, for chunked CSV reads."""
+    return {column: PANDAS_TYPES[kind] for column, kind in TABLE_COLUMNS.get(table, {}).items()}
@@ -0,0 +1,180 @@
+# Derived warehouse tables defined in SQL over the normalized staging tables,
+# shared by the SQLite and Postgres loaders' incremental mode. Each derived
+# row depends only on staging rows with the same restaurant_key, so a merge
+# that changes a few restaurants refreshes just their rows. The SQL sticks to
+# what both dialects accept and takes no bind parameters (the two drivers use
+# different paramstyles).
+
+import hashlib
+from typing import Callable, NamedTuple
+
+import build_cuisine_restaurants as cuisine_restaurants
+import build_indian_restaurants as indian
+import build_late_night_restaurants as late_night
+
+# Loaded from staging; everything else is derived from these
+STAGING_TABLES = [
+    "staging_restaurants",
+    "staging_categories",
+    "staging_cuisine_map",
+    "staging_hours",
+]
+
+# Session temp tables: keys changed by the whole merge, and by the table being merged
+CHANGED_KEYS = "changed_keys"
+TABLE_KEYS = "table_keys"
+
+# name -> sha256 of the SQL each derived table was last fully built with
+DEFINITIONS = "warehouse_derived"
+DEFINITIONS_DDL = f"CREATE TABLE IF NOT EXISTS {DEFINITIONS} (name text PRIMARY KEY, definition text NOT NULL)"
+
+
+class DerivedTable(NamedTuple):
+    columns: list[str]
+    alias: str          # alias whose restaurant_key `{keys}` filters on
+    sql: str            # SELECT of `columns`; `{keys}` is a predicate on the keys to build
+
+
+def quote(ident: str) -> str:
+    return '"' + ident.replace('"', '""') + '"'
+
+
+def select_list(alias: str, columns: list[str]) -> str:
+    return ", ".join(f"{alias}.{quote(c)}" for c in columns)
+
+
+# In dependency order; mirrors the pandas builders of the same name
+DERIVED = {
+    "indian_restaurants": DerivedTable(
+        indian.COLUMNS, "r",
+        f"SELECT {select_list('r', indian.COLUMNS)} FROM staging_restaurants r "
+        "WHERE r.restaurant_key IN ("
+        "SELECT restaurant_key FROM staging_cuisine_map WHERE canonical_cuisine = 'Indian'"
+        ") AND {keys}",
+    ),
+    "late_night_restaurants": DerivedTable(
+        late_night.COLUMNS, "r",
+        f"SELECT {select_list('r', late_night.COLUMNS)} FROM staging_restaurants r "
+        "WHERE r.restaurant_key IN ("
+        "SELECT restaurant_key FROM staging_hours WHERE is_late_night_11pm = 1"
+        ") AND {keys}",
+    ),
+    "late_night_indian_restaurants": DerivedTable(
+        late_night.COLUMNS, "l",
+        f"SELECT {select_list('l', late_night.COLUMNS)} FROM late_night_restaurants l "
+        "WHERE l.restaurant_key IN (SELECT restaurant_key FROM indian_restaurants) AND {keys}",
+    ),
+    "cuisine_restaurants": DerivedTable(
+        ["canonical_cuisine", *cuisine_restaurants.COLUMNS, "is_late_night_11pm"], "c",
+        f"SELECT c.canonical_cuisine, {select_list('r', cuisine_restaurants.COLUMNS)}, "
+        "COALESCE(("
+        "SELECT MAX(h.is_late_night_11pm) FROM staging_hours h WHERE h.restaurant_key = c.restaurant_key"
+        "), 0) AS is_late_night_11pm "
+        "FROM staging_cuisine_map c JOIN staging_restaurants r ON r.restaurant_key = c.restaurant_key "
+        "WHERE {keys}",
+    ),
+}
+
+
+def derived_select(name: str, changed_only: bool = False) -> str:
+    """The SELECT for a derived table, over every key or only the merge's changed keys."""
+    table = DERIVED[name]
+    keys = (
+        f"{table.alias}.restaurant_key IN (SELECT restaurant_key FROM {CHANGED_KEYS})"
+        if changed_only else "1 = 1"
+    )
+    return table.sql.format(keys=keys)
+
+
+def definition_hash(name: str) -> str:
+    return hashlib.sha256(derived_select(name).encode()).hexdigest()
+
+
+def start_merge(cur) -> None:
+    """Create the (empty) set of changed keys for this merge."""
+    cur.execute(f"DROP TABLE IF EXISTS {CHANGED_KEYS}")
+    cur.execute(f"CREATE TEMP TABLE {CHANGED_KEYS} (restaurant_key integer PRIMARY KEY)")
+    cur.execute(DEFINITIONS_DDL)
+
+
+def forget_definition(cur, name: str) -> None:
+    """Drop the stored SQL hash of a derived table written outside incremental mode.
+
+    Call it in the transaction that replaces the table, so the next
+    incremental load rebuilds it whole instead of trusting its rows.
+    """
+    if name in DERIVED:
+        cur.execute(DEFINITIONS_DDL)
+        cur.execute(f"DELETE FROM {DEFINITIONS} WHERE name = '{name}'")
+
+
+def merge_staging(cur, table_name: str, load_table: str, columns: list[str], existing: list[str] | None) -> int | None:
+    """Apply a freshly loaded `load_table` to `table_name` for the keys whose rows differ.
+
+    The keys come from an EXCEPT diff in both directions, so added, changed
+    and removed rows all count. Only those keys' rows are deleted and
+    re-inserted, and they are added to CHANGED_KEYS; `load_table` is dropped.
+    Returns the number of changed keys, or None when `table_name` is missing
+    or has other columns, in which case the caller swaps `load_table` in whole.
+    """
+    if existing != columns:
+        return None
+
+    cols = ", ".join(quote(c) for c in columns)
+    new, old = quote(load_table), quote(table_name)
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE_KEYS}")
+    cur.execute(
+        f"CREATE TEMP TABLE {TABLE_KEYS} AS "
+        f"SELECT restaurant_key FROM (SELECT {cols} FROM {new} EXCEPT SELECT {cols} FROM {old}) AS added "
+        f"UNION "
+        f"SELECT restaurant_key FROM (SELECT {cols} FROM {old} EXCEPT SELECT {cols} FROM {new}) AS removed"
+    )
+    cur.execute(f"SELECT count(*) FROM {TABLE_KEYS}")
+    changed = cur.fetchone()[0]
+
+    if changed:
+        in_keys = f"restaurant_key IN (SELECT restaurant_key FROM {TABLE_KEYS})"
+        cur.execute(f"DELETE FROM {old} WHERE {in_keys}")
+        cur.execute(f"INSERT INTO {old} ({cols}) SELECT {cols} FROM {new} WHERE {in_keys}")
+        cur.execute(
+            f"INSERT INTO {CHANGED_KEYS} SELECT restaurant_key FROM {TABLE_KEYS} "
+            f"WHERE restaurant_key NOT IN (SELECT restaurant_key FROM {CHANGED_KEYS})"
+        )
+    cur.execute(f"DROP TABLE {TABLE_KEYS}")
+    cur.execute(f"DROP TABLE {new}")
+    return changed
+
+
+def refresh_derived(
+    cur,
+    name: str,
+    col_defs: Callable[[str, list[str]], str],
+    create_indexes: Callable[[object, str], None],
+    existing: list[str] | None,
+    full: bool = False,
+) -> int:
+    """Bring a derived table up to date with the merge; returns the rows written.
+
+    Rebuilds it whole when `full`, when it is missing, or when its columns
+    or SQL changed since it was built; otherwise only CHANGED_KEYS' rows are
+    deleted and re-selected.
+    """
+    table = DERIVED[name]
+    cols = ", ".join(quote(c) for c in table.columns)
+    definition = definition_hash(name)
+    cur.execute(f"SELECT definition FROM {DEFINITIONS} WHERE name = '{name}'")
+    row = cur.fetchone()
+
+    if full or existing != table.columns or row is None or row[0] != definition:
+        cur.execute(f"DROP TABLE IF EXISTS {quote(name)}")
+        cur.execute(f"CREATE TABLE {quote(name)} ({col_defs(name, table.columns)})")
+        cur.execute(f"INSERT INTO {quote(name)} ({cols}) {derived_select(name)}")
+        rows = cur.rowcount
+        create_indexes(cur, name)
+        cur.execute(f"DELETE FROM {DEFINITIONS} WHERE name = '{name}'")
+        cur.execute(f"INSERT INTO {DEFINITIONS} (name, definition) VALUES ('{name}', '{definition}')")
+        return rows
+
+    cur.execute(f"DELETE FROM {quote(name)} WHERE restaurant_key IN (SELECT restaurant_key FROM {CHANGED_KEYS})")
+    cur.execute(f"INSERT INTO {quote(name)} ({cols}) {derived_select(name, changed_only=True)}")
+    return cur.rowcount
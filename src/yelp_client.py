@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import http
+
+DEFAULT_BASE_URL = "https://api.yelp.com"
+
+
+class RateLimitError(RuntimeError):
+    """Raised when Yelp answers 429 (Too Many Requests)."""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker hitting the API.
+
+    On a 429 the refill rate is halved (down to `min_rate`) and all callers
+    are paused until the Retry-After deadline; each success nudges the rate
+    back up by `recovery` tokens/sec until it reaches `max_rate` again.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float | None = None,
+        min_rate: float = 0.5,
+        recovery: float = 0.05,
+    ) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.recovery = recovery
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def on_rate_limited(self, retry_after: float | None, attempt: int = 0) -> float:
+        """Slow down after a 429. Returns the pause applied to all callers."""
+        pause = retry_after if retry_after is not None else float(2 ** attempt)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Requests already in flight when the first 429 lands report it too;
+            # only the first one of a burst should cut the rate.
+            if now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + pause)
+        return pause
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
+    """Keep-alive session whose connection pool fits `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def conditional_get_json(
+    session: requests.Session,
+    url: str,
+    api_key: str,
+    limiter: TokenBucket,
+    params: dict | None = None,
+    etag: str | None = None,
+    max_retries: int = 5,
+) -> tuple[dict | None, str | None]:
+    """GET a Yelp endpoint under `limiter`, retrying 429s per Retry-After.
+
+    With an `etag`, sends If-None-Match; a 304 returns (None, etag) so the
+    caller keeps its cached copy. Otherwise returns (body, response ETag).
+    """
+    headers = {"Authorization": f"Bearer {api_key}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    attempt = 0
+    while True:
+        http.waited(limiter.acquire())
+        start = time.perf_counter()
+        resp = session.get(url, headers=headers, params=params, timeout=30)
+        http.observe(time.perf_counter() - start, resp.status_code)
+
+        if resp.status_code == 429:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            if attempt >= max_retries:
+                raise RateLimitError(
+                    f"429 rate limit from Yelp after {attempt} retries: {url}",
+                    retry_after=retry_after,
+                )
+            limiter.on_rate_limited(retry_after, attempt)
+            http.retried()
+            attempt += 1
+            continue
+
+        if resp.status_code == 304:
+            limiter.on_success()
+            return None, resp.headers.get("ETag", etag)
+
+        resp.raise_for_status()
+        limiter.on_success()
+        return resp.json(), resp.headers.get("ETag")
+
+
+def get_json(
+    session: requests.Session,
+    url: str,
+    api_key: str,
+    limiter: TokenBucket,
+    params: dict | None = None,
+    max_retries: int = 5,
+) -> dict:
+    """GET a Yelp endpoint under `limiter`, retrying 429s per Retry-After."""
+    data, _ = conditional_get_json(session, url, api_key, limiter, params=params, max_retries=max_retries)
+    return data
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import benchmark  # noqa: E402
+import build_staging_hours as hours  # noqa: E402
+import build_staging_restaurants as restaurants  # noqa: E402
+from manifest import MANIFEST_DIR  # noqa: E402
+from staging_io import staging_path  # noqa: E402
+
+REPO = Path(__file__).resolve().parents[1]
+
+
+def build_bytes(workers: int) -> dict[str, bytes]:
+    """The staging_hours table and manifest files written by a full build with `workers`."""
+    hours.save(*hours.build(full=True, workers=workers))
+    outputs = [staging_path(hours.OUT), *sorted(p for p in MANIFEST_DIR.rglob("*") if p.is_file() and "staging_hours" in str(p))]
+    return {str(p): p.read_bytes() for p in outputs}
+
+
+def test_parallel_parse_is_byte_identical_to_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO)
+    benchmark.generate(tmp_path, businesses=120, seed=7)
+    monkeypatch.chdir(tmp_path)
+    restaurants.save(restaurants.build(full=True))
+
+    serial = build_bytes(workers=1)
+    parallel = build_bytes(workers=4)
+
+    assert len(serial) >= 2
+    assert parallel == serial
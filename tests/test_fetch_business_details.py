@@ -0,0 +1,106 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import fetch_business_details as fetcher  # noqa: E402
+from http_cache import ResponseCache  # noqa: E402
+from yelp_client import TokenBucket, get_json, make_session  # noqa: E402
+
+
+class StubYelp(BaseHTTPRequestHandler):
+    """Answers /v3/businesses/{id} with {"id": id}, after `rate_limited` 429s."""
+
+    rate_limited = 0
+    retry_after = "1"
+    requests: list[tuple[float, str]] = []
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        cls.requests.append((time.monotonic(), self.path))
+        if cls.rate_limited > 0:
+            cls.rate_limited -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", cls.retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"id": self.path.rsplit("/", 1)[-1]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def stub():
+    handler = type("Handler", (StubYelp,), {"requests": [], "rate_limited": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    handler.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_with_retry_after_pauses_and_slows_the_rate(stub):
+    stub.rate_limited = 1
+    limiter = TokenBucket(rate=20.0)
+    with make_session() as session:
+        data = get_json(session, f"{stub.base_url}/v3/businesses/abc", "key", limiter)
+
+    assert data == {"id": "abc"}
+    (first, _), (retry, _) = stub.requests
+    assert retry - first >= 0.9
+    assert limiter.rate < 20.0 / 2 + 1
+
+
+def test_fetch_skips_ids_already_cached(stub, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fetcher.OUT_DIR.mkdir(parents=True)
+    cache = ResponseCache(tmp_path / "cache.json")
+    cache.write(fetcher.OUT_DIR / "cached.json", {"id": "cached"})
+    cache.record(fetcher.OUT_DIR / "cached.json", None)
+
+    pending = fetcher.due_ids(cache, ["cached", "new1", "new2"], ttl_days=30)
+    saved, not_modified = fetcher.fetch_concurrent(
+        "key", pending, 2, TokenBucket(rate=50.0),
+        details_url=stub.base_url + fetcher.DETAILS_PATH, cache=cache,
+    )
+
+    assert pending == ["new1", "new2"]
+    assert (saved, not_modified) == (2, 0)
+    assert sorted(path for _, path in stub.requests) == ["/v3/businesses/new1", "/v3/businesses/new2"]
+    assert json.loads((fetcher.OUT_DIR / "new1.json").read_text()) == {"id": "new1"}
+    assert not list(fetcher.OUT_DIR.glob("*.tmp"))
+
+
+def test_cache_write_is_atomic(tmp_path, monkeypatch):
+    out = tmp_path / "biz.json"
+    cache = ResponseCache(tmp_path / "cache.json")
+    cache.write(out, {"id": "biz", "v": 1})
+
+    # A write that dies part-way must leave the previous file whole
+    real_write_text = Path.write_text
+
+    def crash_midway(self, text, *args, **kwargs):
+        real_write_text(self, text[: len(text) // 2], *args, **kwargs)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Path, "write_text", crash_midway)
+    with pytest.raises(OSError):
+        cache.write(out, {"id": "biz", "v": 2})
+    monkeypatch.undo()
+
+    assert json.loads(out.read_text()) == {"id": "biz", "v": 1}
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+REPO = Path(__file__).resolve().parents[1]
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="set POSTGRES_URL to run the Postgres loader tests")
+
+if POSTGRES_URL:
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
+
+    import load_to_postgres as loader
+    from warehouse_schema import INDEXES, PRIMARY_KEYS, column_type, index_name
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """An engine on a scratch database, loading the checked-in data/staging tables."""
+    monkeypatch.chdir(REPO)
+    name = f"test_load_to_postgres_{os.getpid()}"
+    admin = create_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+        conn.exec_driver_sql(f'CREATE DATABASE "{name}"')
+    engine = create_engine(make_url(POSTGRES_URL).set(database=name))
+    yield engine
+    engine.dispose()
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE "{name}"')
+    admin.dispose()
+
+
+def query(engine, sql: str, *params) -> list[tuple]:
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        raw_conn.close()
+
+
+def test_copy_load_declares_types_keys_and_indexes(engine):
+    loaded = loader.copy_load_all(engine)
+    assert set(loaded) == set(loader.TABLES)
+
+    for table_name in loader.TABLES:
+        columns = query(
+            engine,
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_name = %s ORDER BY ordinal_position",
+            table_name,
+        )
+        assert columns == [(c, loader.PG_TYPES[column_type(table_name, c)]) for c, _ in columns]
+
+        pk = query(
+            engine,
+            "SELECT a.attname FROM pg_constraint c "
+            "JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, n) ON true "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum "
+            "WHERE c.conname = %s AND c.contype = 'p' ORDER BY k.n",
+            f"{table_name}_pkey",
+        )
+        assert tuple(col for col, in pk) == PRIMARY_KEYS[table_name]
+
+        indexes = query(engine, "SELECT indexname FROM pg_indexes WHERE tablename = %s", table_name)
+        expected = {f"{table_name}_pkey", *(index_name(table_name, i) for i in range(len(INDEXES[table_name])))}
+        assert {name for name, in indexes} == expected
+
+    assert query(engine, "SELECT tablename FROM pg_tables WHERE tablename LIKE '%%\\_\\_load'") == []
+
+
+def test_copy_load_swaps_atomically(engine):
+    loader.copy_load_all(engine)
+    table_name = "staging_restaurants"
+    df = loader.read_table(table_name, dtypes=loader.pandas_dtypes(table_name))
+    (old_rows,), = query(engine, f"SELECT count(*) FROM {table_name}")
+
+    # A reader mid-transaction holds the old table, so the final swap waits for it.
+    # Meanwhile the shadow table is loaded and indexed, and the reader still sees every old row.
+    reader = engine.raw_connection()
+    cur = reader.cursor()
+    cur.execute(f"SELECT count(*) FROM {table_name}")
+    load = threading.Thread(target=loader.copy_load_all, args=(engine, {table_name: df.head(10)}))
+    load.start()
+    deadline = time.monotonic() + 30
+    waiting = "SELECT 1 FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+    while not query(engine, waiting):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    shadow_indexes = query(engine, "SELECT indexname FROM pg_indexes WHERE tablename = %s", f"{table_name}__load")
+    assert len(shadow_indexes) == 1 + len(INDEXES[table_name])
+    cur.execute(f"SELECT count(*) FROM {table_name}")
+    assert cur.fetchall() == [(old_rows,)]
+    reader.rollback()
+    reader.close()
+    load.join(timeout=30)
+    assert not load.is_alive()
+
+    assert query(engine, f"SELECT count(*) FROM {table_name}") == [(10,)]
+
+    # A load that fails (duplicate keys break the primary key) leaves the table as it was
+    with pytest.raises(Exception):
+        loader.copy_load_all(engine, {table_name: pd.concat([df.head(5), df.head(5)])})
+    assert query(engine, f"SELECT count(*) FROM {table_name}") == [(10,)]
+    indexes = query(engine, "SELECT indexname FROM pg_indexes WHERE tablename = %s", table_name)
+    assert f"{table_name}_pkey" in {name for name, in indexes}
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from open_hours_index import DAY_MINUTES  # noqa: E402
+from query_server import query_args  # noqa: E402
+
+
+def test_query_args_parses_open_at():
+    assert query_args({"open_at": ["tue 23:59"]})["open_at"] == DAY_MINUTES + 23 * 60 + 59
+
+
+@pytest.mark.parametrize("when", ["mon 25:99", "sun -5:00", "fri 24:00", "sat 12:60", "xyz 10:00"])
+def test_query_args_rejects_out_of_range_times(when):
+    with pytest.raises(ValueError):
+        query_args({"open_at": [when]})
+    with pytest.raises(ValueError):
+        query_args({"open_between": [f"{when} 23:00"]})
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from build_staging_restaurants import haversine_miles  # noqa: E402
+from spatial_index import SpatialIndex  # noqa: E402
+
+
+def random_index(n: int = 200, seed: int = 0) -> SpatialIndex:
+    rng = np.random.default_rng(seed)
+    return SpatialIndex(
+        np.arange(1, n + 1, dtype=np.int32),
+        rng.uniform(-80, 80, n),
+        rng.uniform(-180, 180, n),
+    )
+
+
+def test_nearest_returns_each_allowed_key_once_when_k_exceeds_them():
+    index = random_index()
+    hits = index.nearest(28.6, -81.2, 10, allowed=np.array([1, 2, 3]))
+    assert sorted(hits["restaurant_key"]) == [1, 2, 3]
+
+
+def test_nearest_without_filter_has_no_duplicates():
+    index = random_index()
+    hits = index.nearest(28.6, -81.2, 500)
+    assert len(hits) == 200
+    assert hits["restaurant_key"].is_unique
+    assert hits["distance_miles"].is_monotonic_increasing
+
+
+def test_within_radius_matches_brute_force_across_the_antimeridian():
+    index = random_index(2000, seed=1)
+    lat, lon, miles = 10.0, 179.5, 900.0
+    hits = index.within_radius(lat, lon, miles)
+    dist = haversine_miles(lat, lon, index.lat, index.lon)
+    assert sorted(hits["restaurant_key"]) == sorted(index.restaurant_key[dist <= miles])